@@ -0,0 +1,225 @@
+"""
+Async (ASGI) serving mode of the Semantic Data Search application, with the
+same endpoints, request bodies and responses as api/routes.py.
+
+Query endpoints await non-blocking Weaviate calls on the event loop, so one
+worker keeps many queries in flight. Blocking work (the weaviate-client calls
+of batch queries, deletes and resets, the read replica, the retrieval cache
+when it is shared through SQLite, and model loading)
+runs on a bounded thread pool, and ingestion is handed to the background job
+queue, so neither stalls the event loop.
+
+Needs the optional starlette, uvicorn and aiohttp packages (the `asgi` extra).
+Run with:
+
+    uvicorn api.asgi:app --port 3000
+"""
+import asyncio
+import contextlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+import weaviate
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from api import handlers
+from services.jobs import JobQueue
+from core.weaviate import WeaviateUnavailable, establish_connection
+from core.weaviate.async_client import AsyncGraphQL, transient_errors
+from core.weaviate.cache import retrieval_cache
+from core.weaviate.client import RETRY_STATUS_CODES
+from core.search.async_search import search_async, search_planned_async
+from core.search.basic_search import search_basic
+from core.search.query_planner import PLANNER_MODES, search_planned
+from core.search.read_replica import READ_REPLICA
+
+# Threads for blocking work; requests beyond this wait without holding the event loop
+ASGI_BLOCKING_WORKERS = int(os.getenv('ASGI_BLOCKING_WORKERS', '8'))
+
+# Connects lazily on first use, so the app starts while Weaviate is still booting
+client = establish_connection()
+job_queue = None
+graphql = None
+_executor = None
+
+
+async def run_blocking(function, *args, **kwargs):
+    """Runs a blocking call on the bounded thread pool and awaits its result."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, partial(function, *args, **kwargs))
+
+
+async def read_json(request, silent=False):
+    """Returns the decoded JSON body of a request; an empty dict when `silent` and it has none."""
+    try:
+        return await request.json()
+    except ValueError:
+        if silent:
+            return {}
+        raise
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global job_queue, graphql, _executor
+    _executor = ThreadPoolExecutor(max_workers=ASGI_BLOCKING_WORKERS, thread_name_prefix='asgi')
+    # Retrieval cache calls of the async searches run on the same bounded pool
+    asyncio.get_running_loop().set_default_executor(_executor)
+    # Ingestion runs on a bounded pool of background workers
+    job_queue = JobQueue(client).start()
+    graphql = AsyncGraphQL()
+    if os.getenv('READER_PRELOAD') == '1':
+        from core.search.reader_registry import preload
+        await run_blocking(preload)
+    try:
+        yield
+    finally:
+        await graphql.aclose()
+        _executor.shutdown(wait=False)
+
+
+async def handle_weaviate_unavailable(request, err):
+    """
+    Reports Weaviate being down or too slow, after retries, as 503 instead of 500.
+    """
+    return JSONResponse({'error': f'WEAVIATE UNAVAILABLE: {str(err) or type(err).__name__}'},
+                        status_code=503)
+
+
+async def handle_weaviate_status(request, err):
+    """
+    Reports Weaviate still answering 502/503/504 after retries as 503, and any
+    other unexpected status, such as a rejected query, as 500.
+    """
+    if err.status_code in RETRY_STATUS_CODES:
+        return await handle_weaviate_unavailable(request, err)
+    return JSONResponse({'error': f'WEAVIATE ERROR: {err}'}, status_code=500)
+
+
+async def handle_add_resources(request):
+    """
+    Endpoint to add resources to Weaviate.
+    """
+    data = await read_json(request)
+    return JSONResponse(await run_blocking(handlers.add_resources, client, job_queue, data))
+
+
+async def handle_delete_resources(request):
+    """
+    Endpoint to delete resources from Weaviate.
+    """
+    data = await read_json(request)
+    return JSONResponse(await run_blocking(handlers.delete_resources, client, data))
+
+
+async def reset_weaviate_database(request):
+    """
+    Endpoint to reset the Weaviate database schema.
+    """
+    data = await read_json(request)
+    return JSONResponse(await run_blocking(handlers.reset, client, data))
+
+
+async def handle_query_qa(request):
+    """
+    Endpoint to perform QA-based queries on Weaviate.
+    """
+    data = await read_json(request)
+    query_text = data.get('query', '')
+    limit = data.get('limit') or 10
+
+    return JSONResponse(await search_async(graphql, query_text, limit=limit, mode='qa'))
+
+
+async def handle_query_basic(request):
+    """
+    Endpoint to perform basic searches on Weaviate. With a 'mode' the query
+    planner chooses between keyword, vector and hybrid search.
+    """
+    data = await read_json(request)
+    query_text = data.get('query', '')
+    limit = data.get('limit') or 10
+    mode = data.get('mode')
+
+    if mode:
+        if mode not in PLANNER_MODES:
+            return JSONResponse({'error': f'UNKNOWN MODE, expected one of {", ".join(PLANNER_MODES)}'})
+        if READ_REPLICA:
+            # The replica searches in process, so it runs off the event loop
+            results = await run_blocking(search_planned, client, query_text, limit=int(limit), mode=mode)
+        else:
+            results = await search_planned_async(graphql, query_text, limit=int(limit), mode=mode)
+    elif READ_REPLICA:
+        results = await run_blocking(search_basic, client, query_text, limit=limit)
+    else:
+        results = await search_async(graphql, query_text, limit=limit, mode='basic')
+
+    return JSONResponse(results)
+
+
+async def handle_query_batch(request):
+    """
+    Endpoint to run many QA and basic searches in one request.
+    """
+    data = await read_json(request)
+    body, status = await run_blocking(handlers.batch_query, client, data)
+    return JSONResponse(body, status_code=status)
+
+
+async def handle_cache_stats(request):
+    """
+    Endpoint to report retrieval cache hit/miss/eviction counters.
+    """
+    return JSONResponse(await run_blocking(retrieval_cache.stats))
+
+
+async def handle_parse_pdf(request):
+    """
+    Endpoint to parse and upload PDF files.
+    """
+    data = await read_json(request)
+    return JSONResponse(await run_blocking(handlers.parse_pdf, job_queue, data))
+
+
+async def handle_parse_csv(request):
+    """
+    Endpoint to parse and upload CSV files.
+    """
+    data = await read_json(request)
+    return JSONResponse(await run_blocking(handlers.parse_csv, job_queue, data))
+
+
+async def handle_job(request):
+    """
+    Endpoint to report (GET) or cancel (DELETE) an ingestion job.
+    """
+    job_id = request.path_params['job_id']
+    if request.method == 'DELETE':
+        data = await read_json(request, silent=True)
+        return JSONResponse(await run_blocking(handlers.cancel_job, job_queue, job_id, data))
+    body, status = await run_blocking(handlers.job_status, job_queue, job_id)
+    return JSONResponse(body, status_code=status)
+
+
+routes = [
+    Route('/add_resources', handle_add_resources, methods=['POST']),
+    Route('/del_resources', handle_delete_resources, methods=['DELETE']),
+    Route('/reset', reset_weaviate_database, methods=['DELETE']),
+    Route('/query_qa', handle_query_qa, methods=['POST']),
+    Route('/query_basic', handle_query_basic, methods=['POST']),
+    Route('/query_batch', handle_query_batch, methods=['POST']),
+    Route('/cache_stats', handle_cache_stats, methods=['GET']),
+    Route('/parse_pdf', handle_parse_pdf, methods=['POST']),
+    Route('/parse_csv', handle_parse_csv, methods=['POST']),
+    Route('/jobs/{job_id}', handle_job, methods=['GET', 'DELETE']),
+]
+
+exception_handlers = {error: handle_weaviate_unavailable
+                      for error in (WeaviateUnavailable, requests.exceptions.ConnectionError,
+                                    requests.exceptions.Timeout) + transient_errors()}
+exception_handlers[weaviate.UnexpectedStatusCodeException] = handle_weaviate_status
+
+app = Starlette(routes=routes, exception_handlers=exception_handlers, lifespan=lifespan)
@@ -0,0 +1,167 @@
+"""
+Request handlers shared by the Flask app (api/routes.py) and the async app
+(api/asgi.py). Each takes the decoded JSON body and returns the response body,
+or (body, status), so both apps keep the same endpoint contracts.
+"""
+from services.resource_manager import delete_resources_from_weaviate
+from services.query_service import make_batch_query
+from core.weaviate import retrieve_password, links_in_weaviate
+from core.weaviate import init_schema as initialize_schema
+
+
+def password_error(data):
+    """Returns the error of a request without a valid password, or None."""
+    if 'password' not in data:
+        return 'PASSWORD REQUIRED IN REQUEST BODY'
+    if data['password'] != retrieve_password():
+        return 'INVALID PASSWORD'
+    return None
+
+
+def job_priority(data):
+    """Returns the job priority of a request, or None if it is not an integer."""
+    try:
+        return int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return None
+
+
+def add_resources(client, job_queue, data):
+    """
+    Queues an ingestion job for the links that are not in Weaviate yet.
+    """
+    response = {'links_added': [], 'error': 'None'}
+    added_links = {}
+    request_fields = data.keys()
+
+    error = password_error(data)
+    priority = job_priority(data)
+    if error:
+        response['error'] = error
+    elif priority is None:
+        response['error'] = 'PRIORITY MUST BE AN INTEGER'
+    else:
+        resource_type = data.get('Type')
+        refresh = bool(data.get('refresh', False))
+        if resource_type == 'note':
+            links = data.get('links', [])
+            existing = set() if refresh else links_in_weaviate(client, links)
+            for link in links:
+                added_links[link] = 'ALREADY EXISTS' if link in existing else 'ADDED'
+            new_links = [link for link in links if link not in existing]
+            if new_links:
+                response['job_id'] = job_queue.submit(
+                    'add_resources', {'links': new_links, 'refresh': refresh}, priority)
+            response['links_added'] = added_links
+        elif resource_type == 'post':
+            required_fields = ['Topic', 'Title', 'Person', 'Role']
+            missing = [field for field in required_fields if field not in request_fields]
+            if missing:
+                response['error'] = f'MISSING FIELDS: {", ".join(missing)}'
+            else:
+                response['job_id'] = job_queue.submit(
+                    'add_resources', {'links': data['links'], 'refresh': refresh}, priority)
+        else:
+            response['error'] = 'UNKNOWN RESOURCE TYPE'
+
+    return response
+
+
+def delete_resources(client, data):
+    """
+    Deletes the objects of the given links from Weaviate.
+    """
+    result = {'links_deleted': [], 'error': 'None'}
+
+    error = password_error(data)
+    if error:
+        result['error'] = error
+    else:
+        links_to_remove = data.get('links', [])
+        result['deleted'] = delete_resources_from_weaviate(client, links_to_remove)
+        result['links_deleted'] = links_to_remove
+
+    return result
+
+
+def reset(client, data):
+    """
+    Recreates the Weaviate schema, dropping all data.
+    """
+    response = {'error': 'None'}
+
+    error = password_error(data)
+    if error:
+        response['error'] = error
+    else:
+        initialize_schema(client)
+
+    return response
+
+
+def batch_query(client, data):
+    """
+    Runs many QA and basic searches. Invalid queries are rejected with 400.
+    """
+    queries = data.get('queries', [])
+
+    try:
+        results = make_batch_query(client, queries)
+    except ValueError as err:
+        return {'results': [], 'error': str(err)}, 400
+
+    return {'results': results, 'error': 'None'}, 200
+
+
+def parse_pdf(job_queue, data):
+    """
+    Queues a job parsing and uploading PDF files.
+    """
+    pdf_links = data.get('pdfs', [])
+    splitting_method = data.get('splitting', 'naive')
+    priority = job_priority(data)
+    if priority is None:
+        return {'error': 'PRIORITY MUST BE AN INTEGER'}
+    job_id = job_queue.submit('parse_pdf', {'pdfs': pdf_links, 'splitting': splitting_method}, priority)
+    return {'job_id': job_id}
+
+
+def parse_csv(job_queue, data):
+    """
+    Queues a job parsing and uploading CSV files.
+    """
+    csv_links = data.get('csv', [])
+    priority = job_priority(data)
+    if priority is None:
+        return {'error': 'PRIORITY MUST BE AN INTEGER'}
+    job_id = job_queue.submit('parse_csv', {'csv': csv_links}, priority)
+    return {'job_id': job_id}
+
+
+def job_status(job_queue, job_id):
+    """
+    Returns the status and per-stage progress of an ingestion job.
+    """
+    job = job_queue.status(job_id)
+    if job is None:
+        return {'error': 'UNKNOWN JOB'}, 404
+    job['error'] = job['error'] or 'None'
+    return job, 200
+
+
+def cancel_job(job_queue, job_id, data):
+    """
+    Cancels a queued or running ingestion job.
+    """
+    response = {'error': 'None'}
+
+    error = password_error(data)
+    if error:
+        response['error'] = error
+    else:
+        status = job_queue.cancel(job_id)
+        if status is None:
+            response['error'] = 'UNKNOWN JOB'
+        response['status'] = status
+
+    return response
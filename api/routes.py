@@ -1,88 +1,79 @@
 """
 Initialize and run the Semantic Data Search application.
 """
+import os
+import requests
+import weaviate
 from flask import Flask, jsonify, request
-from services.resource_manager import add_resources_to_weaviate, delete_resources_from_weaviate
-from services.query_service import make_query
-from processors.doc_parser import process_pdf
-from processors.table_parser import parse_csv
-from weaviate import establish_connection, retrieve_password, initialize_schema, link_in_weaviate
+from api import handlers
+from services.jobs import JobQueue
+from core.weaviate import WeaviateUnavailable, establish_connection, search_qa as query_qa
+from core.weaviate.client import RETRY_STATUS_CODES
+from core.weaviate.cache import retrieval_cache
+from core.search.basic_search import search_basic as query_basic
+from core.search.query_planner import PLANNER_MODES, search_planned
 
+# Connects lazily on first use, so the app starts while Weaviate is still booting
 client = establish_connection()
 app = Flask(__name__)
+# Ingestion runs on a bounded pool of background workers. They are started in
+# each serving process (see start_job_queue), not at import, so they also run
+# in the workers of a pre-forking server (e.g. gunicorn --preload).
+job_queue = JobQueue(client)
+
+if os.getenv('READER_PRELOAD') == '1':
+    # Load the BigBird reader before a pre-forking server (e.g. gunicorn --preload)
+    # forks its workers, so they share the weights copy-on-write.
+    from core.search.reader_registry import preload
+    preload()
+
+@app.before_request
+def start_job_queue():
+    """
+    Starts the ingestion workers of this process on its first request, so
+    queued jobs resume without waiting for a new submission.
+    """
+    job_queue.start()
+
+@app.errorhandler(WeaviateUnavailable)
+@app.errorhandler(requests.exceptions.ConnectionError)
+@app.errorhandler(requests.exceptions.Timeout)
+def handle_weaviate_unavailable(err):
+    """
+    Reports Weaviate being down or too slow, after retries, as 503 instead of 500.
+    """
+    return jsonify({'error': f'WEAVIATE UNAVAILABLE: {err}'}), 503
+
+@app.errorhandler(weaviate.UnexpectedStatusCodeException)
+def handle_weaviate_status(err):
+    """
+    Reports Weaviate still answering 502/503/504 after retries as 503, and any
+    other unexpected status, such as a rejected query, as 500.
+    """
+    if err.status_code in RETRY_STATUS_CODES:
+        return handle_weaviate_unavailable(err)
+    return jsonify({'error': f'WEAVIATE ERROR: {err}'}), 500
 
 @app.route('/add_resources', methods=['POST'])
 def handle_add_resources():
     """
     Endpoint to add resources to Weaviate.
     """
-    data = request.get_json()
-    response = {'links_added': [], 'error': 'None'}
-    resource_types = ['note', 'post']
-    added_links = {}
-    request_fields = data.keys()
-    
-    if 'password' not in request_fields:
-        response['error'] = 'PASSWORD REQUIRED IN REQUEST BODY'
-    elif data['password'] != retrieve_password():
-        response['error'] = 'INVALID PASSWORD'
-    else:
-        resource_type = data.get('Type')
-        if resource_type == 'note':
-            for link in data.get('links', []):
-                if link_in_weaviate(client, link):
-                    added_links[link] = 'ALREADY EXISTS'
-                else:
-                    add_resources_to_weaviate(client, data['links'])
-                    added_links[link] = 'ADDED'
-            response['links_added'] = added_links
-        elif resource_type == 'post':
-            required_fields = ['Topic', 'Title', 'Person', 'Role']
-            missing = [field for field in required_fields if field not in request_fields]
-            if missing:
-                response['error'] = f'MISSING FIELDS: {", ".join(missing)}'
-            else:
-                add_resources_to_weaviate(client, data['links'])
-        else:
-            response['error'] = 'UNKNOWN RESOURCE TYPE'
-    
-    return jsonify(response)
+    return jsonify(handlers.add_resources(client, job_queue, request.get_json()))
 
 @app.route('/del_resources', methods=['DELETE'])
 def handle_delete_resources():
     """
     Endpoint to delete resources from Weaviate.
     """
-    data = request.get_json()
-    result = {'links_deleted': [], 'error': 'None'}
-    
-    if 'password' not in data:
-        result['error'] = 'PASSWORD REQUIRED IN REQUEST BODY'
-    elif data['password'] != retrieve_password():
-        result['error'] = 'INVALID PASSWORD'
-    else:
-        links_to_remove = data.get('links', [])
-        delete_resources_from_weaviate(client, links_to_remove)
-        result['links_deleted'] = links_to_remove
-    
-    return jsonify(result)
+    return jsonify(handlers.delete_resources(client, request.get_json()))
 
 @app.route('/reset', methods=['DELETE'])
 def reset_weaviate_database():
     """
     Endpoint to reset the Weaviate database schema.
     """
-    data = request.get_json()
-    response = {'error': 'None'}
-    
-    if 'password' not in data:
-        response['error'] = 'PASSWORD REQUIRED IN REQUEST BODY'
-    elif data['password'] != retrieve_password():
-        response['error'] = 'INVALID PASSWORD'
-    else:
-        initialize_schema(client)
-    
-    return jsonify(response)
+    return jsonify(handlers.reset(client, request.get_json()))
 
 @app.route('/query_qa', methods=['POST'])
 def handle_query_qa():
@@ -103,39 +94,69 @@ def handle_query_qa():
 @app.route('/query_basic', methods=['POST'])
 def handle_query_basic():
     """
-    Endpoint to perform basic searches on Weaviate.
+    Endpoint to perform basic searches on Weaviate. With a 'mode' the query
+    planner chooses between keyword, vector and hybrid search.
     """
     data = request.get_json()
     query_text = data.get('query', '')
     limit = data.get('limit')
+    mode = data.get('mode')
     
-    if limit:
+    if mode:
+        if mode not in PLANNER_MODES:
+            return jsonify({'error': f'UNKNOWN MODE, expected one of {", ".join(PLANNER_MODES)}'})
+        results = search_planned(client, query_text, limit=int(limit or 10), mode=mode)
+    elif limit:
         results = query_basic(client, query_text, limit=limit)
     else:
         results = query_basic(client, query_text)
     
     return jsonify(results)
 
+@app.route('/query_batch', methods=['POST'])
+def handle_query_batch():
+    """
+    Endpoint to run many QA and basic searches in one request.
+    """
+    body, status = handlers.batch_query(client, request.get_json())
+    return jsonify(body), status
+
+@app.route('/cache_stats', methods=['GET'])
+def handle_cache_stats():
+    """
+    Endpoint to report retrieval cache hit/miss/eviction counters.
+    """
+    return jsonify(retrieval_cache.stats())
+
 @app.route('/parse_pdf', methods=['POST'])
 def handle_parse_pdf():
     """
     Endpoint to parse and upload PDF files.
     """
-    data = request.get_json()
-    pdf_links = data.get('pdfs', [])
-    splitting_method = data.get('splitting', 'naive')
-    process_pdf(client, pdf_links, splitting_method)
-    return {}
+    return handlers.parse_pdf(job_queue, request.get_json())
 
 @app.route('/parse_csv', methods=['POST'])
 def handle_parse_csv():
     """
     Endpoint to parse and upload CSV files.
     """
-    data = request.get_json()
-    csv_links = data.get('csv', [])
-    process_csv(client, csv_links)
-    return {}
+    return handlers.parse_csv(job_queue, request.get_json())
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def handle_job_status(job_id):
+    """
+    Endpoint to report the status and per-stage progress of an ingestion job.
+    """
+    body, status = handlers.job_status(job_queue, job_id)
+    return jsonify(body), status
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def handle_cancel_job(job_id):
+    """
+    Endpoint to cancel a queued or running ingestion job.
+    """
+    data = request.get_json(silent=True) or {}
+    return jsonify(handlers.cancel_job(job_queue, job_id, data))
 
 if __name__ == '__main__':
     app.config["DEBUG"] = True
@@ -0,0 +1,161 @@
+"""
+Load test of /query_basic served by the Flask app (api/routes.py) and by the
+async app (api/asgi.py under uvicorn), both in front of a local Weaviate
+stand-in that answers every GraphQL query after a fixed latency. Each app runs
+in its own process with one worker, and the retrieval cache is disabled so
+every request reaches the stand-in. Reports requests/sec and latency
+percentiles per concurrency level.
+
+Needs flask, starlette, uvicorn and aiohttp. Run from the repository root:
+    python -m benchmarks.asgi_load --requests 2000 --concurrency 16,64,256
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import numpy as np
+import requests
+
+SERVERS = {
+    'flask': [sys.executable, '-c', 'import sys; from api.routes import app; app.run(port=int(sys.argv[1]))'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'api.asgi:app', '--log-level', 'warning', '--port'],
+}
+POSTS = [{'document': f'https://example.com/doc{i}.pdf', 'page': i, 'paragraph': 0,
+          'content': 'lorem ipsum ' * 40} for i in range(10)]
+
+
+async def _serve_weaviate(port, latency, ready):
+    body = json.dumps({'data': {'Get': {'Post': POSTS}}}).encode()
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                method, path = head.split(b' ', 2)[:2]
+                length = re.search(rb'content-length: *(\d+)', head, re.IGNORECASE)
+                if length:
+                    await reader.readexactly(int(length.group(1)))
+                if method == b'POST' and path == b'/v1/graphql':
+                    await asyncio.sleep(latency)
+                    status, payload = b'200 OK', body
+                elif path in (b'/v1/.well-known/ready', b'/v1/meta'):
+                    status, payload = b'200 OK', b'{}'
+                else:
+                    status, payload = b'404 Not Found', b'{}'
+                writer.write(b'HTTP/1.1 %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s'
+                             % (status, len(payload), payload))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', port, backlog=1024)
+    ready.set()
+    async with server:
+        await server.serve_forever()
+
+
+def _run_weaviate(port, latency, ready):
+    asyncio.run(_serve_weaviate(port, latency, ready))
+
+
+def stub_weaviate(port, latency):
+    """
+    Starts a process standing in for Weaviate: an asyncio HTTP server that
+    answers every GraphQL query after `latency` seconds. Returns the process.
+    """
+    context = multiprocessing.get_context('spawn')
+    ready = context.Event()
+    process = context.Process(target=_run_weaviate, args=(port, latency, ready), daemon=True)
+    process.start()
+    ready.wait(30)
+    return process
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(name, port, env):
+    process = subprocess.Popen(SERVERS[name] + [str(port)], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/cache_stats', timeout=1)
+            return process
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{name} server did not start on port {port}')
+
+
+async def load(url, total, concurrency):
+    """Sends `total` distinct queries, `concurrency` at a time; returns (seconds, latencies, errors)."""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as http:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                start_time = time.perf_counter()
+                try:
+                    async with http.post(url, json={'query': f'lecture notes on topic {i}', 'limit': 10}) as response:
+                        await response.read()
+                        ok = response.status == 200
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    ok = False
+                latencies.append(time.perf_counter() - start_time)
+                errors += not ok
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - start_time, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', default='16,64,256')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the stand-in takes per query')
+    parser.add_argument('--servers', default=','.join(SERVERS))
+    args = parser.parse_args()
+
+    weaviate_port = free_port()
+    weaviate = stub_weaviate(weaviate_port, args.latency)
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, WEAVIATE_URL=f'http://127.0.0.1:{weaviate_port}', RETRIEVAL_CACHE_TTL='0',
+                   JOBS_DB_PATH=os.path.join(directory, 'jobs.sqlite3'),
+                   DOCUMENT_CATALOG_PATH=os.path.join(directory, 'catalog.sqlite3'))
+        print(f'{args.requests} queries per run, {args.latency * 1000:.0f} ms Weaviate latency')
+        for name in args.servers.split(','):
+            port = free_port()
+            process = start_server(name, port, env)
+            try:
+                for concurrency in map(int, args.concurrency.split(',')):
+                    seconds, latencies, errors = asyncio.run(
+                        load(f'http://127.0.0.1:{port}/query_basic', args.requests, concurrency))
+                    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+                    print(f'{name:<6} {concurrency:5d} concurrent {args.requests / seconds:8.0f} req/sec '
+                          f'p50 {p50:7.1f} ms p95 {p95:7.1f} ms p99 {p99:7.1f} ms {errors:5d} errors')
+            finally:
+                process.terminate()
+                process.wait()
+    weaviate.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Compares PDF text extraction throughput in pages/sec:
+    per-page   a fresh resource manager and converter for every page (previous behaviour)
+    serial     one resource manager per document, single process
+    parallel   pages split across a process pool
+
+Run from the repository root, passing local PDF files (defaults to the PDFs in
+processors/pdfs/):
+    python -m benchmarks.pdf_extraction --workers 4 book.pdf slides.pdf
+"""
+import argparse
+import glob
+import os
+import time
+from io import StringIO
+
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.pdfpage import PDFPage
+
+from processors.doc_parser import PDF_STORAGE_DIR, convert_pdfs_to_text, extract_pages
+
+
+def extract_per_page(pdf_path):
+    """The previous extraction loop, recreating pdfminer state for every page."""
+    pages_text = []
+    with open(pdf_path, 'rb') as file:
+        for page in PDFPage.get_pages(file):
+            text_stream = StringIO()
+            resource_manager = PDFResourceManager()
+            converter = TextConverter(resource_manager, text_stream, laparams=LAParams())
+            interpreter = PDFPageInterpreter(resource_manager, converter)
+            interpreter.process_page(page)
+            pages_text.append(text_stream.getvalue())
+    return pages_text
+
+
+def timed(label, extract, pdf_paths):
+    start_time = time.perf_counter()
+    documents = extract(pdf_paths)
+    elapsed = time.perf_counter() - start_time
+    pages = sum(len(pages_text) for pages_text in documents)
+    print(f'{label:<22} {pages:6d} pages {elapsed:8.2f}s {pages / elapsed:8.1f} pages/sec')
+    return documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pdfs', nargs='*')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    pdf_paths = args.pdfs or sorted(glob.glob(os.path.join(PDF_STORAGE_DIR, '*.pdf')))
+    if not pdf_paths:
+        parser.error(f'no PDF files given and none found in {PDF_STORAGE_DIR}')
+
+    for pdf_path in pdf_paths:
+        print(os.path.basename(pdf_path))
+        reference = timed('  per-page', lambda paths: [extract_per_page(p) for p in paths], [pdf_path])
+        serial = timed('  serial', lambda paths: [extract_pages(p) for p in paths], [pdf_path])
+        parallel = timed(f'  parallel x{args.workers}',
+                         lambda paths: convert_pdfs_to_text(paths, args.workers), [pdf_path])
+        if not serial == parallel == [[text.replace('ﬁ', 'fi') for text in reference[0]]]:
+            print('  WARNING: extraction modes returned different text')
+
+    if len(pdf_paths) > 1:
+        print('all documents')
+        timed('  serial', lambda paths: [extract_pages(p) for p in paths], pdf_paths)
+        timed(f'  parallel x{args.workers}', lambda paths: convert_pdfs_to_text(paths, args.workers),
+              pdf_paths)
+
+
+if __name__ == '__main__':
+    main()
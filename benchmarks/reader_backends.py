@@ -0,0 +1,96 @@
+"""
+Compares reader backends on a fixed question/passage set.
+Reports p50/p95 latency per question and answer agreement with fp32.
+
+Run from the repository root:
+    python -m benchmarks.reader_backends --repeats 5 --threads 4
+"""
+import argparse
+import time
+
+import numpy as np
+
+from core.search import reader_registry
+from core.search.bigbird_qa_search import read_passages
+
+QUESTIONS = [
+    ('What invention in the 15th century increased the accessibility of scholarly works?', [
+        'Initially, scholarly works were accessible only to a privileged few, often confined within '
+        'the walls of elite institutions. The advent of the printing press in the 15th century '
+        'democratized knowledge dissemination, allowing scholarly works to reach a broader audience.',
+        'Online platforms and open-access journals have made research findings readily available to '
+        'anyone with internet access.',
+    ]),
+    ('What structure do scientific papers often follow?', [
+        'Traditional essays typically follow a three-part structure: introduction, body, and conclusion.',
+        'In contrast, scientific papers often adhere to the IMRaD structure, Introduction, Methods, '
+        'Results, and Discussion, which facilitates the presentation of empirical research.',
+    ]),
+    ('What is a strategy that yields a higher payoff regardless of the opponent\'s choice called?', [
+        'A strategy is strictly dominant if it yields a higher payoff than any other strategy, '
+        'regardless of the strategies chosen by the other players. Such a strategy is called a '
+        'dominant strategy.',
+        'A Nash equilibrium is a profile of strategies in which no player can gain by unilaterally '
+        'deviating to a different strategy.',
+    ]),
+    ('Who proposed the theory of general relativity?', [
+        'The theory of general relativity was published by Albert Einstein in 1915 and describes '
+        'gravity as the curvature of spacetime caused by mass and energy.',
+        'Isaac Newton formulated the laws of motion and universal gravitation in the Principia.',
+    ]),
+    ('What gas do plants absorb during photosynthesis?', [
+        'During photosynthesis, plants absorb carbon dioxide from the air and water from the soil, '
+        'and use the energy of sunlight to convert them into glucose and oxygen.',
+    ]),
+]
+
+
+def run_backend(backend, repeats):
+    """
+    Answers every question `repeats` times with `backend`.
+
+    Returns:
+        tuple: (list of per-call latencies in seconds, list of best answers per question)
+    """
+    reader_registry.warmup(backend=backend)
+    latencies = []
+    answers = []
+    for question, passages in QUESTIONS:
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            spans = read_passages(question, passages, top_k=1, backend=backend)
+            latencies.append(time.perf_counter() - start_time)
+        best = max((passage_spans[0] for passage_spans in spans if passage_spans),
+                   key=lambda span: span['score'], default={'answer': ''})
+        answers.append(best['answer'])
+    return latencies, answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=list(reader_registry.READER_BACKENDS))
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.threads:
+        reader_registry.configure_backend(reader_registry.READER_BACKEND, args.threads)
+
+    backends = ['fp32'] + [backend for backend in args.backends if backend != 'fp32']
+    reference = None
+    print(f'{"backend":<10} {"p50 ms":>8} {"p95 ms":>8} {"agree":>6} {"load s":>7} {"rss MB":>8}')
+    for backend in backends:
+        latencies, answers = run_backend(backend, args.repeats)
+        if reference is None:
+            reference = answers
+        agreement = np.mean([a.strip().lower() == b.strip().lower() for a, b in zip(answers, reference)])
+        stats = reader_registry.reader_stats(reader_registry.DEFAULT_READER_MODEL, backend)
+        p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+        print(f'{backend:<10} {p50:8.1f} {p95:8.1f} {agreement:6.0%} '
+              f'{stats["load_seconds"]:7.1f} {stats["rss_mb"]:8.0f}')
+        if backend != 'fp32':
+            reader_registry.unload(backend=backend)
+
+
+if __name__ == '__main__':
+    main()
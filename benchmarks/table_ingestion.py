@@ -0,0 +1,162 @@
+"""
+Compares ingesting a table from CSV, Parquet and Arrow IPC files: rows/sec,
+CPU seconds and peak anonymous resident memory above the memory in use when
+reading starts (sampled every 10000 rows or every uploaded batch, Linux
+only). Pages of memory-mapped files are shared page cache and not counted.
+
+Each format is measured in three stages: reading records only; also building
+every object (properties, content hash and UUID); and the full parse_csv /
+parse_table path, which syncs every document through import_data against a
+stub Weaviate client. The stub holds no objects and serializes each batch
+request to JSON, so the last stage covers everything but the network and the
+vectorizer. Every run happens in a fresh process so peak memory is not shared,
+with a throwaway document catalog. Needs pyarrow. Run from the repository root:
+    python -m benchmarks.table_ingestion --rows 2000000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from core.weaviate.importer import iter_records, record_to_object
+from processors.table_parser import REQUIRED_COLUMNS, iter_paragraphs, iter_table_batches, parse_csv, parse_table
+
+FORMATS = ('csv', 'parquet', 'arrow')
+STAGES = ('read', 'build', 'ingest')
+
+
+def synthetic_table(rows, documents=200, seed=0):
+    """A pyarrow Table with the required columns and ~300 characters of text per row."""
+    import pyarrow as pa
+    rng = np.random.default_rng(seed)
+    words = np.array(['retrieval', 'vector', 'lecture', 'slide', 'answer', 'index', 'paragraph', 'model'])
+    sentences = [' '.join(rng.choice(words, 40)) for _ in range(1024)]
+    index = np.arange(rows)
+    paragraphs_per_document = -(-rows // documents)
+    return pa.table({
+        'Text': pa.array(sentences).take(pa.array(index % len(sentences))),
+        'Document': [f'https://example.com/doc{i}.pdf' for i in index // paragraphs_per_document],
+        'Page': pa.array((index % paragraphs_per_document) // 20),
+        'Paragraph': pa.array(index % 20),
+        'Type': pa.array(['pdf'] * rows),
+        'Title': pa.array(['Synthetic document'] * rows),
+        'Person': pa.array(['Ada'] * rows),
+        'Role': pa.array(['Author'] * rows),
+        'Folder': pa.array(['bench'] * rows),
+        'Extra': pa.array(index),
+    })
+
+
+def write_files(table, directory):
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    from pyarrow import feather, parquet
+    paths = {name: os.path.join(directory, f'table.{name}') for name in FORMATS}
+    pa_csv.write_csv(table, paths['csv'])
+    parquet.write_table(table, paths['parquet'])
+    # Uncompressed, so record batches are read from the mapped file without copies
+    feather.write_feather(table, paths['arrow'], compression='uncompressed')
+    return paths
+
+
+def _batches(fmt, path):
+    if fmt == 'csv':
+        return iter_paragraphs(path)
+    return iter_table_batches(path)
+
+
+def _rss():
+    """Current anonymous resident memory in bytes."""
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('RssAnon:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class StubClient:
+    """
+    Stands in for a Weaviate client holding no Post objects: listing returns
+    nothing and batch requests are serialized and reported as successful.
+    Samples resident memory after every batch.
+    """
+    def __init__(self):
+        self.batch = self
+        self.query = self
+        self.objects = 0
+        self.peak = _rss()
+
+    def raw(self, query):
+        return {'data': {'Get': {'Post': []}}}
+
+    def create(self, batch):
+        body = batch.get_request_body()
+        json.dumps(body)
+        self.objects += len(body['objects'])
+        self.peak = max(self.peak, _rss())
+        return [{'result': {}}] * len(body['objects'])
+
+
+def _ingest(fmt, path):
+    client = StubClient()
+    if fmt == 'csv':
+        parse_csv(client, [path])
+    else:
+        parse_table(client, [path])
+    return client.objects, client.peak
+
+
+def _measure(fmt, path, stage, results):
+    # Load the readers first so their import is not counted as reading memory.
+    import pyarrow.compute, pyarrow.parquet  # noqa: F401
+    baseline = peak = _rss()
+    start_cpu, start_time = time.process_time(), time.perf_counter()
+    rows = 0
+    if stage == 'ingest':
+        rows, peak = _ingest(fmt, path)
+    else:
+        for record in iter_records(_batches(fmt, path)):
+            if stage == 'build':
+                record_to_object(record)
+            rows += 1
+            if rows % 10000 == 0:
+                peak = max(peak, _rss())
+    seconds = time.perf_counter() - start_time
+    results.put((rows, seconds, time.process_time() - start_cpu, peak - baseline))
+
+
+def measure(fmt, path, stage):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(fmt, path, stage, results))
+    process.start()
+    rows, seconds, cpu, peak = results.get()
+    process.join()
+    print(f'{fmt:<8} {stage:<6} {os.path.getsize(path) / 2 ** 20:8.1f} MiB file '
+          f'{rows:9d} rows {seconds:8.2f}s {rows / seconds:10.0f} rows/sec {cpu:8.2f}s CPU '
+          f'{peak / 2 ** 20:8.1f} MiB peak')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--formats', default=','.join(FORMATS))
+    parser.add_argument('--stages', default=','.join(STAGES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Read by the spawned processes when they import the catalog.
+        os.environ['DOCUMENT_CATALOG_PATH'] = os.path.join(directory, 'catalog.sqlite3')
+        paths = write_files(synthetic_table(args.rows), directory)
+        print(f'{args.rows} rows of {", ".join(REQUIRED_COLUMNS)} and one unused column')
+        for stage in args.stages.split(','):
+            for fmt in args.formats.split(','):
+                measure(fmt, paths[fmt], stage)
+
+
+if __name__ == '__main__':
+    main()
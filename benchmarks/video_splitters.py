@@ -0,0 +1,93 @@
+"""
+Compares the 'slide' and 'scene' video splitters on the same frames:
+frames/sec, peak memory allocated while detecting (excluding the decoded
+frames themselves), and the splits found.
+
+Frames are decoded once up front, so only the detectors are timed. Run from
+the repository root on a local video:
+    python -m benchmarks.video_splitters lecture.mp4 --fps 1 --repeats 3
+or, without a video file or ffmpeg, on synthetic slides:
+    python -m benchmarks.video_splitters --synthetic 3600 --size 720x1280
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from processors.media_parser import VideoSlideSeparator
+
+
+class FramesParser:
+    """Minimal parser serving pre-decoded frames to VideoSlideSeparator."""
+    def __init__(self, frames, seconds_per_frame):
+        self._frames = frames
+        self.seconds_per_frame = seconds_per_frame
+        self.duration = len(frames) * seconds_per_frame
+
+    def frames(self):
+        return iter(self._frames)
+
+
+def synthetic_frames(count, height, width, slide_seconds=90, seed=0):
+    """Slides of random blocks that change every `slide_seconds` frames, with sensor noise."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for index in range(count):
+        if index % slide_seconds == 0:
+            blocks = rng.integers(0, 256, (height // 40 + 1, width // 40 + 1, 3), dtype=np.uint8)
+            slide = np.repeat(np.repeat(blocks, 40, axis=0), 40, axis=1)[:height, :width]
+        noise = rng.integers(0, 3, slide.shape, dtype=np.uint8)
+        frames.append(slide - np.minimum(slide, noise))
+    return frames
+
+
+def video_frames(path, fps):
+    from processors.frame_source import FrameSource
+    source = FrameSource(path, target_fps=fps)
+    return list(source), source.seconds_per_frame
+
+
+def measure(method, parser, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        splits = VideoSlideSeparator(parser, method, extract_text=False).splits
+        best = min(best, time.perf_counter() - start_time)
+    # Memory is traced in a separate run, since tracing slows allocations down.
+    tracemalloc.start()
+    VideoSlideSeparator(parser, method, extract_text=False)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    frames = len(parser._frames)
+    print(f'{method:<6} {frames:6d} frames {best:8.2f}s {frames / best:9.1f} frames/sec '
+          f'{peak / 2 ** 20:8.1f} MiB peak {len(splits):4d} sections')
+    return splits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video', nargs='?')
+    parser.add_argument('--fps', type=float, default=1.0, help='sampling rate for a video file')
+    parser.add_argument('--synthetic', type=int, default=0, help='number of synthetic frames')
+    parser.add_argument('--size', default='720x1280', help='synthetic frame HEIGHTxWIDTH')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.video:
+        frames, seconds_per_frame = video_frames(args.video, args.fps)
+    elif args.synthetic:
+        height, width = (int(x) for x in args.size.split('x'))
+        frames, seconds_per_frame = synthetic_frames(args.synthetic, height, width), 1.0
+    else:
+        parser.error('pass a video file or --synthetic N')
+
+    print(f'{len(frames)} frames of {frames[0].shape}, {seconds_per_frame:.2f}s per frame')
+    slide = measure('slide', FramesParser(frames, seconds_per_frame), args.repeats)
+    scene = measure('scene', FramesParser(frames, seconds_per_frame), args.repeats)
+    print(f'slide splits: {slide}')
+    print(f'scene splits: {scene}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Async counterparts of the basic, QA, keyword and planned searches, for the
+ASGI app. They send the same GraphQL as the synchronous searches through an
+`AsyncGraphQL` connection, return the same results, and share the retrieval
+cache with them. Retrieval cache calls, which are SQLite queries when the
+cache is shared between processes, run on the event loop's default executor.
+"""
+import asyncio
+import time
+from functools import partial
+
+from core.search.query_planner import PLANNER_MODES, classify_query, reciprocal_rank_fusion
+from core.weaviate.cache import retrieval_cache
+from core.weaviate.graphql import build_get, build_post_search, parse_posts
+
+
+async def _cache_call(function, *args):
+    """Runs a retrieval cache call off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, partial(function, *args))
+
+
+async def search_async(graphql, query, limit=10, mode='basic'):
+    """
+    Runs one 'basic' (near_text), 'qa' (ask) or 'keyword' (BM25) search.
+    Results are served from the retrieval cache when possible.
+
+    Args:
+        graphql (AsyncGraphQL): Async Weaviate connection
+        query (str): Search query text
+        limit (int): Maximum number of results to return (default: 10)
+        mode (str): 'basic', 'qa' or 'keyword'
+
+    Returns:
+        list: List of dictionaries containing matching documents with their metadata
+    """
+    caching = retrieval_cache.ttl > 0 and retrieval_cache.max_entries > 0
+    generation = await _cache_call(retrieval_cache.generation)
+    if caching:
+        cached = await _cache_call(retrieval_cache.get, query, limit, mode, generation)
+        if cached is not None:
+            return cached
+    res = await graphql.raw(build_get([build_post_search(mode, query, limit)]))
+    if res.get('errors'):
+        raise RuntimeError(f'Search failed: {res["errors"]}')
+    results = parse_posts(res['data']['Get']['Post'])
+    # Do not cache results that raced with a write to Weaviate.
+    if caching and await _cache_call(retrieval_cache.generation) == generation:
+        await _cache_call(retrieval_cache.put, query, limit, mode, results, generation)
+    return results
+
+
+async def _timed(graphql, query, limit, mode):
+    start_time = time.perf_counter()
+    results = await search_async(graphql, query, limit, mode)
+    return results, round(time.perf_counter() - start_time, 4)
+
+
+async def search_planned_async(graphql, query, limit=10, mode='auto'):
+    """
+    Async `search_planned`: hybrid queries await their keyword and vector
+    sub-queries concurrently on the event loop.
+
+    Returns:
+        dict: 'path' taken, 'results' and 'seconds' spent per sub-query
+    """
+    if mode not in PLANNER_MODES:
+        raise ValueError(f'Unknown planner mode {mode!r}, expected one of {PLANNER_MODES}')
+    path = classify_query(query) if mode == 'auto' else mode
+    if path == 'keyword':
+        results, seconds = await _timed(graphql, query, limit, 'keyword')
+        timings = {'keyword': seconds}
+    elif path == 'vector':
+        results, seconds = await _timed(graphql, query, limit, 'basic')
+        timings = {'vector': seconds}
+    else:
+        (keyword_results, keyword_seconds), (vector_results, vector_seconds) = await asyncio.gather(
+            _timed(graphql, query, limit, 'keyword'), _timed(graphql, query, limit, 'basic'))
+        results = reciprocal_rank_fusion([keyword_results, vector_results], limit)
+        timings = {'keyword': keyword_seconds, 'vector': vector_seconds}
+    return {'path': path, 'results': results, 'seconds': timings}
@@ -1,15 +1,28 @@
+from core.weaviate.cache import cached_retrieval
+from core.weaviate.client import resolve_client
+from core.weaviate.graphql import build_get, build_post_search, parse_posts
+from core.search.read_replica import get_read_replica
+
+@cached_retrieval('basic')
 def search_basic(client, query, limit=10):
     """
-    Performs a basic semantic search using Weaviate's near_text operator.
+    Performs a basic semantic search using Weaviate's near_text operator, or
+    in process against the read replica when READ_REPLICA=1.
+    Results are served from the retrieval cache when possible.
     
     Args:
-        client: Weaviate client instance
+        client: Weaviate client instance, or None for the shared client
         query (str): Search query text
         limit (int): Maximum number of results to return (default: 10)
     
     Returns:
         list: List of dictionaries containing matching documents with their metadata
     """
+    client = resolve_client(client)
+    replica = get_read_replica()
+    if replica is not None:
+        return replica.search(client, query, limit)
+
     near_vec = {"concepts": [query]}
     
     res = client.query.get("Post", [
@@ -29,4 +42,25 @@ def search_basic(client, query, limit=10):
             "content": post['content']
         })
     
-    return answers 
\ No newline at end of file
+    return answers
+
+
+@cached_retrieval('keyword')
+def search_keyword(client, query, limit=10):
+    """
+    Performs a BM25 keyword search over the content, title and person of Posts.
+    Unlike `search_basic` the query is not vectorized, so it never calls the
+    vectorizer. Results are served from the retrieval cache when possible.
+
+    Args:
+        client: Weaviate client instance, or None for the shared client
+        query (str): Search query text
+        limit (int): Maximum number of results to return (default: 10)
+
+    Returns:
+        list: List of dictionaries containing matching documents with their metadata
+    """
+    res = resolve_client(client).query.raw(build_get([build_post_search('keyword', query, limit)]))
+    if res.get('errors'):
+        raise RuntimeError(f'Keyword search failed: {res["errors"]}')
+    return parse_posts(res['data']['Get']['Post'])
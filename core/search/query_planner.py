@@ -0,0 +1,121 @@
+"""
+Query planner for basic searches.
+Keyword-like queries (codes, identifiers, names, one or two terms) go to BM25
+only, which skips the vectorizer. Natural-language queries go to near_text.
+Anything in between runs both concurrently and merges the two rankings with
+reciprocal-rank fusion (RRF). Every response reports the path taken and the
+time spent per sub-query.
+"""
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.search.basic_search import search_basic, search_keyword
+from core.weaviate.client import resolve_client
+
+PLANNER_KEYWORD_MAX_TERMS = int(os.getenv('PLANNER_KEYWORD_MAX_TERMS', '2'))
+PLANNER_VECTOR_MIN_TERMS = int(os.getenv('PLANNER_VECTOR_MIN_TERMS', '4'))
+RRF_K = int(os.getenv('RRF_K', '60'))
+
+PLANNER_MODES = ('auto', 'keyword', 'vector', 'hybrid')
+QUESTION_WORDS = {'what', 'why', 'how', 'when', 'where', 'who', 'which', 'explain', 'describe',
+                  'is', 'are', 'can', 'does', 'do', 'should'}
+# Terms with digits, inner punctuation (ISO-9001, v2.1, foo_bar) or in capitals (NASA)
+CODE_PATTERN = re.compile(r'\d|\w[-_./#:]\w|^[A-Z]{2,}$')
+
+# Shared by all requests, so hybrid queries do not start threads of their own.
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv('PLANNER_WORKERS', '8')),
+                               thread_name_prefix='planner')
+
+
+def classify_query(query):
+    """
+    Chooses the search path for a query.
+
+    Returns:
+        str: 'keyword' for code, identifier or short lookups, 'vector' for
+            natural-language queries, and 'hybrid' for everything in between.
+    """
+    stripped = query.strip()
+    terms = re.findall(r'[^\s"\'?!,;()]+', stripped)
+    if not terms:
+        return 'vector'
+    if len(stripped) > 2 and stripped[0] == stripped[-1] == '"':
+        return 'keyword'
+    codes = sum(1 for term in terms if CODE_PATTERN.search(term))
+    if '"' in stripped:
+        codes += 1
+    question = stripped.endswith('?') or terms[0].lower() in QUESTION_WORDS
+    if not question and (len(terms) == 1 or codes == len(terms)
+                         or (codes and len(terms) <= PLANNER_KEYWORD_MAX_TERMS)):
+        return 'keyword'
+    if not codes and (question or len(terms) >= PLANNER_VECTOR_MIN_TERMS):
+        return 'vector'
+    return 'hybrid'
+
+
+def reciprocal_rank_fusion(rankings, limit, k=RRF_K):
+    """
+    Merges result lists with RRF: each result scores the sum of 1 / (k + rank)
+    over the lists it appears in, with ranks starting at 1.
+
+    Args:
+        rankings (list): Result lists, best first; results are identified by
+            their document, page and paragraph.
+        limit (int): Maximum number of results to return.
+        k (int): Damping constant; larger values flatten the rank weights.
+
+    Returns:
+        list: Fused results, best first.
+    """
+    scores = {}
+    results = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, start=1):
+            key = (result['document'], result['page'], result['paragraph'])
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            results.setdefault(key, result)
+    # sorted() is stable, so ties keep the order in which results were first seen.
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [results[key] for key in ordered[:limit]]
+
+
+def _timed(search, client, query, limit):
+    start_time = time.perf_counter()
+    results = search(client, query, limit)
+    return results, round(time.perf_counter() - start_time, 4)
+
+
+def search_planned(client, query, limit=10, mode='auto'):
+    """
+    Searches with the path chosen by `classify_query`, or the one forced by `mode`.
+    Sub-query results are served from the retrieval cache when possible.
+
+    Args:
+        client: Weaviate client instance, or None for the shared client
+        query (str): Search query text
+        limit (int): Maximum number of results to return (default: 10)
+        mode (str): 'auto', or 'keyword', 'vector' or 'hybrid' to force a path
+
+    Returns:
+        dict: 'path' taken, 'results' like `search_basic`, and 'seconds' spent
+            per sub-query ('keyword' and/or 'vector')
+    """
+    if mode not in PLANNER_MODES:
+        raise ValueError(f'Unknown planner mode {mode!r}, expected one of {PLANNER_MODES}')
+    client = resolve_client(client)
+    path = classify_query(query) if mode == 'auto' else mode
+    if path == 'keyword':
+        results, seconds = _timed(search_keyword, client, query, limit)
+        timings = {'keyword': seconds}
+    elif path == 'vector':
+        results, seconds = _timed(search_basic, client, query, limit)
+        timings = {'vector': seconds}
+    else:
+        keyword = _executor.submit(_timed, search_keyword, client, query, limit)
+        vector = _executor.submit(_timed, search_basic, client, query, limit)
+        (keyword_results, keyword_seconds), (vector_results, vector_seconds) = keyword.result(), vector.result()
+        results = reciprocal_rank_fusion([keyword_results, vector_results], limit)
+        timings = {'keyword': keyword_seconds, 'vector': vector_seconds}
+    return {'path': path, 'results': results, 'seconds': timings}
@@ -0,0 +1,558 @@
+"""
+In-process read replica of the Post vectors for read-heavy query nodes.
+All Post vectors are exported from Weaviate into a memory-mapped float32
+matrix (normalized, so a dot product is the cosine similarity Weaviate ranks
+by) and their document, page, paragraph and content into a SQLite store.
+`search_basic` then runs top-k in process, with NumPy or an optional hnswlib
+index, and only the query is vectorized, once, by the transformers container.
+
+The replica refreshes incrementally: when the retrieval cache generation
+changes (every ingestion, deletion or reset bumps it) or REPLICA_REFRESH_SECONDS
+have passed, objects updated since the last refresh are fetched by their
+`_lastUpdateTimeUnix` and the deletions logged in the document catalog since
+then are replayed. Filtering by update time needs `indexTimestamps` in the
+schema; without it every refresh is a full export. Refreshes run in a
+background thread while searches keep using the data already there.
+
+Every process keeps its own replica in a subdirectory of REPLICA_DIR named
+after its pid; those of processes that exited are removed.
+
+Enable with READ_REPLICA=1. Time a full export, or check a replica against
+Weaviate, on a throwaway replica that serving processes never use:
+    python -m core.search.read_replica refresh
+    python -m core.search.read_replica compare "query one" "query two"
+"""
+import argparse
+import functools
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+
+from core.weaviate.cache import retrieval_cache
+from core.weaviate.catalog import document_catalog
+from core.weaviate.client import resolve_client
+from core.weaviate.graphql import POST_FIELDS, build_get, parse_posts
+
+READ_REPLICA = os.getenv('READ_REPLICA') == '1'
+REPLICA_DIR = os.getenv('REPLICA_DIR', os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), 'replica'))
+REPLICA_INDEX = os.getenv('REPLICA_INDEX', 'exact')
+REPLICA_REFRESH_SECONDS = float(os.getenv('REPLICA_REFRESH_SECONDS', '60'))
+REPLICA_PAGE_SIZE = int(os.getenv('REPLICA_PAGE_SIZE', '500'))
+REPLICA_VECTORIZER_URL = os.getenv('REPLICA_VECTORIZER_URL', 'http://localhost:8081')
+REPLICA_HNSW_EF = int(os.getenv('REPLICA_HNSW_EF', '128'))
+REPLICA_INDEXES = ('exact', 'hnsw')
+QUERY_VECTOR_CACHE_SIZE = 4096
+INITIAL_CAPACITY = 1024
+
+
+@functools.lru_cache(maxsize=QUERY_VECTOR_CACHE_SIZE)
+def _vectorize(text, url):
+    response = requests.post(f'{url.rstrip("/")}/vectors', json={'text': text}, timeout=30)
+    response.raise_for_status()
+    vector = np.asarray(response.json()['vector'], dtype=np.float32)
+    vector.setflags(write=False)
+    return vector
+
+
+def vectorize_query(text, url=REPLICA_VECTORIZER_URL):
+    """
+    Returns the vector of a query from the transformers inference container,
+    the model Weaviate's text2vec-transformers module uses. Vectors of recent
+    queries are cached.
+    """
+    return _vectorize(text, url)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _raw(client, query, what):
+    res = client.query.raw(query)
+    if res.get('errors'):
+        raise RuntimeError(f'{what} failed: {res["errors"]}')
+    return res['data']['Get']['Post'] or []
+
+
+def iter_post_vectors(client, updated_since=None, page_size=REPLICA_PAGE_SIZE):
+    """
+    Pages through Post objects with their vectors and update times.
+
+    Args:
+        client: Weaviate client instance.
+        updated_since (int): Only objects updated at or after this Unix time in
+            milliseconds; needs `indexTimestamps`. None exports every object
+            with the cursor API, which has no result limit.
+        page_size (int): Objects fetched per GraphQL request.
+
+    Yields:
+        dict: POST_FIELDS plus 'id', 'vector' and 'updated' of each object.
+    """
+    fields = f'{POST_FIELDS} _additional {{id vector lastUpdateTimeUnix}}'
+    after, offset = None, 0
+    while True:
+        if updated_since is None:
+            cursor = f', after: {json.dumps(after)}' if after else ''
+            selection = f'Post(limit: {page_size}{cursor}) {{{fields}}}'
+        else:
+            # The cursor API cannot filter, so updated objects are paged by offset.
+            where = ('{path: ["_lastUpdateTimeUnix"], operator: GreaterThanEqual, valueText: %s}'
+                     % json.dumps(str(updated_since)))
+            selection = f'Post(where: {where}, limit: {page_size}, offset: {offset}) {{{fields}}}'
+        posts = _raw(client, build_get([selection]), 'Exporting Post vectors')
+        for post in posts:
+            additional = post.pop('_additional')
+            post['id'] = additional['id']
+            post['vector'] = additional['vector']
+            post['updated'] = int(additional['lastUpdateTimeUnix'])
+            yield post
+        if len(posts) < page_size:
+            return
+        after = posts[-1]['id']
+        offset += page_size
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def process_replica_dir(root=REPLICA_DIR):
+    """
+    Returns the replica directory of this process under `root`, removing
+    those of processes that no longer run.
+    """
+    os.makedirs(root, exist_ok=True)
+    for name in os.listdir(root):
+        if name.isdigit() and int(name) != os.getpid() and not _pid_alive(int(name)):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return os.path.join(root, str(os.getpid()))
+
+
+class _HnswIndex:
+    """hnswlib inner-product index over replica rows, labelled by row number."""
+    def __init__(self, dim, capacity):
+        try:
+            import hnswlib
+        except ImportError as err:
+            raise ImportError("REPLICA_INDEX 'hnsw' requires the hnswlib package (pip install hnswlib)") from err
+        self.index = hnswlib.Index(space='ip', dim=dim)
+        self.index.init_index(max_elements=capacity, ef_construction=200, M=16)
+        self.index.set_ef(REPLICA_HNSW_EF)
+
+    def upsert(self, vectors, rows):
+        """Adds rows, or replaces the vectors of rows already indexed or deleted."""
+        needed = int(rows.max()) + 1
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+        self.index.add_items(vectors, rows)
+
+    def delete(self, rows):
+        for row in rows:
+            self.index.mark_deleted(int(row))
+
+    def search(self, query, limit):
+        self.index.set_ef(max(REPLICA_HNSW_EF, limit))
+        rows, _ = self.index.knn_query(query, k=limit)
+        return rows[0].astype(np.int64)
+
+
+class ReadReplica:
+    """
+    Memory-mapped Post vectors and their metadata, kept in sync with Weaviate.
+    Rows of deleted objects are zeroed and reused by later inserts. Changes
+    are applied a page at a time, so searches can run during a refresh.
+    """
+    def __init__(self, path=None, index=REPLICA_INDEX, catalog=None):
+        """
+        Args:
+            path (str): Directory holding `vectors.f32` and `replica.sqlite3`;
+                defaults to this process's directory under REPLICA_DIR.
+            index (str): 'exact' for NumPy dot products, 'hnsw' for an hnswlib index.
+            catalog (DocumentCatalog): Catalog whose deletion log is replayed;
+                defaults to the shared document catalog.
+        """
+        if index not in REPLICA_INDEXES:
+            raise ValueError(f'Unknown replica index {index!r}, expected one of {REPLICA_INDEXES}')
+        path = path or process_replica_dir()
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.index_kind = index
+        self.catalog = catalog or document_catalog
+        self.vectors_path = os.path.join(path, 'vectors.f32')
+        self.db_path = os.path.join(path, 'replica.sqlite3')
+        self.generation = None
+        self.refreshed_at = 0.0
+        # Guards the rows: held while searching and while applying one page of changes.
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.RLock()
+        self._refreshing = False
+        self._index = None
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS objects (row INTEGER PRIMARY KEY, id TEXT UNIQUE, '
+                         'document TEXT, page TEXT, paragraph TEXT, content TEXT, updated INTEGER)')
+            conn.execute('CREATE INDEX IF NOT EXISTS objects_document ON objects (document)')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        self._load()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _meta(self, conn, name, default=None):
+        row = conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _load(self):
+        with self._connect() as conn:
+            self.dim = self._meta(conn, 'dim')
+            self.capacity = self._meta(conn, 'capacity', 0)
+            self.watermark = self._meta(conn, 'watermark')
+            self.deletion_seq = self._meta(conn, 'deletion_seq', 0)
+            rows = [row for row, in conn.execute('SELECT row FROM objects')]
+        self.alive = np.zeros(self.capacity, dtype=bool)
+        self.alive[rows] = True
+        self.vectors = None
+        if self.dim and self.capacity:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+',
+                                     shape=(self.capacity, self.dim))
+        self._index = None
+        if self.index_kind == 'hnsw' and rows:
+            self._index = _HnswIndex(self.dim, self.capacity)
+            self._index.upsert(np.asarray(self.vectors[rows]), np.asarray(rows))
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    def _ensure_capacity(self, conn, dim, needed):
+        if self.dim is not None and dim != self.dim:
+            raise ValueError(f'Vector dimension changed from {self.dim} to {dim}; rebuild the replica')
+        if needed <= self.capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, self.capacity)
+        while capacity < needed:
+            capacity *= 2
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        with open(self.vectors_path, 'ab') as vectors_file:
+            vectors_file.truncate(capacity * dim * 4)
+        self.dim, self.capacity = dim, capacity
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(capacity, dim))
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (json.dumps(dim),))
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('capacity', ?)", (json.dumps(capacity),))
+
+    def _upsert(self, posts):
+        """Writes a page of exported posts; returns the rows written."""
+        vectors = _normalize(np.asarray([post['vector'] for post in posts], dtype=np.float32))
+        with self._lock, self._connect() as conn:
+            rows = []
+            free = iter(np.flatnonzero(~self.alive).tolist())
+            next_row = len(self.alive)
+            for post in posts:
+                found = conn.execute('SELECT row FROM objects WHERE id = ?', (post['id'],)).fetchone()
+                if found:
+                    rows.append(found[0])
+                else:
+                    row = next(free, None)
+                    if row is None:
+                        row, next_row = next_row, next_row + 1
+                    rows.append(row)
+                    if row < len(self.alive):
+                        self.alive[row] = True
+            self._ensure_capacity(conn, vectors.shape[1], max(rows) + 1)
+            rows = np.asarray(rows)
+            self.vectors[rows] = vectors
+            self.alive[rows] = True
+            conn.executemany('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             [(int(row), post['id'], post['document'], post['page'], post['paragraph'],
+                               post['content'], post['updated']) for row, post in zip(rows, posts)])
+            if self._index is None and self.index_kind == 'hnsw':
+                self._index = _HnswIndex(self.dim, self.capacity)
+            if self._index is not None:
+                self._index.upsert(vectors, rows)
+        return rows
+
+    def _drop(self, conn, found):
+        """Deletes the (id, row) pairs in `found`; returns how many were deleted."""
+        if not found:
+            return 0
+        rows = np.asarray([row for _, row in found], dtype=np.int64)
+        conn.executemany('DELETE FROM objects WHERE id = ?', [(object_id,) for object_id, _ in found])
+        self.vectors[rows] = 0
+        self.alive[rows] = False
+        if self._index is not None:
+            self._index.delete(rows)
+        return len(rows)
+
+    def _apply_deletions(self, entries):
+        """
+        Replays deletion log entries. Objects updated after their deletion was
+        logged were imported again and are kept.
+        """
+        deleted = 0
+        with self._lock, self._connect() as conn:
+            for object_id, document, deleted_at in entries:
+                column, value = ('id', object_id) if object_id is not None else ('document', document)
+                found = conn.execute(f'SELECT id, row FROM objects WHERE {column} = ? AND updated <= ?',
+                                     (value, int(deleted_at * 1000))).fetchall()
+                deleted += self._drop(conn, found)
+        return deleted
+
+    def _sweep(self, exported):
+        """Deletes every object that is not in `exported`, the ids of a full export."""
+        with self._lock, self._connect() as conn:
+            found = [(object_id, row) for object_id, row in conn.execute('SELECT id, row FROM objects')
+                     if object_id not in exported]
+            return self._drop(conn, found)
+
+    def clear(self):
+        """Drops every object; the next refresh is a full export."""
+        with self._refresh_lock, self._lock:
+            with self._connect() as conn:
+                conn.execute('DELETE FROM objects')
+                conn.execute('DELETE FROM meta')
+            self.vectors = None
+            if os.path.exists(self.vectors_path):
+                os.remove(self.vectors_path)
+            self._load()
+
+    def _export(self, client, updated_since, exported=None):
+        """
+        Upserts every object updated since `updated_since` (all if None),
+        adding their ids to `exported` if given.
+
+        Returns:
+            tuple: Number of objects upserted and the latest update time seen.
+        """
+        upserted = 0
+        watermark = updated_since or 0
+        page = []
+        for post in iter_post_vectors(client, updated_since):
+            page.append(post)
+            watermark = max(watermark, post['updated'])
+            if exported is not None:
+                exported.add(post['id'])
+            if len(page) == REPLICA_PAGE_SIZE:
+                upserted += len(self._upsert(page))
+                page = []
+        if page:
+            upserted += len(self._upsert(page))
+        return upserted, watermark
+
+    def refresh(self, client, full=False):
+        """
+        Brings the replica up to date with Weaviate. Searches keep running on
+        the current data while it refreshes.
+
+        Args:
+            client: Weaviate client instance.
+            full (bool): Export every object instead of only updated ones.
+
+        Returns:
+            dict: Number of objects 'upserted' and 'deleted', the 'seconds'
+                taken and whether the refresh was 'full'.
+        """
+        client = resolve_client(client)
+        start_time = time.perf_counter()
+        generation = retrieval_cache.generation()
+        with self._refresh_lock:
+            entries, deletion_seq = self.catalog.deletions_since(self.deletion_seq)
+            if entries and any(object_id is None and document is None for object_id, document, _ in entries):
+                # The schema was reset, so nothing stored is left.
+                self.clear()
+            # A replica that fell behind the pruned deletion log cannot replay it.
+            full = full or self.watermark is None or entries is None
+            try:
+                if full:
+                    exported = set()
+                    upserted, watermark = self._export(client, None, exported)
+                    deleted = self._sweep(exported)
+                else:
+                    deleted = self._apply_deletions(entries)
+                    upserted, watermark = self._export(client, self.watermark)
+            except RuntimeError as err:
+                if full:
+                    raise
+                # Most often a schema without indexTimestamps
+                print(f'Incremental replica refresh failed, exporting everything: {err}')
+                return self.refresh(client, full=True)
+            with self._lock, self._connect() as conn:
+                if self.vectors is not None:
+                    self.vectors.flush()
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('watermark', ?)", (json.dumps(watermark),))
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('deletion_seq', ?)",
+                             (json.dumps(deletion_seq),))
+                self.watermark = watermark
+                self.deletion_seq = deletion_seq
+                self.generation = generation
+                self.refreshed_at = time.monotonic()
+        stats = {'upserted': upserted, 'deleted': deleted, 'full': full,
+                 'seconds': round(time.perf_counter() - start_time, 3)}
+        print(f'Refreshed read replica ({len(self)} objects): {stats}')
+        return stats
+
+    def refresh_in_background(self, client):
+        """
+        Starts a refresh in a background thread unless one is running. A failed
+        refresh is retried once the data changes again or after
+        REPLICA_REFRESH_SECONDS.
+        """
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        generation = retrieval_cache.generation()
+
+        def run():
+            try:
+                self.refresh(client)
+            except Exception as err:
+                print(f'Read replica refresh failed: {err}')
+                with self._lock:
+                    self.generation = generation
+                    self.refreshed_at = time.monotonic()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='replica-refresh', daemon=True).start()
+
+    def is_stale(self):
+        return (self.generation != retrieval_cache.generation()
+                or time.monotonic() - self.refreshed_at > REPLICA_REFRESH_SECONDS)
+
+    def nearest_rows(self, vector, limit):
+        """Returns the rows of the `limit` vectors most similar to `vector`, best first."""
+        with self._lock:
+            if self.vectors is None or limit <= 0:
+                return np.empty(0, dtype=np.int64)
+            query = _normalize(np.asarray(vector, dtype=np.float32))
+            limit = min(limit, int(self.alive.sum()))
+            if limit <= 0:
+                return np.empty(0, dtype=np.int64)
+            if self._index is not None:
+                return self._index.search(query, limit)
+            scores = np.asarray(self.vectors @ query)
+            scores[~self.alive] = -np.inf
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            return top[np.argsort(-scores[top], kind='stable')]
+
+    def objects(self, rows):
+        """Returns the stored properties and 'id' of replica rows, in the given order."""
+        rows = [int(row) for row in rows]
+        if not rows:
+            return []
+        with self._connect() as conn:
+            found = {row[0]: row for row in conn.execute(
+                'SELECT row, id, document, page, paragraph, content FROM objects WHERE row IN (%s)'
+                % ','.join('?' * len(rows)), rows)}
+        return [{'id': found[row][1], 'document': found[row][2], 'page': found[row][3],
+                 'paragraph': found[row][4], 'content': found[row][5]} for row in rows if row in found]
+
+    def search(self, client, query, limit=10):
+        """
+        Near-text search in process. A replica that was never built is built
+        first; a stale one is refreshed in the background while this search
+        uses the current data.
+
+        Returns:
+            list: Results like `search_basic`.
+        """
+        if self.watermark is None:
+            self.refresh(client)
+        elif self.is_stale():
+            self.refresh_in_background(client)
+        vector = vectorize_query(query)
+        with self._lock:
+            return parse_posts(self.objects(self.nearest_rows(vector, limit)))
+
+
+_replica = None
+_replica_pid = None
+_replica_lock = threading.Lock()
+
+
+def get_read_replica():
+    """Returns this process's replica if READ_REPLICA=1, else None."""
+    global _replica, _replica_pid
+    if not READ_REPLICA:
+        return None
+    if _replica is None or _replica_pid != os.getpid():
+        with _replica_lock:
+            if _replica is None or _replica_pid != os.getpid():
+                _replica = ReadReplica()
+                _replica_pid = os.getpid()
+    return _replica
+
+
+def weaviate_nearest_ids(client, vector, limit):
+    """Returns the ids of Weaviate's `limit` nearest Posts to `vector`, best first."""
+    selection = 'Post(nearVector: {vector: %s}, limit: %d) {_additional {id}}' % (
+        json.dumps([float(value) for value in vector]), limit)
+    return [post['_additional']['id'] for post in _raw(client, build_get([selection]), 'nearVector search')]
+
+
+def compare_with_weaviate(client, replica, queries, limit=10):
+    """
+    Checks the replica against Weaviate: each query is vectorized once and
+    searched both in the replica and with Weaviate's nearVector.
+
+    Returns:
+        dict: Mean 'recall' (share of Weaviate's top `limit` ids the replica
+            also returned) and per-query recall and latencies.
+    """
+    client = resolve_client(client)
+    if replica.is_stale():
+        replica.refresh(client)
+    report = []
+    for query in queries:
+        vector = vectorize_query(query)
+        start_time = time.perf_counter()
+        replica_ids = [obj['id'] for obj in replica.objects(replica.nearest_rows(vector, limit))]
+        replica_seconds = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        weaviate_ids = weaviate_nearest_ids(client, vector, limit)
+        weaviate_seconds = time.perf_counter() - start_time
+        recall = len(set(replica_ids) & set(weaviate_ids)) / len(weaviate_ids) if weaviate_ids else 1.0
+        report.append({'query': query, 'recall': recall, 'same_order': replica_ids == weaviate_ids,
+                       'replica_seconds': round(replica_seconds, 4),
+                       'weaviate_seconds': round(weaviate_seconds, 4)})
+    recall = sum(item['recall'] for item in report) / len(report) if report else 1.0
+    return {'recall': recall, 'queries': report}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time a full export into, or check, a throwaway read replica. Serving processes '
+                    'build their own replicas, so this does not refresh them.')
+    parser.add_argument('command', choices=('refresh', 'compare'))
+    parser.add_argument('queries', nargs='*')
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    client = resolve_client(None)
+    with tempfile.TemporaryDirectory(prefix='replica-') as path:
+        replica = ReadReplica(path)
+        if args.command == 'refresh':
+            replica.refresh(client)
+        else:
+            print(json.dumps(compare_with_weaviate(client, replica, args.queries, args.limit), indent=2))
+
+
+if __name__ == '__main__':
+    main()
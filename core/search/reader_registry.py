@@ -0,0 +1,255 @@
+"""
+Process-wide registry of extractive QA reader models.
+Loads each reader once per process, warms it up explicitly and supports
+preloading in a parent process so forked workers share the weights.
+
+Readers run on one of the READER_BACKENDS, selected at startup through the
+READER_BACKEND environment variable or `configure_backend`:
+    fp32       eager full precision PyTorch
+    int8       dynamically int8-quantized linear layers under inference_mode
+    inference  full precision under inference_mode with explicit thread settings
+"""
+import contextlib
+import gc
+import os
+import resource
+import threading
+import time
+
+import torch
+from transformers import BigBirdForQuestionAnswering, BigBirdTokenizerFast
+
+DEFAULT_READER_MODEL = os.getenv('READER_MODEL', 'google/bigbird-base-trivia-itc')
+READER_BACKENDS = ('fp32', 'int8', 'inference')
+READER_BACKEND = os.getenv('READER_BACKEND', 'fp32')
+READER_THREADS = int(os.getenv('READER_THREADS', '0'))
+WARMUP_QUESTION = 'What is being warmed up?'
+WARMUP_CONTEXT = 'The reader model is being warmed up before serving queries.'
+
+torch.set_grad_enabled(False)
+
+_readers = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def resident_memory_mb():
+    """
+    Returns the resident set size of the current process in megabytes.
+    Falls back to the peak RSS reported by getrusage where /proc is unavailable.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def configure_backend(backend, threads=None):
+    """
+    Selects the default reader backend and intra-op thread count. Meant to be
+    called once at startup, before the first reader is loaded.
+
+    Args:
+        backend (str): One of READER_BACKENDS.
+        threads (int): Intra-op threads for PyTorch; None or 0 keeps the default.
+
+    Returns:
+        None
+    """
+    global READER_BACKEND, READER_THREADS
+    if backend not in READER_BACKENDS:
+        raise ValueError(f'Unknown reader backend {backend!r}, expected one of {READER_BACKENDS}')
+    READER_BACKEND = backend
+    if threads is not None:
+        READER_THREADS = threads
+    _apply_threads()
+
+
+def _apply_threads():
+    """Applies READER_THREADS to the PyTorch intra-op (and, if possible, inter-op) pools."""
+    if READER_THREADS > 0:
+        torch.set_num_threads(READER_THREADS)
+        try:
+            # A single forward pass at a time needs no inter-op parallelism. This
+            # can only be set before the inter-op pool has started.
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+
+
+def inference_context(backend=None):
+    """
+    Returns the context manager reader forward passes should run under.
+
+    Args:
+        backend (str): Reader backend, or None for the configured default.
+
+    Returns:
+        A context manager: torch.inference_mode() for the int8 and inference
+            backends, a no-op for fp32.
+    """
+    if (backend or READER_BACKEND) == 'fp32':
+        return contextlib.nullcontext()
+    return torch.inference_mode()
+
+
+def _load(model_name, backend):
+    """Loads a model and tokenizer from disk or the hub and records timings."""
+    if backend not in READER_BACKENDS:
+        raise ValueError(f'Unknown reader backend {backend!r}, expected one of {READER_BACKENDS}')
+    rss_before = resident_memory_mb()
+    start_time = time.perf_counter()
+    model = BigBirdForQuestionAnswering.from_pretrained(model_name)
+    model.eval()
+    if backend == 'int8':
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend != 'fp32':
+        _apply_threads()
+    # The fast tokenizer provides the offset mapping used to recover answer text.
+    tokenizer = BigBirdTokenizerFast.from_pretrained(model_name)
+    _stats[(model_name, backend)] = {
+        'model': model_name,
+        'backend': backend,
+        'load_seconds': time.perf_counter() - start_time,
+        'warmup_seconds': None,
+        'rss_mb_before': rss_before,
+        'rss_mb_after': resident_memory_mb(),
+        'pid': os.getpid(),
+    }
+    return model, tokenizer
+
+
+def get_reader(model_name=DEFAULT_READER_MODEL, backend=None):
+    """
+    Returns the (model, tokenizer) pair for `model_name`, loading it on first use.
+
+    Args:
+        model_name (str): Hugging Face model identifier or local path.
+        backend (str): One of READER_BACKENDS, or None for the configured default.
+
+    Returns:
+        tuple: (model, tokenizer)
+    """
+    key = (model_name, backend or READER_BACKEND)
+    reader = _readers.get(key)
+    if reader is None:
+        with _lock:
+            reader = _readers.get(key)
+            if reader is None:
+                reader = _load(*key)
+                _readers[key] = reader
+    return reader
+
+
+def warmup(model_name=DEFAULT_READER_MODEL, backend=None):
+    """
+    Runs one small forward pass so the first real query does not pay for
+    lazy kernel and allocator initialization.
+
+    Args:
+        model_name (str): Reader to warm up.
+        backend (str): Reader backend, or None for the configured default.
+
+    Returns:
+        float: Seconds spent in the warmup pass.
+    """
+    key = (model_name, backend or READER_BACKEND)
+    model, tokenizer = get_reader(*key)
+    start_time = time.perf_counter()
+    inputs = tokenizer(WARMUP_QUESTION, WARMUP_CONTEXT, return_tensors='pt')
+    with inference_context(key[1]):
+        model(**inputs)
+    elapsed = time.perf_counter() - start_time
+    _stats[key]['warmup_seconds'] = elapsed
+    _stats[key]['rss_mb_after'] = resident_memory_mb()
+    return elapsed
+
+
+def preload(model_names=(DEFAULT_READER_MODEL,), run_warmup=False):
+    """
+    Loads readers in the current (parent) process before workers are forked.
+    Afterwards the collector is frozen so that garbage collection passes in
+    the children do not touch, and therefore copy, the shared weight pages.
+
+    Warmup is off by default here: the OpenMP thread pool created by a forward
+    pass does not survive fork, so children should call `warmup` themselves.
+
+    Args:
+        model_names (iterable): Readers to load.
+        run_warmup (bool): Whether to also run a warmup pass in this process.
+
+    Returns:
+        list: Load statistics for each preloaded reader.
+    """
+    for model_name in model_names:
+        model, _ = get_reader(model_name)
+        for param in model.parameters():
+            param.requires_grad_(False)
+        if run_warmup:
+            warmup(model_name)
+    gc.collect()
+    gc.freeze()
+    return [reader_stats(model_name, READER_BACKEND) for model_name in model_names]
+
+
+def unload(model_name=DEFAULT_READER_MODEL, backend=None):
+    """
+    Drops a reader from the registry so its memory can be reclaimed.
+
+    Args:
+        model_name (str): Reader to unload.
+        backend (str): Reader backend, or None for the configured default.
+
+    Returns:
+        bool: True if the reader was loaded.
+    """
+    key = (model_name, backend or READER_BACKEND)
+    with _lock:
+        reader = _readers.pop(key, None)
+        _stats.pop(key, None)
+    if reader is None:
+        return False
+    del reader
+    gc.collect()
+    return True
+
+
+def reload(model_name=DEFAULT_READER_MODEL, backend=None, run_warmup=True):
+    """
+    Unloads and loads a reader again, e.g. after the weights on disk changed.
+
+    Args:
+        model_name (str): Reader to reload.
+        backend (str): Reader backend, or None for the configured default.
+        run_warmup (bool): Whether to warm the fresh reader up.
+
+    Returns:
+        dict: Load statistics for the reloaded reader.
+    """
+    unload(model_name, backend)
+    get_reader(model_name, backend)
+    if run_warmup:
+        warmup(model_name, backend)
+    return reader_stats(model_name, backend)
+
+
+def reader_stats(model_name=None, backend=None):
+    """
+    Reports load time, warmup time and resident memory for loaded readers.
+
+    Args:
+        model_name (str): Reader to report on, or None for all readers.
+        backend (str): Reader backend, or None for the configured default.
+
+    Returns:
+        dict: Statistics for one reader, or a mapping of "model:backend" to statistics.
+    """
+    if model_name is not None:
+        key = (model_name, backend or READER_BACKEND)
+        stats = dict(_stats.get(key, {'model': model_name, 'backend': key[1]}))
+        stats['loaded'] = key in _readers
+        stats['rss_mb'] = resident_memory_mb()
+        return stats
+    return {f'{name}:{backend}': reader_stats(name, backend) for name, backend in list(_stats)}
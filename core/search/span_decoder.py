@@ -0,0 +1,143 @@
+"""
+Vectorized answer span decoding for extractive QA readers.
+Scores the n-best (start, end) pairs of every sequence in one tensor operation
+and splits long contexts into overlapping windows that fit the reader.
+"""
+import os
+
+import torch
+
+N_BEST = int(os.getenv('READER_N_BEST', '5'))
+MAX_ANSWER_LENGTH = int(os.getenv('READER_MAX_ANSWER_LENGTH', '30'))
+READER_MAX_LENGTH = int(os.getenv('READER_MAX_LENGTH', '1024'))
+READER_STRIDE = int(os.getenv('READER_STRIDE', '128'))
+
+
+def best_spans(start_logits, end_logits, context_mask, top_k=N_BEST,
+               max_answer_length=MAX_ANSWER_LENGTH):
+    """
+    Finds the top-k answer spans of each sequence in a batch.
+    Only spans with start <= end < start + max_answer_length whose tokens are
+    all inside the context are considered.
+
+    Args:
+        start_logits (torch.Tensor): (batch, seq_len) start scores.
+        end_logits (torch.Tensor): (batch, seq_len) end scores.
+        context_mask (torch.Tensor): (batch, seq_len) bool, True for context tokens.
+        top_k (int): Number of spans to return per sequence.
+        max_answer_length (int): Maximum span length in tokens.
+
+    Returns:
+        tuple: (scores, starts, ends), each of shape (batch, k). Scores are the
+            mean of the start and end logits; impossible spans score -inf.
+    """
+    batch_size, seq_len = start_logits.shape
+    max_answer_length = min(max_answer_length, seq_len)
+    neg_inf = torch.finfo(start_logits.dtype).min
+
+    start_logits = start_logits.masked_fill(~context_mask, neg_inf)
+    end_logits = end_logits.masked_fill(~context_mask, neg_inf)
+
+    # band[b, i, j] scores the span starting at token i and ending at token i + j,
+    # so the (seq_len x max_answer_length) band replaces the full seq_len^2 matrix.
+    padded_end = torch.nn.functional.pad(end_logits, (0, max_answer_length - 1), value=neg_inf)
+    band = start_logits.unsqueeze(2) + padded_end.unfold(1, max_answer_length, 1)
+
+    k = min(top_k, seq_len * max_answer_length)
+    scores, flat_index = band.view(batch_size, -1).topk(k, dim=1)
+    starts = torch.div(flat_index, max_answer_length, rounding_mode='floor')
+    ends = starts + flat_index % max_answer_length
+    scores = torch.where(scores > neg_inf / 2, scores / 2, torch.full_like(scores, float('-inf')))
+    return scores, starts, ends
+
+
+def encode_windows(tokenizer, question, contexts, max_length=READER_MAX_LENGTH,
+                   stride=READER_STRIDE):
+    """
+    Tokenizes (question, context) pairs, splitting contexts that do not fit in
+    `max_length` tokens into windows that overlap by `stride` tokens.
+    Requires a fast tokenizer for the offset mapping.
+
+    Args:
+        tokenizer: Fast tokenizer of the reader model.
+        question (str): Question text.
+        contexts (list): Context strings.
+        max_length (int): Maximum tokens per window, question included.
+        stride (int): Number of context tokens shared by consecutive windows.
+
+    Returns:
+        list: One dict per window with 'features' (input_ids, token_type_ids,
+            attention_mask), 'context' (index into `contexts`), 'offsets'
+            (character offsets) and 'context_mask' (True for context tokens).
+    """
+    encoded = tokenizer([question] * len(contexts), contexts,
+                        truncation='only_second',
+                        max_length=max_length,
+                        stride=stride,
+                        return_overflowing_tokens=True,
+                        return_offsets_mapping=True,
+                        return_token_type_ids=True,
+                        return_attention_mask=True)
+    windows = []
+    for i, context_index in enumerate(encoded['overflow_to_sample_mapping']):
+        sequence_ids = encoded.sequence_ids(i)
+        windows.append({
+            'features': {
+                'input_ids': encoded['input_ids'][i],
+                'token_type_ids': encoded['token_type_ids'][i],
+                'attention_mask': encoded['attention_mask'][i],
+            },
+            'context': context_index,
+            'offsets': encoded['offset_mapping'][i],
+            'context_mask': [sequence_id == 1 for sequence_id in sequence_ids],
+        })
+    return windows
+
+
+def decode_windows(model, tokenizer, windows, num_contexts, top_k=N_BEST,
+                   batch_size=8, max_answer_length=MAX_ANSWER_LENGTH):
+    """
+    Runs the reader over `windows` in padded batches of `batch_size` and merges
+    the spans of all windows of a context into one n-best list.
+
+    Args:
+        model: Reader model returning start_logits and end_logits.
+        tokenizer: Tokenizer used to build the windows (for padding).
+        windows (list): Output of `encode_windows`.
+        num_contexts (int): Number of contexts the windows were built from.
+        top_k (int): Number of spans to keep per context.
+        batch_size (int): Windows per forward pass.
+        max_answer_length (int): Maximum span length in tokens.
+
+    Returns:
+        list: For each context, up to `top_k` (score, start_char, end_char)
+            tuples sorted by descending score.
+    """
+    candidates = [{} for _ in range(num_contexts)]
+
+    # Windows of similar length share a batch so little compute goes to padding.
+    order = sorted(range(len(windows)), key=lambda i: len(windows[i]['offsets']))
+    for batch_start in range(0, len(order), batch_size):
+        batch = [windows[i] for i in order[batch_start:batch_start + batch_size]]
+        inputs = tokenizer.pad([window['features'] for window in batch], return_tensors='pt')
+        seq_len = inputs['input_ids'].shape[1]
+        context_mask = torch.tensor([window['context_mask'] + [False] * (seq_len - len(window['context_mask']))
+                                     for window in batch])
+
+        model_result = model(**inputs)
+        scores, starts, ends = best_spans(model_result.start_logits, model_result.end_logits,
+                                          context_mask, top_k, max_answer_length)
+
+        for row, window in enumerate(batch):
+            spans = candidates[window['context']]
+            offsets = window['offsets']
+            for score, start, end in zip(scores[row].tolist(), starts[row].tolist(), ends[row].tolist()):
+                if score == float('-inf'):
+                    break
+                span = (offsets[start][0], offsets[end][1])
+                # Overlapping windows can propose the same span; keep its best score.
+                if score > spans.get(span, float('-inf')):
+                    spans[span] = score
+
+    return [sorted(((score, start, end) for (start, end), score in spans.items()), reverse=True)[:top_k]
+            for spans in candidates]
@@ -1 +1,13 @@
-# Empty file to make the directory a Python package 
\ No newline at end of file
+"""
+Weaviate connection, schema and data operations.
+"""
+from core.weaviate.client import (WeaviateUnavailable, create_client, establish_connection, get_client,
+                                  retrieve_password)
+from core.weaviate.schema import get_default_schema, init_schema
+from core.weaviate.operations import (search_qa, import_data, link_in_weaviate, links_in_weaviate,
+                                      delete_link_data, remove_resource_data,
+                                      search_for_questions)
+from core.weaviate.importer import BatchImporter, ImportStats, import_records
+from core.weaviate.sync import SyncStats, iter_document_objects, sync_records
+from core.weaviate.deletion import delete_documents
+from core.weaviate.catalog import DocumentCatalog, document_catalog
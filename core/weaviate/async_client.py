@@ -0,0 +1,82 @@
+"""
+Non-blocking GraphQL client for the async (ASGI) app.
+Sends raw GraphQL queries to Weaviate over a pooled aiohttp session, with the
+timeouts and backoff of the synchronous client factory. GraphQL requests here
+are all queries, so every request is safe to retry. Needs the optional aiohttp
+package.
+"""
+import asyncio
+import os
+import random
+
+from core.weaviate.client import (RETRY_STATUS_CODES, WEAVIATE_CONNECT_TIMEOUT, WEAVIATE_QUERY_TIMEOUT,
+                                  WEAVIATE_RETRIES, WEAVIATE_RETRY_BACKOFF, WEAVIATE_URL)
+
+# One event loop serves every request of a worker, so it can keep more
+# connections in flight than a thread pool would.
+WEAVIATE_ASYNC_POOL_SIZE = int(os.getenv('WEAVIATE_ASYNC_POOL_SIZE', '64'))
+
+
+def transient_errors():
+    """Returns the exceptions of a GraphQL request that failed to reach Weaviate."""
+    import aiohttp
+    return (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+class AsyncGraphQL:
+    """
+    Pooled async GraphQL connection to Weaviate. Create it inside a running
+    event loop and use it as an async context manager, or call `aclose()`
+    when done.
+    """
+    def __init__(self, url=WEAVIATE_URL, pool_size=WEAVIATE_ASYNC_POOL_SIZE, retries=WEAVIATE_RETRIES,
+                 backoff=WEAVIATE_RETRY_BACKOFF):
+        """
+        Args:
+            url (str): Weaviate URL.
+            pool_size (int): Maximum number of concurrent connections.
+            retries (int): Retries on connection errors, timeouts and 502/503/504.
+            backoff (float): Seconds before the first retry; doubled on every retry.
+        """
+        try:
+            import aiohttp
+        except ImportError as err:
+            raise ImportError('The async app requires the aiohttp package (pip install aiohttp)') from err
+        self.url = url.rstrip('/') + '/v1/graphql'
+        self.retries = retries
+        self.backoff = backoff
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=pool_size),
+            timeout=aiohttp.ClientTimeout(sock_connect=WEAVIATE_CONNECT_TIMEOUT, sock_read=WEAVIATE_QUERY_TIMEOUT))
+
+    async def raw(self, query):
+        """
+        Sends a GraphQL query and returns the decoded response, like the
+        synchronous client's `query.raw`.
+
+        Raises:
+            aiohttp.ClientConnectionError, asyncio.TimeoutError: If Weaviate
+                cannot be reached after retrying.
+            aiohttp.ClientResponseError: On an unexpected HTTP status.
+        """
+        transient = transient_errors()
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.session.post(self.url, json={'query': query}) as response:
+                    if response.status not in RETRY_STATUS_CODES or attempt == self.retries:
+                        response.raise_for_status()
+                        return await response.json()
+            except transient:
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.0))
+
+    async def aclose(self):
+        await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.aclose()
+        return False
@@ -0,0 +1,233 @@
+"""
+In-process LRU + TTL cache for retrieval results.
+Entries are keyed on (normalized query, limit, search mode) and on the current
+data generation. Every write to Weaviate bumps the generation, so results
+computed before an ingestion, deletion or schema reset are never served again.
+
+Setting RETRIEVAL_CACHE_PATH to a SQLite file shares both the entries and the
+generation counter between worker processes on the same host. Without it the
+generation is per process, so multi-worker deployments should set it.
+"""
+import contextlib
+import copy
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+RETRIEVAL_CACHE_SIZE = int(os.getenv('RETRIEVAL_CACHE_SIZE', '1024'))
+RETRIEVAL_CACHE_TTL = float(os.getenv('RETRIEVAL_CACHE_TTL', '300'))
+RETRIEVAL_CACHE_PATH = os.getenv('RETRIEVAL_CACHE_PATH')
+
+
+def normalize_query(query):
+    """Lowercases `query` and collapses whitespace so trivial variants share an entry."""
+    return ' '.join(query.lower().split())
+
+
+class SharedCacheStore:
+    """
+    SQLite-backed store that lets several worker processes share cache entries
+    and the data generation counter. A connection is opened and closed per
+    operation so the store is safe to use across threads and forked processes.
+    """
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS entries '
+                         '(key TEXT PRIMARY KEY, value TEXT, expires REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)')
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Yields a connection, committing on success, and always closes it."""
+        with contextlib.closing(sqlite3.connect(self.path, timeout=5)) as conn:
+            with conn:
+                yield conn
+
+    def generation(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+
+    def bump_generation(self):
+        with self._connect() as conn:
+            conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+            conn.execute('DELETE FROM entries')
+            return conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute('SELECT value, expires FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, key, value, expires):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?)',
+                         (key, json.dumps(value), expires))
+            conn.execute('DELETE FROM entries WHERE expires < ?', (time.time(),))
+            conn.execute('DELETE FROM entries WHERE key NOT IN '
+                         '(SELECT key FROM entries ORDER BY expires DESC LIMIT ?)',
+                         (self.max_entries,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM entries')
+
+
+class RetrievalCache:
+    """
+    LRU + TTL cache of retrieval results with generation-based invalidation
+    and hit/miss/eviction counters.
+    """
+    def __init__(self, max_entries=RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL,
+                 shared_path=RETRIEVAL_CACHE_PATH):
+        """
+        Args:
+            max_entries (int): Entries kept in process before the least recently used is evicted.
+            ttl (float): Seconds an entry stays valid; 0 disables caching.
+            shared_path (str): Optional SQLite file shared between worker processes.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = SharedCacheStore(shared_path, max_entries) if shared_path else None
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'evictions': 0,
+                         'expirations': 0, 'invalidations': 0}
+
+    def generation(self):
+        """Returns the current data generation."""
+        if self.shared is not None:
+            try:
+                return self.shared.generation()
+            except sqlite3.Error as err:
+                print(f'Shared retrieval cache unavailable: {err}')
+        return self._generation
+
+    def bump_generation(self):
+        """
+        Marks all cached results as stale. Called by every operation that
+        writes to or deletes from Weaviate.
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.counters['invalidations'] += 1
+        if self.shared is not None:
+            try:
+                self.shared.bump_generation()
+            except sqlite3.Error as err:
+                print(f'Shared retrieval cache unavailable: {err}')
+
+    def _key(self, query, limit, mode, generation=None):
+        if generation is None:
+            generation = self.generation()
+        return json.dumps([generation, mode, limit, normalize_query(query)])
+
+    def get(self, query, limit, mode, generation=None):
+        """
+        Returns a copy of the cached results for the lookup, or None on a miss.
+        Pass the `generation` already read for this lookup to skip reading it again.
+        """
+        key = self._key(query, limit, mode, generation)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires >= now:
+                    self._entries.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+                self.counters['expirations'] += 1
+        if self.shared is not None:
+            try:
+                entry = self.shared.get(key)
+            except sqlite3.Error:
+                entry = None
+            if entry is not None:
+                self._store(key, *entry)
+                with self._lock:
+                    self.counters['shared_hits'] += 1
+                return copy.deepcopy(entry[0])
+        with self._lock:
+            self.counters['misses'] += 1
+        return None
+
+    def put(self, query, limit, mode, value, generation=None):
+        """Caches `value` as the results of the lookup, under `generation` if given."""
+        key = self._key(query, limit, mode, generation)
+        expires = time.time() + self.ttl
+        self._store(key, copy.deepcopy(value), expires)
+        if self.shared is not None:
+            try:
+                self.shared.put(key, value, expires)
+            except sqlite3.Error as err:
+                print(f'Shared retrieval cache unavailable: {err}')
+
+    def _store(self, key, value, expires):
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def get_or_compute(self, query, limit, mode, compute):
+        """
+        Returns the cached results for the lookup, calling `compute()` and
+        caching its result on a miss.
+        """
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return compute()
+        generation = self.generation()
+        cached = self.get(query, limit, mode, generation)
+        if cached is not None:
+            return cached
+        value = compute()
+        # Do not cache results that raced with a write to Weaviate.
+        if self.generation() == generation:
+            self.put(query, limit, mode, value, generation)
+        return value
+
+    def clear(self):
+        """Drops every cached entry without changing the generation."""
+        with self._lock:
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        """Returns the cache counters, current size and generation."""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['size'] = len(self._entries)
+        stats['generation'] = self.generation()
+        return stats
+
+
+retrieval_cache = RetrievalCache()
+
+
+def cached_retrieval(mode):
+    """
+    Decorates a `search(client, query, limit)` function so its results are
+    served from `retrieval_cache` under the given search `mode`.
+    """
+    def decorator(search):
+        @functools.wraps(search)
+        def wrapper(client, query, limit=10):
+            return retrieval_cache.get_or_compute(query, limit, mode,
+                                                  lambda: search(client, query, limit))
+        return wrapper
+    return decorator
@@ -0,0 +1,303 @@
+"""
+Persistent local catalog of the documents ingested into Weaviate.
+Keeps, per document, its type, chunk count, a hash over its chunks' content
+hashes, its ingest status and timestamps in a SQLite file. The import, sync,
+delete and schema paths keep it up to date, so checking which of N links are
+already ingested is one local lookup instead of N GraphQL queries.
+
+If the catalog gets out of step with Weaviate (e.g. it was created after the
+data, or Weaviate was modified by another host), rebuild it with:
+    python -m core.weaviate.catalog reconcile
+
+The catalog also keeps a log of deleted objects, documents and schema resets,
+which read replicas replay instead of listing every object to find deletions.
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+
+DOCUMENT_CATALOG_PATH = os.getenv('DOCUMENT_CATALOG_PATH', os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), 'catalog.sqlite3'))
+RECONCILE_MAX_DOCUMENTS = int(os.getenv('RECONCILE_MAX_DOCUMENTS', '100000'))
+# Deletion log entries older than this are pruned; a reader further behind must resync fully.
+DELETION_LOG_SECONDS = float(os.getenv('DELETION_LOG_SECONDS', str(7 * 24 * 3600)))
+# SQLite's default limit of host parameters per statement is 999.
+LOOKUP_CHUNK = 500
+
+STATUS_INGESTING = 'ingesting'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+DIGEST_MODULUS = 2 ** 256
+
+COLUMNS = ('document', 'type', 'status', 'chunks', 'content_hash', 'error', 'created_at', 'updated_at')
+
+
+def chunk_digest(object_id, content_hash):
+    """Returns the digest of one chunk of a document as an integer (see document_hash)."""
+    digest = hashlib.sha256(f'{object_id}:{content_hash or ""}'.encode('utf-8')).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def format_digest(total):
+    """Formats a sum of chunk digests as a document hash."""
+    return f'{total % DIGEST_MODULUS:064x}'
+
+
+def document_hash(chunk_hashes):
+    """
+    Returns a hash over the content hashes of all chunks of a document, keyed by
+    object id. It is the sum of the chunks' digests, so it does not depend on
+    chunk order and can be accumulated while chunks stream in.
+    """
+    return format_digest(sum(chunk_digest(object_id, content_hash)
+                             for object_id, content_hash in chunk_hashes.items()))
+
+
+class DocumentCatalog:
+    """
+    SQLite-backed catalog of ingested documents. A connection is opened per
+    operation so the catalog is safe to use across threads and processes.
+    """
+    def __init__(self, path=DOCUMENT_CATALOG_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS documents ('
+                         'document TEXT PRIMARY KEY, type TEXT, status TEXT, chunks INTEGER, '
+                         'content_hash TEXT, error TEXT, created_at REAL, updated_at REAL)')
+            # A row with neither object_id nor document records a schema reset.
+            conn.execute('CREATE TABLE IF NOT EXISTS deletions (seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'object_id TEXT, document TEXT, deleted_at REAL)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, document):
+        """Returns the catalog entry of `document` as a dictionary, or None."""
+        with self._connect() as conn:
+            row = conn.execute(f'SELECT {", ".join(COLUMNS)} FROM documents WHERE document = ?',
+                               (document,)).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def entries(self):
+        """Returns every catalog entry, ordered by document."""
+        with self._connect() as conn:
+            rows = conn.execute(f'SELECT {", ".join(COLUMNS)} FROM documents ORDER BY document').fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def existing(self, documents, status=STATUS_READY):
+        """
+        Returns the subset of `documents` that the catalog holds with `status`.
+
+        Args:
+            documents (iterable): Links or paths to look up.
+            status (str): Required ingest status, or None for any status.
+
+        Returns:
+            set: Documents found.
+        """
+        documents = list(dict.fromkeys(documents))
+        found = set()
+        with self._connect() as conn:
+            for start in range(0, len(documents), LOOKUP_CHUNK):
+                chunk = documents[start:start + LOOKUP_CHUNK]
+                query = 'SELECT document FROM documents WHERE document IN (%s)' % ', '.join('?' * len(chunk))
+                params = list(chunk)
+                if status is not None:
+                    query += ' AND status = ?'
+                    params.append(status)
+                found.update(row[0] for row in conn.execute(query, params))
+        return found
+
+    def _upsert(self, conn, document, **fields):
+        now = time.time()
+        conn.execute('INSERT OR IGNORE INTO documents (document, created_at, updated_at) VALUES (?, ?, ?)',
+                     (document, now, now))
+        fields['updated_at'] = now
+        conn.execute('UPDATE documents SET %s WHERE document = ?' % ', '.join(f'{name} = ?' for name in fields),
+                     (*fields.values(), document))
+
+    def mark_ingesting(self, document, doc_type=None):
+        with self._connect() as conn:
+            self._upsert(conn, document, status=STATUS_INGESTING, type=doc_type, error=None)
+
+    def mark_ready(self, document, chunks, content_hash, doc_type=None):
+        with self._connect() as conn:
+            self._upsert(conn, document, status=STATUS_READY, chunks=chunks,
+                         content_hash=content_hash, type=doc_type, error=None)
+
+    def mark_failed(self, document, error):
+        with self._connect() as conn:
+            self._upsert(conn, document, status=STATUS_FAILED, error=str(error))
+
+    def remove(self, documents):
+        """Removes the entries of `documents`."""
+        with self._connect() as conn:
+            conn.executemany('DELETE FROM documents WHERE document = ?', [(doc,) for doc in documents])
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM documents')
+
+    def log_deletions(self, object_ids=(), documents=(), reset=False):
+        """
+        Appends deleted objects, deleted documents or a schema reset to the
+        deletion log, and prunes entries older than DELETION_LOG_SECONDS.
+        """
+        now = time.time()
+        entries = [(object_id, None, now) for object_id in object_ids]
+        entries += [(None, document, now) for document in documents]
+        if reset:
+            entries.append((None, None, now))
+        if not entries:
+            return
+        with self._connect() as conn:
+            conn.executemany('INSERT INTO deletions (object_id, document, deleted_at) VALUES (?, ?, ?)', entries)
+            conn.execute('DELETE FROM deletions WHERE deleted_at < ?', (now - DELETION_LOG_SECONDS,))
+
+    def deletions_since(self, seq):
+        """
+        Returns the deletion log entries after `seq`.
+
+        Args:
+            seq (int): Last entry already applied by the caller, 0 for none.
+
+        Returns:
+            tuple: (entries, last seq), where entries are (object_id, document,
+                deleted_at) in log order, with neither id nor document for a
+                schema reset. Entries is None if some entries after `seq` were
+                already pruned.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'deletions'").fetchone()
+            last = row[0] if row else 0
+            first = conn.execute('SELECT MIN(seq) FROM deletions').fetchone()[0]
+            if seq < last and (first is None or first > seq + 1):
+                return None, last
+            entries = conn.execute('SELECT object_id, document, deleted_at FROM deletions WHERE seq > ? AND seq <= ? '
+                                   'ORDER BY seq', (seq, last)).fetchall()
+        return entries, last
+
+    def reconcile(self, client, hashes=False):
+        """
+        Rebuilds the catalog from Weaviate with one Aggregate query grouped by
+        document. Entries of documents no longer in Weaviate are removed.
+
+        Args:
+            client: Weaviate client instance.
+            hashes (bool): Also list every object of every document to
+                recompute document hashes. Much slower on large collections.
+
+        Returns:
+            dict: Number of documents added, updated and removed.
+        """
+        # Imported here to avoid a circular import: the importer records into this catalog.
+        from core.weaviate.sync import stored_hashes
+
+        now = time.time()
+        counts = count_document_chunks(client)
+        known = {entry['document']: entry for entry in self.entries()}
+        # Network calls happen before the write transaction is opened.
+        document_hashes = {document: document_hash(stored_hashes(client, document))
+                           for document in counts} if hashes else {}
+        report = {'added': 0, 'updated': 0, 'removed': 0}
+        with self._connect() as conn:
+            for document, chunks in counts.items():
+                entry = known.get(document)
+                content_hash = document_hashes.get(document, entry['content_hash'] if entry else None)
+                if entry is None:
+                    report['added'] += 1
+                elif entry['chunks'] != chunks or entry['status'] != STATUS_READY \
+                        or entry['content_hash'] != content_hash:
+                    report['updated'] += 1
+                else:
+                    continue
+                self._upsert(conn, document, status=STATUS_READY, chunks=chunks,
+                             content_hash=content_hash, error=None)
+            stale = [document for document in known if document not in counts]
+            conn.executemany('DELETE FROM documents WHERE document = ?', [(doc,) for doc in stale])
+            report['removed'] = len(stale)
+        print(f'Reconciled catalog in {time.time() - now:.1f}s: {report}')
+        return report
+
+
+def count_document_chunks(client, limit=RECONCILE_MAX_DOCUMENTS):
+    """Returns {document: number of Post objects} using an Aggregate query grouped by document."""
+    res = client.query.raw('{Aggregate {Post(groupBy: ["document"], limit: %d) '
+                           '{groupedBy {value} meta {count}}}}' % limit)
+    if res.get('errors'):
+        raise RuntimeError(f'Aggregating documents failed: {res["errors"]}')
+    return {group['groupedBy']['value']: group['meta']['count']
+            for group in res['data']['Aggregate']['Post'] or []}
+
+
+class IngestRecorder:
+    """
+    Counts and hashes the chunks of every document seen during one ingestion
+    run and records them in the catalog: documents are marked as ingesting when
+    their first chunk arrives and as ready when the run ends, or as failed if
+    the run raised or any of their objects could not be imported. Only a chunk
+    count and a running hash are kept per document, not the chunks.
+    Ingestion runs are expected to carry whole documents.
+    """
+    def __init__(self, catalog, import_stats=None):
+        """
+        Args:
+            catalog (DocumentCatalog): Catalog to record into.
+            import_stats (ImportStats): Stats of the importer writing the
+                chunks, whose per-document failure counts are checked on exit.
+        """
+        self.catalog = catalog
+        self.import_stats = import_stats
+        # document -> [chunk count, sum of chunk digests, type]
+        self.documents = {}
+
+    def add(self, props, object_id):
+        document = props['document']
+        summary = self.documents.get(document)
+        if summary is None:
+            summary = self.documents[document] = [0, 0, props.get('type') or None]
+            self.catalog.mark_ingesting(document, summary[2])
+        summary[0] += 1
+        summary[1] = (summary[1] + chunk_digest(object_id, props.get('contentHash'))) % DIGEST_MODULUS
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        failed_documents = self.import_stats.failed_documents if self.import_stats else {}
+        for document, (chunks, digest, doc_type) in self.documents.items():
+            if exc is not None:
+                self.catalog.mark_failed(document, exc)
+            elif failed_documents.get(document):
+                self.catalog.mark_failed(document, f'{failed_documents[document]} of {chunks} '
+                                                   f'objects failed to import')
+            else:
+                self.catalog.mark_ready(document, chunks, format_digest(digest), doc_type)
+        return False
+
+
+document_catalog = DocumentCatalog()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    reconcile = subparsers.add_parser('reconcile', help='rebuild the catalog from Weaviate')
+    reconcile.add_argument('--hashes', action='store_true', help='also recompute document hashes')
+    subparsers.add_parser('list', help='print the catalog')
+    args = parser.parse_args()
+
+    if args.command == 'reconcile':
+        from core.weaviate.client import establish_connection
+        document_catalog.reconcile(establish_connection(), hashes=args.hashes)
+    else:
+        for entry in document_catalog.entries():
+            print(f'{entry["status"]:<10} {entry["chunks"] or 0:>7} {entry["document"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,189 @@
-import weaviate
+"""
+Weaviate client factory.
+Clients are created lazily on first use, after Weaviate reports ready, so
+importing the app does not need a running Weaviate. Each client sends its
+requests through a pooled keep-alive session with per-operation timeouts, and
+retries idempotent requests (reads, GraphQL queries, PUT and DELETE) with
+exponential backoff on connection errors and 502/503/504 responses.
+
+`get_client()` returns one shared client per process: threads share its
+connection pool, so concurrent queries do not wait on each other, and worker
+processes forked by a server get a fresh pool of their own.
+"""
 import os
+import random
+import threading
+import time
 
-def establish_connection():
+import requests
+import weaviate
+from requests.adapters import HTTPAdapter
+from weaviate.connect import (REST_METHOD_DELETE, REST_METHOD_GET, REST_METHOD_PATCH, REST_METHOD_POST,
+                              REST_METHOD_PUT)
+
+WEAVIATE_URL = os.getenv('WEAVIATE_URL', 'http://localhost:8080')
+WEAVIATE_POOL_SIZE = int(os.getenv('WEAVIATE_POOL_SIZE', '16'))
+WEAVIATE_CONNECT_TIMEOUT = float(os.getenv('WEAVIATE_CONNECT_TIMEOUT', '2'))
+# Read timeouts per operation, in seconds
+WEAVIATE_QUERY_TIMEOUT = float(os.getenv('WEAVIATE_QUERY_TIMEOUT', '20'))
+WEAVIATE_BATCH_TIMEOUT = float(os.getenv('WEAVIATE_BATCH_TIMEOUT', '120'))
+WEAVIATE_TIMEOUT = float(os.getenv('WEAVIATE_TIMEOUT', '30'))
+WEAVIATE_RETRIES = int(os.getenv('WEAVIATE_RETRIES', '3'))
+WEAVIATE_RETRY_BACKOFF = float(os.getenv('WEAVIATE_RETRY_BACKOFF', '0.25'))
+# How long the first use of a client waits for Weaviate to become ready
+WEAVIATE_READY_TIMEOUT = float(os.getenv('WEAVIATE_READY_TIMEOUT', '10'))
+
+HTTP_METHODS = {REST_METHOD_GET: 'GET', REST_METHOD_PUT: 'PUT', REST_METHOD_POST: 'POST',
+                REST_METHOD_PATCH: 'PATCH', REST_METHOD_DELETE: 'DELETE'}
+RETRY_STATUS_CODES = (502, 503, 504)
+TRANSIENT_REQUEST_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+class WeaviateUnavailable(Exception):
+    """Raised when Weaviate does not become ready in time."""
+
+
+def operation_timeout(path):
+    """Returns the (connect, read) timeout for a request to a Weaviate REST path."""
+    if path.startswith('/graphql'):
+        read_timeout = WEAVIATE_QUERY_TIMEOUT
+    elif path.startswith('/batch'):
+        read_timeout = WEAVIATE_BATCH_TIMEOUT
+    else:
+        read_timeout = WEAVIATE_TIMEOUT
+    return (WEAVIATE_CONNECT_TIMEOUT, read_timeout)
+
+
+def is_idempotent(method, path):
+    """True for requests that are safe to send again; GraphQL requests here are all queries."""
+    return method in ('GET', 'PUT', 'DELETE') or (method == 'POST' and path.startswith('/graphql'))
+
+
+def pooled_session(pool_size=WEAVIATE_POOL_SIZE):
+    """Returns a requests session keeping up to `pool_size` connections alive."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def install_session(client, session, retries=WEAVIATE_RETRIES, backoff=WEAVIATE_RETRY_BACKOFF):
     """
-    Establishes connection to Weaviate instance
+    Routes every request of a weaviate-client `Client` through `session`, with
+    per-operation timeouts and retries for idempotent requests.
     """
-    client = weaviate.Client(
-        url="http://localhost:8080",  # Default Weaviate URL when running locally
-    )
+    connection = client._connection
+
+    def run_rest(path, rest_method, weaviate_object=None, params=None):
+        method = HTTP_METHODS[rest_method]
+        attempts = 1 + (retries if is_idempotent(method, path) else 0)
+        for attempt in range(attempts):
+            try:
+                response = session.request(
+                    method, connection.url + path, params=params or {},
+                    json=weaviate_object if method != 'GET' else None,
+                    headers=connection._get_request_header(), timeout=operation_timeout(path))
+            except TRANSIENT_REQUEST_ERRORS:
+                if attempt == attempts - 1:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt == attempts - 1:
+                    return response
+            # Exponential backoff with jitter, so retrying workers do not hit Weaviate in lockstep
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.0))
+
+    connection.run_rest = run_rest
     return client
 
+
+def wait_until_ready(url=WEAVIATE_URL, timeout=WEAVIATE_READY_TIMEOUT, session=None):
+    """
+    Polls Weaviate's readiness endpoint with exponential backoff.
+
+    Raises:
+        WeaviateUnavailable: If Weaviate is not ready after `timeout` seconds.
+    """
+    session = session or requests
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while True:
+        try:
+            if session.get(url.rstrip('/') + '/v1/.well-known/ready',
+                           timeout=WEAVIATE_CONNECT_TIMEOUT).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        if time.monotonic() + delay > deadline:
+            raise WeaviateUnavailable(f'Weaviate at {url} is not ready after {timeout:.0f}s')
+        time.sleep(delay)
+        delay = min(delay * 2, 2.0)
+
+
+def create_client(url=WEAVIATE_URL, pool_size=WEAVIATE_POOL_SIZE, ready_timeout=WEAVIATE_READY_TIMEOUT):
+    """
+    Connects to Weaviate once it is ready and returns a client using a pooled session.
+
+    Args:
+        url (str): Weaviate URL.
+        pool_size (int): Maximum number of kept-alive connections.
+        ready_timeout (float): Seconds to wait for Weaviate to become ready; 0 skips the probe.
+    """
+    session = pooled_session(pool_size)
+    if ready_timeout:
+        wait_until_ready(url, ready_timeout, session)
+    return install_session(weaviate.Client(url), session)
+
+
+class LazyClient:
+    """
+    Stand-in for a weaviate `Client` that connects on first attribute access.
+    The client is created once per process and shared by its threads; a
+    forked worker process creates its own. If Weaviate is not ready yet, the
+    access raises WeaviateUnavailable and the next one tries again.
+    """
+    def __init__(self, url=WEAVIATE_URL, pool_size=WEAVIATE_POOL_SIZE):
+        self._url = url
+        self._pool_size = pool_size
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Returns the underlying client of this process, creating it if needed."""
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self._client = create_client(self._url, self._pool_size)
+                    self._pid = os.getpid()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+_default_client = LazyClient()
+
+
+def get_client():
+    """Returns the shared, lazily connected client of this process."""
+    return _default_client
+
+
+def resolve_client(client):
+    """Returns `client`, or the shared client if it is None."""
+    return get_client() if client is None else client
+
+
+def establish_connection():
+    """
+    Returns the shared Weaviate client. It connects on first use, so this
+    succeeds even while Weaviate is still starting.
+    """
+    return get_client()
+
 def retrieve_password():
     """
     Retrieves Weaviate API key from environment variable
     """
-    return os.getenv('WEAVIATE_API_KEY', 'your-default-key')
\ No newline at end of file
+    return os.getenv('WEAVIATE_API_KEY', 'your-default-key')
@@ -0,0 +1,164 @@
+"""
+Bulk removal of Post objects by document.
+Uses Weaviate's server-side batch delete (`DELETE /v1/batch/objects` with a
+`where` filter) where the server supports it. Otherwise the ids of a document
+are listed in large pages and deleted concurrently.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import weaviate
+from weaviate.connect import REST_METHOD_DELETE
+
+from core.weaviate.cache import retrieval_cache
+from core.weaviate.catalog import document_catalog
+from core.weaviate.graphql import build_get, build_where_equal
+
+DELETE_PAGE_SIZE = int(os.getenv('DELETE_PAGE_SIZE', '1000'))
+DELETE_WORKERS = int(os.getenv('DELETE_WORKERS', '8'))
+
+# Status codes of servers without batch delete-by-filter (added in Weaviate 1.13).
+BATCH_DELETE_UNSUPPORTED = (404, 405, 501)
+
+
+def document_filter(document):
+    """Returns the REST `where` filter matching the objects of one document."""
+    return {"path": ["document"], "operator": "Equal", "valueText": document}
+
+
+def batch_delete_where(client, where, class_name="Post"):
+    """
+    Deletes every object of `class_name` matching `where` on the server.
+    A single request deletes at most QUERY_MAXIMUM_RESULTS objects, so
+    requests are repeated until nothing matches any more.
+
+    Args:
+        client: Weaviate client instance.
+        where (dict): REST `where` filter.
+        class_name (str): Class of the objects to delete.
+
+    Returns:
+        tuple: (deleted, failed) counts, or None if the server does not
+            support batch deletes.
+    """
+    body = {"match": {"class": class_name, "where": where}, "output": "minimal", "dryRun": False}
+    deleted = failed = 0
+    while True:
+        response = client._connection.run_rest("/batch/objects", REST_METHOD_DELETE, body)
+        if response.status_code in BATCH_DELETE_UNSUPPORTED:
+            return None
+        if response.status_code != 200:
+            raise weaviate.UnexpectedStatusCodeException("Batch delete objects", response)
+        results = response.json()["results"]
+        deleted += results["successful"]
+        failed += results["failed"]
+        if not results["successful"] or results["matches"] < results["limit"]:
+            return deleted, failed
+
+
+def list_document_ids(client, document, limit=DELETE_PAGE_SIZE):
+    """Returns the ids of up to `limit` objects of `document`."""
+    query = build_get(['Post(where: %s, limit: %d) {_additional {id}}'
+                       % (build_where_equal("document", document), limit)])
+    res = client.query.raw(query)
+    if res.get('errors'):
+        raise RuntimeError(f'Listing objects of {document} failed: {res["errors"]}')
+    return [post['_additional']['id'] for post in res["data"]["Get"]["Post"] or []]
+
+
+def _delete_object(client, object_id):
+    try:
+        client.data_object.delete(object_id)
+    except weaviate.UnexpectedStatusCodeException as err:
+        # Already gone, e.g. removed by a concurrent request.
+        if err.status_code != 404:
+            raise
+    return object_id
+
+
+def delete_objects(client, object_ids, workers=DELETE_WORKERS):
+    """
+    Deletes the objects with the given ids using `workers` concurrent requests.
+
+    Returns:
+        tuple: (deleted, failed) counts.
+    """
+    object_ids = list(object_ids)
+    if not object_ids:
+        return 0, 0
+    deleted = failed = 0
+    deleted_ids = []
+    with ThreadPoolExecutor(max_workers=min(workers, len(object_ids))) as executor:
+        futures = [executor.submit(_delete_object, client, object_id) for object_id in object_ids]
+        for future in futures:
+            try:
+                deleted_ids.append(future.result())
+                deleted += 1
+            except (requests.exceptions.RequestException, weaviate.UnexpectedStatusCodeException) as err:
+                print(f'Failed to delete object: {err}')
+                failed += 1
+    document_catalog.log_deletions(object_ids=deleted_ids)
+    return deleted, failed
+
+
+def delete_document_objects(client, document, page_size=DELETE_PAGE_SIZE, workers=DELETE_WORKERS):
+    """
+    Deletes the objects of `document` by listing ids page by page and
+    deleting each page concurrently.
+
+    Returns:
+        tuple: (deleted, failed) counts.
+    """
+    deleted = failed = 0
+    while True:
+        object_ids = list_document_ids(client, document, page_size)
+        if not object_ids:
+            return deleted, failed
+        page_deleted, page_failed = delete_objects(client, object_ids, workers)
+        deleted += page_deleted
+        failed += page_failed
+        if not page_deleted:
+            # Every object of this page failed; stop instead of retrying forever.
+            return deleted, failed
+
+
+def delete_documents(client, documents, use_batch=True):
+    """
+    Removes every object derived from each of `documents`, and their entries
+    in the document catalog.
+
+    Args:
+        client: Weaviate client instance.
+        documents: A document (link or path) or an iterable of documents.
+        use_batch (bool): Try the server-side batch delete first.
+
+    Returns:
+        dict: Per document, the number of objects deleted and failed, the
+            elapsed seconds and the method used ('batch' or 'objects').
+    """
+    if isinstance(documents, str):
+        documents = [documents]
+    report = {}
+    for document in dict.fromkeys(documents):
+        start_time = time.perf_counter()
+        method = 'batch'
+        counts = batch_delete_where(client, document_filter(document)) if use_batch else None
+        if counts is None:
+            use_batch = False
+            method = 'objects'
+            counts = delete_document_objects(client, document)
+        elapsed = time.perf_counter() - start_time
+        report[document] = {'deleted': counts[0], 'failed': counts[1],
+                            'seconds': round(elapsed, 3), 'method': method}
+        print(f'Deleted {counts[0]} objects of {document} in {elapsed:.2f}s ({method}, {counts[1]} failed)')
+        if counts[0]:
+            document_catalog.log_deletions(documents=[document])
+        if counts[1]:
+            document_catalog.mark_failed(document, f'{counts[1]} objects could not be deleted')
+        else:
+            document_catalog.remove([document])
+    if any(entry['deleted'] for entry in report.values()):
+        retrieval_cache.bump_generation()
+    return report
@@ -0,0 +1,63 @@
+"""
+Builders for raw GraphQL queries against the Post class.
+Used where the client's query builder cannot express what we need, such as
+several aliased searches in one request.
+"""
+import json
+
+POST_FIELDS = "document page paragraph content"
+QA_ADDITIONAL = "_additional {certainty answer { hasAnswer certainty startPosition endPosition}}"
+BASIC_ADDITIONAL = "_additional {certainty}"
+KEYWORD_ADDITIONAL = "_additional {score}"
+# Properties searched by BM25 keyword queries
+KEYWORD_PROPERTIES = ["content", "title", "person"]
+SEARCH_MODES = ('basic', 'qa', 'keyword')
+
+
+def build_post_search(mode, query, limit, alias=None):
+    """
+    Builds one `Post(...) {...}` selection for a search.
+
+    Args:
+        mode (str): 'basic' for near_text search, 'qa' for Weaviate's ask operator,
+            'keyword' for BM25 search, which needs no query vector.
+        query (str): Search query or question.
+        limit (int): Maximum number of results.
+        alias (str): Optional GraphQL alias for the selection.
+
+    Returns:
+        str: GraphQL selection to be placed inside `Get { }`.
+    """
+    if mode == 'basic':
+        operator = 'nearText: {concepts: [%s]}' % json.dumps(query)
+        additional = BASIC_ADDITIONAL
+    elif mode == 'qa':
+        operator = 'ask: {question: %s, properties: ["content"]}' % json.dumps(query)
+        additional = QA_ADDITIONAL
+    elif mode == 'keyword':
+        operator = 'bm25: {query: %s, properties: %s}' % (json.dumps(query), json.dumps(KEYWORD_PROPERTIES))
+        additional = KEYWORD_ADDITIONAL
+    else:
+        raise ValueError(f'Unknown search mode {mode!r}, expected one of {SEARCH_MODES}')
+    prefix = f'{alias}: ' if alias else ''
+    return f'{prefix}Post({operator}, limit: {int(limit)}) {{{POST_FIELDS} {additional}}}'
+
+
+def build_where_equal(path, value):
+    """Builds a GraphQL `where` filter matching objects whose `path` property equals `value`."""
+    return '{path: [%s], operator: Equal, valueText: %s}' % (json.dumps(path), json.dumps(value))
+
+
+def build_get(selections):
+    """Wraps GraphQL selections into a complete `{ Get { ... } }` query."""
+    return '{Get {%s}}' % ' '.join(selections)
+
+
+def parse_posts(posts):
+    """
+    Converts the Post objects of a GraphQL response into result dictionaries
+    with the document, page, paragraph, and content.
+    """
+    return [{"document": post['document'], "page": post['page'],
+             "paragraph": post['paragraph'], "content": post['content']}
+            for post in posts or []]
@@ -0,0 +1,352 @@
+"""
+Streaming batch importer for Post objects.
+Accepts DataFrames, iterables or generators of records, and column chunks,
+builds batches without per-row pandas overhead, adapts the batch size to the
+measured Weaviate latency and retries failed objects individually.
+
+Every Post gets a deterministic UUID derived from (document, page, paragraph)
+and a hash of its properties, so re-importing a chunk replaces it in place and
+unchanged chunks can be detected without re-vectorizing them. Rows repeating a
+key get the key's UUID combined with an ordinal, so none of them is lost.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections.abc import Mapping
+
+import requests
+import weaviate
+
+from core.weaviate.cache import retrieval_cache
+from core.weaviate.catalog import IngestRecorder, document_catalog
+
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '256'))
+IMPORT_TARGET_SECONDS = float(os.getenv('IMPORT_TARGET_SECONDS', '2.0'))
+MIN_BATCH_SIZE = 8
+MAX_BATCH_SIZE = 2048
+MAX_OBJECT_RETRIES = 3
+DATAFRAME_CHUNK_ROWS = 4096
+
+# Record (DataFrame column) name -> Post property name
+COLUMN_PROPERTIES = {
+    "Text": "content",
+    "Document": "document",
+    "Page": "page",
+    "Paragraph": "paragraph",
+    "Type": "type",
+    "Title": "title",
+    "Person": "person",
+    "Role": "role",
+    "Folder": "folder",
+}
+
+# Optional numeric columns; only set on objects whose record has a value.
+NUMERIC_COLUMN_PROPERTIES = {
+    "StartTime": "startTime",
+    "EndTime": "endTime",
+}
+
+# Namespace for the deterministic UUIDs of Post objects.
+POST_NAMESPACE = uuid.UUID('6f1c5a0e-7d2b-5c1e-9a43-2b8e4f0d1c37')
+
+TRANSIENT_ERRORS = (requests.exceptions.RequestException, weaviate.UnexpectedStatusCodeException)
+
+
+class ImportStats:
+    """Counters describing one import run."""
+    def __init__(self):
+        self.objects = 0
+        self.failed = 0
+        self.failed_documents = {}
+        self.duplicates = 0
+        self.batches = 0
+        self.retried = 0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    @property
+    def objects_per_sec(self):
+        return self.objects / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {'objects': self.objects, 'failed': self.failed, 'duplicates': self.duplicates,
+                'batches': self.batches,
+                'retried': self.retried, 'seconds': round(self.seconds, 3),
+                'objects_per_sec': round(self.objects_per_sec, 1)}
+
+    def __repr__(self):
+        return (f'{self.objects} objects in {self.seconds:.1f}s '
+                f'({self.objects_per_sec:.0f} objects/sec, {self.batches} batches, '
+                f'{self.retried} retried, {self.failed} failed)')
+
+
+def object_id(document, page, paragraph):
+    """Returns the deterministic UUID of the Post for one paragraph of a document."""
+    return str(uuid.uuid5(POST_NAMESPACE, json.dumps([str(document), str(page), str(paragraph)])))
+
+
+def repeat_object_id(object_id, ordinal):
+    """Returns the UUID of the `ordinal`-th repeat (1, 2, ...) of the key whose UUID is `object_id`."""
+    return str(uuid.uuid5(POST_NAMESPACE, f'{object_id}/{ordinal}'))
+
+
+class ObjectIds:
+    """
+    Keeps the object ids of one document distinct. A record repeating a
+    (document, page, paragraph) key already seen gets an ordinal id instead of
+    overwriting the earlier record, and is counted in `duplicates`.
+    """
+    def __init__(self, seen=()):
+        self.seen = set(seen)
+        self.duplicates = 0
+        self._repeats = {}
+
+    def assign(self, object_id):
+        """Returns `object_id`, or an unused ordinal id if it was already assigned."""
+        if object_id not in self.seen:
+            self.seen.add(object_id)
+            return object_id
+        self.duplicates += 1
+        ordinal = self._repeats.get(object_id, 0)
+        unique_id = object_id
+        while unique_id in self.seen:
+            ordinal += 1
+            unique_id = repeat_object_id(object_id, ordinal)
+        self._repeats[object_id] = ordinal
+        self.seen.add(unique_id)
+        return unique_id
+
+
+def warn_duplicates(document, duplicates):
+    if duplicates:
+        print(f'{duplicates} rows of {document} repeat a (document, page, paragraph) key; '
+              f'they were stored under ordinal ids')
+
+
+def content_hash(props):
+    """Returns a SHA-256 over all properties of a Post except the hash itself."""
+    payload = json.dumps({k: v for k, v in props.items() if k != 'contentHash'}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def record_to_properties(record):
+    """
+    Converts a record keyed by DataFrame column names (Text, Document, Page,
+    Paragraph, Type, Title, Person, Role, Folder and optionally Titles,
+    StartTime and EndTime) into Post properties, including their contentHash.
+    Missing text columns become empty strings.
+    """
+    props = {prop: str(record.get(column, '')) for column, prop in COLUMN_PROPERTIES.items()}
+    for column, prop in NUMERIC_COLUMN_PROPERTIES.items():
+        value = record.get(column)
+        if value is not None and value == value:  # skips None and NaN
+            props[prop] = float(value)
+    titles = record.get('Titles')
+    if titles is not None:
+        props["content"] = str(titles).strip() + '. ' + props["content"]
+    props["contentHash"] = content_hash(props)
+    return props
+
+
+def record_to_object(record):
+    """Returns the (properties, deterministic UUID) of the Post for `record`."""
+    props = record_to_properties(record)
+    return props, object_id(props["document"], props["page"], props["paragraph"])
+
+
+def _is_column_chunk(item):
+    """True if `item` maps column names to equally long sequences of values."""
+    if not isinstance(item, Mapping) or not item:
+        return False
+    first = next(iter(item.values()))
+    return not isinstance(first, (str, bytes)) and hasattr(first, '__len__')
+
+
+def _iter_columns(columns):
+    names = list(columns)
+    for values in zip(*(columns[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def _iter_dataframe(d_f):
+    for start in range(0, len(d_f), DATAFRAME_CHUNK_ROWS):
+        yield from d_f.iloc[start:start + DATAFRAME_CHUNK_ROWS].to_dict('records')
+
+
+def iter_records(source):
+    """
+    Flattens any supported source into a stream of records.
+
+    Args:
+        source: A pandas DataFrame, a mapping of column name to values, or an
+            iterable yielding records (mappings), column chunks or DataFrames.
+
+    Yields:
+        dict: One record per object.
+    """
+    if hasattr(source, 'iloc'):
+        yield from _iter_dataframe(source)
+        return
+    if _is_column_chunk(source):
+        yield from _iter_columns(source)
+        return
+    for item in source:
+        if hasattr(item, 'iloc'):
+            yield from _iter_dataframe(item)
+        elif _is_column_chunk(item):
+            yield from _iter_columns(item)
+        else:
+            yield item
+
+
+class BatchImporter:
+    """
+    Accumulates objects and sends them to Weaviate in batches whose size is
+    adapted so that each batch request takes about `target_seconds`.
+    Use as a context manager, or call `close()` to flush the last partial batch.
+    """
+    def __init__(self, client, batch_size=IMPORT_BATCH_SIZE, target_seconds=IMPORT_TARGET_SECONDS,
+                 class_name="Post", on_batch=None):
+        """
+        Args:
+            client: Weaviate client instance.
+            batch_size (int): Initial number of objects per batch request.
+            target_seconds (float): Batch latency the batch size is adapted towards.
+            class_name (str): Weaviate class the objects belong to.
+            on_batch (callable): Optional callback receiving the ImportStats after each batch.
+        """
+        self.client = client
+        self.batch_size = batch_size
+        self.target_seconds = target_seconds
+        self.class_name = class_name
+        self.on_batch = on_batch
+        self.stats = ImportStats()
+        self._pending = []
+
+    def add(self, properties, uuid=None):
+        """Queues one object, sending a batch once enough objects are queued."""
+        self._pending.append((properties, uuid))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Sends all queued objects."""
+        while self._pending:
+            objects = self._pending[:self.batch_size]
+            del self._pending[:len(objects)]
+            self._send(objects)
+
+    def close(self):
+        """Flushes the last partial batch and invalidates cached search results."""
+        self.flush()
+        self.stats.seconds = time.perf_counter() - self.stats.started
+        if self.stats.objects or self.stats.failed:
+            retrieval_cache.bump_generation()
+        return self.stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
+
+    def _send(self, objects):
+        batch = weaviate.ObjectsBatchRequest()
+        for properties, uuid in objects:
+            batch.add(properties, self.class_name, uuid=uuid)
+
+        start_time = time.perf_counter()
+        try:
+            results = self.client.batch.create(batch)
+        except TRANSIENT_ERRORS as err:
+            # Most often a timeout: shrink the batches and send this one in halves.
+            self.batch_size = max(MIN_BATCH_SIZE, len(objects) // 2)
+            if len(objects) > MIN_BATCH_SIZE:
+                print(f'Batch of {len(objects)} failed ({err}), retrying in halves')
+                half = len(objects) // 2
+                self._send(objects[:half])
+                self._send(objects[half:])
+            else:
+                self._retry_individually(objects)
+            return
+        self._adapt(time.perf_counter() - start_time)
+
+        failed = [obj for obj, result in zip(objects, results or [])
+                  if (result.get('result') or {}).get('errors')]
+        self.stats.batches += 1
+        self.stats.objects += len(objects) - len(failed)
+        if failed:
+            self._retry_individually(failed)
+        if self.on_batch is not None:
+            self.on_batch(self.stats)
+
+    def _adapt(self, elapsed):
+        """Moves the batch size towards the size that takes `target_seconds`."""
+        if elapsed > self.target_seconds:
+            self.batch_size = max(MIN_BATCH_SIZE, int(self.batch_size * self.target_seconds / elapsed))
+        elif elapsed < self.target_seconds / 2:
+            self.batch_size = min(MAX_BATCH_SIZE, int(self.batch_size * 1.5) + 1)
+
+    def _retry_individually(self, objects):
+        for properties, uuid in objects:
+            self.stats.retried += 1
+            exists = False
+            attempt = 0
+            while True:
+                try:
+                    if exists:
+                        self.client.data_object.replace(properties, self.class_name, uuid)
+                    else:
+                        self.client.data_object.create(properties, self.class_name, uuid=uuid)
+                    self.stats.objects += 1
+                    break
+                except weaviate.ObjectAlreadyExistsException:
+                    # An update of a stored object, or an earlier attempt went through:
+                    # the stored object only counts once it holds these properties.
+                    exists = True
+                except TRANSIENT_ERRORS as err:
+                    attempt += 1
+                    if attempt == MAX_OBJECT_RETRIES:
+                        document = properties.get("document")
+                        print(f'Failed to import object from {document}: {err}')
+                        self.stats.failed += 1
+                        self.stats.failed_documents[document] = self.stats.failed_documents.get(document, 0) + 1
+                        break
+                    time.sleep(0.5 * 2 ** (attempt - 1))
+
+
+def import_records(client, source, batch_size=IMPORT_BATCH_SIZE, on_batch=None):
+    """
+    Imports every record of `source` into Weaviate as a Post object and
+    records the imported documents in the document catalog.
+
+    Args:
+        client: Weaviate client instance.
+        source: Any source accepted by `iter_records`.
+        batch_size (int): Initial batch size; adapted to Weaviate's latency.
+        on_batch (callable): Optional callback receiving the ImportStats after each batch.
+
+    Returns:
+        ImportStats: Counts, elapsed time and objects/sec of the import.
+    """
+    importer = BatchImporter(client, batch_size=batch_size, on_batch=on_batch)
+    document, ids = None, ObjectIds()
+    # The importer is flushed before the recorder exits, so its failures are final.
+    with IngestRecorder(document_catalog, importer.stats) as recorder, importer:
+        for record in iter_records(source):
+            props, object_id = record_to_object(record)
+            if props["document"] != document:
+                # Only the ids of the current document are kept.
+                warn_duplicates(document, ids.duplicates)
+                importer.stats.duplicates += ids.duplicates
+                document, ids = props["document"], ObjectIds()
+            object_id = ids.assign(object_id)
+            recorder.add(props, object_id)
+            importer.add(props, object_id)
+    warn_duplicates(document, ids.duplicates)
+    importer.stats.duplicates += ids.duplicates
+    print(f'Imported {importer.stats}')
+    return importer.stats
@@ -1,16 +1,23 @@
 
-import weaviate
-
+from core.weaviate.cache import cached_retrieval
+from core.weaviate.catalog import document_catalog
+from core.weaviate.client import resolve_client
+from core.weaviate.importer import import_records
+from core.weaviate.deletion import delete_documents
+from core.weaviate.sync import sync_records
+
+@cached_retrieval('qa')
 def search_qa(client, query, limit=10):
     ''' Search for the query using Weaviate's QA feature. Sort results by certainty.
         @params
         query: string to find similar documents
-        client: the weaviate client object from calling weaviate_calls_dev.connect()
+        client: the weaviate client object, or None for the shared client
         limit: the number of results to get
         certainty: the cutoff below which we will not consider a result valid
         @returns dictionary with the query and the results, the results being a dictionary with
             the document, page, paragraph, and content
     '''
+    client = resolve_client(client)
     ask = {
       "question": query,
       "properties": ["content"]
@@ -35,88 +42,75 @@ def search_qa(client, query, limit=10):
 
 
 
-def import_data(client, d_f, batchsize=256):
+def import_data(client, d_f, batchsize=256, incremental=False, on_batch=None):
     ''' Puts the data objects in d_f into weaviate.
         @params
         d_f: pandas dataframe which should have columns Document, Page, Paragraph,
         Text and optionally Titles (plural). Each row will go into
-        weaviate as a separate data object.
-        batchsize: The rows will be put into weaviate batchsize at a time. Higher numbers are more
-            efficient, but if there is a timeout, lower the batchize.
-        @returns None
+        weaviate as a separate data object. Any iterable or generator of records
+        (dicts keyed by those column names), column chunks or dataframes works too.
+        batchsize: The initial number of rows put into weaviate at a time. The size
+            adapts to Weaviate's latency and shrinks automatically on timeouts.
+        incremental: if True, diff against the objects already stored for the
+            documents in d_f and only insert new, replace changed and delete
+            stale paragraphs
+        on_batch: optional callback receiving the ImportStats after each batch
+        @returns ImportStats with the number of objects imported and objects/sec,
+            or SyncStats when incremental
     '''
-    batch = weaviate.ObjectsBatchRequest()
-    for i, row in d_f.iterrows():
-        props = {
-            "content": row["Text"],
-            "document": row["Document"],
-            "page": str(row["Page"]),
-            "paragraph": str(row["Paragraph"]),
-            "type": str(row["Type"]),
-            "title": str(row["Title"]),
-            "person": str(row["Person"]),
-            "role": str(row["Role"]),
-            "folder": str(row["Folder"])
-        }
-        if 'Titles' in d_f.columns:
-            props["content"] = row['Titles'].strip() + '. ' + props["content"]
-        batch.add(props, "Post")
-
-        # when either batch size is reached or we are at the last object
-        if (i !=0 and i % batchsize == 0) or i == len(d_f) - 1:
-            # send off the batch
-            client.batch.create(batch)
-
-            # and reset for the next batch
-            batch = weaviate.ObjectsBatchRequest()
+    client = resolve_client(client)
+    if incremental:
+        return sync_records(client, d_f, batch_size=batchsize, on_batch=on_batch)
+    return import_records(client, d_f, batch_size=batchsize, on_batch=on_batch)
 
 def link_in_weaviate(client, link):
     """
-    returns true if the passed in link is in weaviate
+    returns true if the passed in link is in weaviate, according to the local
+    document catalog
     """
-    where_filter = {
-        "path": ["document"],
-        "operator": "Equal",
-        "valueText": link
-    }
+    return bool(links_in_weaviate(client, [link]))
+
 
-    data = client.query.get("Post", ["document", "_additional {id}"]).with_where(where_filter).do()
-    return len(data["data"]["Get"]["Post"]) != 0
+def links_in_weaviate(client, links):
+    ''' Find which links have already been ingested with one local catalog lookup.
+        @params
+        links: pdf, video or csv links or paths
+        @returns set of the links that are in weaviate
+    '''
+    return document_catalog.existing(links)
 
 
 def delete_link_data(client, links):
     ''' Delete all the Weaviate documents that were derived from link.
         @params
         link: a pdf or video link or path that had previously been used to insert documents
-        @returns None
+        @returns dictionary with, per link, the number of objects deleted and failed,
+            the elapsed seconds and the delete method used
+    '''
+    return delete_documents(resolve_client(client), links)
+
+
+def remove_resource_data(client, link):
+    ''' Delete all the Weaviate documents that were derived from a single link.
+        @params
+        link: a pdf or video link or path that had previously been used to insert documents
+        @returns dictionary with the number of objects deleted and failed, the elapsed
+            seconds and the delete method used
     '''
-    for link in links:
-        any_objects_left = True
-        while any_objects_left:
-            where_filter = {
-                "path": ["document"],
-                "operator": "Equal",
-                "valueText": link
-            }
-            data = client.query.get("Post", ["document", "_additional {id}"]).\
-                with_where(where_filter).do()
-            if data["data"]["Get"]["Post"]:
-                for post in data["data"]["Get"]["Post"]:
-                    client.data_object.delete(post['_additional']['id'])
-            else:
-                any_objects_left = False
+    return delete_documents(resolve_client(client), [link])[link]
 
 
 def search_for_questions(client, query, limit=10):
     ''' Search for the query using Weaviate's QA feature. Sort results by certainty.
         @params
         query: string to find similar documents
-        client: the weaviate client object from calling weaviate_calls_dev.connect()
+        client: the weaviate client object, or None for the shared client
         limit: the number of results to get
         certainty: the cutoff below which we will not consider a result valid
         @returns dictionary with the query and the results, the results being a dictionary with
             the document, page, paragraph, and content
     '''
+    client = resolve_client(client)
     ask = {
       "question": query,
       "properties": ["content"]
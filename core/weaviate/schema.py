@@ -2,6 +2,8 @@
 Weaviate schema definitions and initialization functions.
 Defines the data structure for the vector database.
 """
+from core.weaviate.cache import retrieval_cache
+from core.weaviate.catalog import document_catalog
 
 def get_default_schema():
     """
@@ -59,9 +61,33 @@ def get_default_schema():
                     "name": "folder",
                     "dataType": ["text"],
                     "description": "Organizational folder or category"
+                },
+                {
+                    "name": "contentHash",
+                    "dataType": ["text"],
+                    "description": "SHA-256 of the object's properties, used to skip unchanged chunks",
+                    "moduleConfig": {
+                        "text2vec-transformers": {
+                            "skip": True
+                        }
+                    }
+                },
+                {
+                    "name": "startTime",
+                    "dataType": ["number"],
+                    "description": "Start of the section in seconds, for video resources"
+                },
+                {
+                    "name": "endTime",
+                    "dataType": ["number"],
+                    "description": "End of the section in seconds, for video resources"
                 }
             ],
             "vectorizer": "text2vec-transformers",
+            # Lets the read replica fetch only objects updated since its last refresh
+            "invertedIndexConfig": {
+                "indexTimestamps": True
+            },
             "moduleConfig": {
                 "text2vec-transformers": {
                     "vectorizeClassName": False
@@ -86,4 +112,9 @@ def init_schema(client):
     
     # Create new schema
     schema = get_default_schema()
-    client.schema.create(schema) 
\ No newline at end of file
+    client.schema.create(schema)
+
+    # Cached search results and catalog entries refer to objects that no longer exist
+    document_catalog.clear() 
+    document_catalog.log_deletions(reset=True)
+    retrieval_cache.bump_generation()
\ No newline at end of file
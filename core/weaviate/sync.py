@@ -0,0 +1,156 @@
+"""
+Incremental re-ingestion of documents.
+Compares the records of a source with what Weaviate already stores for the
+same documents, using the deterministic object ids and content hashes set by
+the importer, and only inserts new chunks, replaces changed ones and deletes
+stale ones. Unchanged chunks cost no vectorizer call.
+"""
+from core.weaviate.cache import retrieval_cache
+from core.weaviate.catalog import IngestRecorder, document_catalog
+from core.weaviate.deletion import delete_objects
+from core.weaviate.graphql import build_get, build_where_equal
+from core.weaviate.importer import (IMPORT_BATCH_SIZE, BatchImporter, ObjectIds, iter_records, record_to_object,
+                                   warn_duplicates)
+
+OBJECT_PAGE_SIZE = 1000
+
+
+class SyncStats:
+    """Counts of what a sync did, per kind of change."""
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.duplicates = 0
+        self.documents = set()
+        self.imported = None
+
+    def as_dict(self):
+        return {'documents': len(self.documents), 'inserted': self.inserted,
+                'updated': self.updated, 'unchanged': self.unchanged, 'deleted': self.deleted,
+                'duplicates': self.duplicates,
+                'import': self.imported.as_dict() if self.imported else None}
+
+    def __repr__(self):
+        return (f'{len(self.documents)} documents: {self.inserted} inserted, {self.updated} updated, '
+                f'{self.unchanged} unchanged, {self.deleted} deleted, {self.duplicates} duplicate keys')
+
+
+def iter_document_objects(client, document, properties=("contentHash",), page_size=OBJECT_PAGE_SIZE):
+    """
+    Pages through every Weaviate object derived from a document.
+
+    Args:
+        client: Weaviate client instance.
+        document (str): Document (link or path) whose objects to list.
+        properties (tuple): Post properties to return besides the id.
+        page_size (int): Objects fetched per GraphQL request.
+
+    Yields:
+        dict: The requested properties and 'id' of each object.
+    """
+    offset = 0
+    while True:
+        query = build_get(['Post(where: %s, limit: %d, offset: %d) {%s _additional {id}}'
+                           % (build_where_equal("document", document), page_size, offset,
+                              ' '.join(properties))])
+        res = client.query.raw(query)
+        if res.get('errors'):
+            raise RuntimeError(f'Listing objects of {document} failed: {res["errors"]}')
+        posts = res["data"]["Get"]["Post"] or []
+        for post in posts:
+            item = {prop: post.get(prop) for prop in properties}
+            item['id'] = post['_additional']['id']
+            yield item
+        if len(posts) < page_size:
+            return
+        offset += page_size
+
+
+def stored_hashes(client, document):
+    """Returns {object id: contentHash} for every object stored for `document`."""
+    return {obj['id']: obj['contentHash'] for obj in iter_document_objects(client, document)}
+
+
+def _finish_document(client, importer, document, stored, ids, stats):
+    """
+    Deletes the stored objects of `document` that the source no longer has,
+    once its new and changed objects are imported. Nothing is deleted if any
+    of them failed to import.
+    """
+    warn_duplicates(document, ids.duplicates)
+    stats.duplicates += ids.duplicates
+    stale = set(stored) - ids.seen
+    if not stale:
+        return
+    importer.flush()
+    failed = importer.stats.failed_documents.get(document)
+    if failed:
+        print(f'Kept {len(stale)} stale objects of {document}: {failed} of its objects failed to import')
+        return
+    stats.deleted += delete_objects(client, stale)[0]
+
+
+def sync_records(client, source, batch_size=IMPORT_BATCH_SIZE, on_batch=None):
+    """
+    Makes Weaviate hold exactly the records of `source` for every document
+    that appears in it. Documents that do not appear in `source` are untouched.
+
+    Only the stored ids and hashes of the document being synced are held in
+    memory: a document is finished, and its stale objects deleted, when the
+    next document starts. Stale objects are only deleted after the document's
+    new and changed objects were imported without failures. If a document's rows are not contiguous, each later
+    run of rows is synced against what is stored by then, so rows of other
+    runs are re-imported rather than lost.
+
+    Args:
+        client: Weaviate client instance.
+        source: Any source accepted by importer.iter_records; it should contain
+            every chunk of the documents it mentions.
+        batch_size (int): Initial batch size for inserts and updates.
+        on_batch (callable): Optional callback receiving the ImportStats after each batch.
+
+    Returns:
+        SyncStats: Inserted, updated, unchanged and deleted counts.
+    """
+    stats = SyncStats()
+    importer = BatchImporter(client, batch_size=batch_size, on_batch=on_batch)
+    document, stored, ids = None, {}, ObjectIds()
+    with IngestRecorder(document_catalog, importer.stats) as recorder, importer:
+        for record in iter_records(source):
+            props, object_id = record_to_object(record)
+            if props["document"] != document:
+                if document is not None:
+                    _finish_document(client, importer, document, stored, ids, stats)
+                document = props["document"]
+                if document in stats.documents:
+                    # Earlier rows of this document must be stored before they are listed.
+                    importer.flush()
+                    stored = stored_hashes(client, document)
+                    ids = ObjectIds(stored)
+                else:
+                    # Only ids and hashes are fetched, one document at a time.
+                    stored = stored_hashes(client, document)
+                    ids = ObjectIds()
+                stats.documents.add(document)
+            object_id = ids.assign(object_id)
+            recorder.add(props, object_id)
+            stored_hash = stored.get(object_id, False)
+            if stored_hash == props["contentHash"]:
+                stats.unchanged += 1
+                continue
+            if stored_hash is False:
+                stats.inserted += 1
+            else:
+                stats.updated += 1
+            # A batch object with an existing id replaces the stored object.
+            importer.add(props, object_id)
+        if document is not None:
+            _finish_document(client, importer, document, stored, ids, stats)
+    stats.imported = importer.stats
+
+    if stats.deleted:
+        retrieval_cache.bump_generation()
+    print(f'Synced {stats}')
+    return stats
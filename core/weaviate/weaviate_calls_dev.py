@@ -1,5 +1,5 @@
 
-import weaviate
+from core.weaviate.client import create_client
 
 
 def get_pass():
@@ -12,7 +12,7 @@ def connect():
     """
     establishes connection to weaviate client
     """
-    return weaviate.Client("http://localhost:8080/")
+    return create_client("http://localhost:8080/")
 
 def init_weaviate_schema(client):
     """
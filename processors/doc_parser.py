@@ -2,12 +2,17 @@
 PDF Parsing Module
 This module handles downloading PDFs, converting them to text,
 splitting into paragraphs, and uploading the extracted data to Weaviate.
+Pages are streamed from parsing to upload, so memory stays bounded by the
+number of in-flight pages rather than the size of the document.
 """
 import os
-import wget
 import pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from io import StringIO
-from weaviate.weaviate_calls import import_data
+from core.weaviate import sync_records
+from processors.downloads import get_download_manager
+from processors.pipeline import NO_PROGRESS, STAGE_DOWNLOADED, STAGE_PAGES_PARSED, prefetch, worker_context
 
 from pdfminer.converter import TextConverter
 from pdfminer.layout import LAParams
@@ -15,8 +20,14 @@ from pdfminer.pdfdocument import PDFDocument
 from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
 from pdfminer.pdfpage import PDFPage
 from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
 
 PDF_STORAGE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'pdfs/')
+PDF_INFLIGHT_PAGES = int(os.getenv('PDF_INFLIGHT_PAGES', '16'))
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '24'))
+PDF_PAGES_PER_TASK = 8
+RECORD_COLUMNS = ['Text', 'Document', 'Page', 'Paragraph', 'Type']
 
 def clear_pdf_storage():
     """Removes all files from the PDF storage directory."""
@@ -24,22 +35,20 @@ def clear_pdf_storage():
         file_path = os.path.join(PDF_STORAGE_DIR, filename)
         os.remove(file_path)
 
-def download_pdf(url, filename):
+def download_pdf(url):
     """
-    Downloads a PDF from the given URL to the specified filename.
+    Downloads a PDF from the given URL into the download cache. Each download
+    goes to its own temporary file before it is promoted into the cache, so
+    concurrent requests never overwrite each other, and unchanged PDFs that
+    are already cached are not downloaded again.
     
     Args:
         url (str): URL of the PDF to download.
-        filename (str): Desired filename for the downloaded PDF.
     
     Returns:
         str: Path to the downloaded PDF file.
     """
-    file_path = os.path.join(PDF_STORAGE_DIR, filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
-    wget.download(url, file_path)
-    return file_path
+    return get_download_manager().fetch(url)
 
 def split_paragraphs_heuristic(paragraph_list):
     """
@@ -64,28 +73,187 @@ def split_paragraphs_heuristic(paragraph_list):
     
     return refined
 
-def convert_pdf_to_text(pdf_path):
+# Per-worker pdfminer state. Font and resource caches are keyed by PDF object
+# ids, which are only unique within one document, so the resource manager is
+# reused for every page of a document but replaced when the document changes.
+_worker_state = {'key': None, 'resource_manager': None}
+
+def count_pdf_pages(pdf_path):
+    """Returns the number of pages of a PDF file, read from its page tree."""
+    with open(pdf_path, 'rb') as file:
+        document = PDFDocument(PDFParser(file))
+        return int(resolve1(document.catalog['Pages'])['Count'])
+
+def _worker_resource_manager(pdf_path):
+    stat = os.stat(pdf_path)
+    key = (pdf_path, stat.st_mtime_ns, stat.st_size)
+    if _worker_state['key'] != key:
+        _worker_state['key'] = key
+        _worker_state['resource_manager'] = PDFResourceManager(caching=True)
+    return _worker_state['resource_manager']
+
+def iter_extracted_pages(pdf_path, page_numbers=None):
+    """
+    Yields the text of the given pages of a PDF, using one resource manager
+    and text converter so pdfminer's font and resource caches are reused from
+    page to page.
+    
+    Args:
+        pdf_path (str): Path to the PDF file.
+        page_numbers (list): Zero-based page numbers to extract, or None for all pages.
+    
+    Yields:
+        str: Text of the next extracted page, in page order.
+    """
+    resource_manager = _worker_resource_manager(pdf_path)
+    text_stream = StringIO()
+    converter = TextConverter(resource_manager, text_stream, laparams=LAParams())
+    interpreter = PDFPageInterpreter(resource_manager, converter)
+    with open(pdf_path, 'rb') as file:
+        wanted = set(page_numbers) if page_numbers is not None else None
+        maxpages = max(page_numbers) + 1 if page_numbers else 0
+        for page in PDFPage.get_pages(file, pagenos=wanted, maxpages=maxpages):
+            interpreter.process_page(page)
+            text = text_stream.getvalue().replace("\ufb01", "fi")
+            text_stream.seek(0)
+            text_stream.truncate(0)
+            yield text
+    converter.close()
+
+def extract_pages(pdf_path, page_numbers=None):
+    """
+    Extracts the text of the given pages of a PDF (see iter_extracted_pages).
+    
+    Returns:
+        list: Text of each extracted page, in page order.
+    """
+    return list(iter_extracted_pages(pdf_path, page_numbers))
+
+def _extract_task(task):
+    """Process pool entry point: (index, pdf_path, page_numbers) -> (index, texts)."""
+    index, pdf_path, page_numbers = task
+    return index, extract_pages(pdf_path, page_numbers)
+
+def _page_tasks(pdf_paths):
+    """Splits the pages of each document into tasks of PDF_PAGES_PER_TASK pages."""
+    for index, pdf_path in enumerate(pdf_paths):
+        page_count = count_pdf_pages(pdf_path)
+        for start in range(0, page_count, PDF_PAGES_PER_TASK):
+            yield index, pdf_path, list(range(start, min(start + PDF_PAGES_PER_TASK, page_count)))
+
+def _iter_parallel(pdf_paths, workers):
+    """
+    Yields (document index, page text) for every page of `pdf_paths` in order,
+    extracting page chunks in a process pool. Only about two tasks per worker
+    are outstanding at a time, so finished pages do not pile up in memory.
+    """
+    tasks = _page_tasks(pdf_paths)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context()) as executor:
+        in_flight = deque()
+        for task in tasks:
+            in_flight.append(executor.submit(_extract_task, task))
+            if len(in_flight) >= 2 * workers:
+                index, texts = in_flight.popleft().result()
+                for text in texts:
+                    yield index, text
+        while in_flight:
+            index, texts = in_flight.popleft().result()
+            for text in texts:
+                yield index, text
+
+def iter_pdf_pages(pdf_path, workers=PDF_WORKERS):
+    """
+    Yields the text of each page of a PDF file, in order. Documents with at
+    least PDF_PARALLEL_MIN_PAGES pages are split across a pool of `workers`
+    processes; smaller ones are extracted serially.
+    
+    Args:
+        pdf_path (str): Path to the PDF file.
+        workers (int): Number of extraction processes; 1 forces serial mode.
+    
+    Yields:
+        str: Text of the next page.
+    """
+    if workers <= 1 or count_pdf_pages(pdf_path) < PDF_PARALLEL_MIN_PAGES:
+        yield from iter_extracted_pages(pdf_path)
+        return
+    for _, text in _iter_parallel([pdf_path], workers):
+        yield text
+
+def convert_pdfs_to_text(pdf_paths, workers=PDF_WORKERS):
+    """
+    Converts several PDF files to text, spreading all of their pages across
+    one process pool.
+    
+    Args:
+        pdf_paths (list): Paths to the PDF files.
+        workers (int): Number of extraction processes; 1 forces serial mode.
+    
+    Returns:
+        list: For each file, the list of its page texts.
+    """
+    documents = [[] for _ in pdf_paths]
+    if workers <= 1:
+        for index, pdf_path in enumerate(pdf_paths):
+            documents[index] = extract_pages(pdf_path)
+        return documents
+    for index, text in _iter_parallel(pdf_paths, workers):
+        documents[index].append(text)
+    return documents
+
+def convert_pdf_to_text(pdf_path, workers=PDF_WORKERS):
     """
     Converts a PDF file to a list of text pages using PDFMiner.
     
     Args:
         pdf_path (str): Path to the PDF file.
+        workers (int): Number of extraction processes; 1 forces serial mode.
     
     Returns:
         list: List containing text of each page.
     """
-    pages_text = []
-    with open(pdf_path, 'rb') as file:
-        parser = PDFParser(file)
-        document = PDFDocument(parser)
-        for page in PDFPage.create_pages(document):
-            text_stream = StringIO()
-            resource_manager = PDFResourceManager()
-            converter = TextConverter(resource_manager, text_stream, laparams=LAParams())
-            interpreter = PDFPageInterpreter(resource_manager, converter)
-            interpreter.process_page(page)
-            pages_text.append(text_stream.getvalue().replace("\ufb01", "fi"))
-    return pages_text
+    return list(iter_pdf_pages(pdf_path, workers))
+
+def split_page(text, splitting='naive'):
+    """
+    Splits the text of one page into paragraphs.
+    
+    Args:
+        text (str): Page text.
+        splitting (str): Method to split paragraphs ('naive', 'heuristic', or 'none').
+    
+    Returns:
+        list: Paragraph strings with newlines replaced by spaces.
+    """
+    if splitting == 'none':
+        paragraphs = [text]
+    else:
+        paragraphs = text.split('\n\n')
+        if splitting == 'heuristic':
+            paragraphs = split_paragraphs_heuristic(paragraphs)
+    return [paragraph.replace("\n", " ") for paragraph in paragraphs]
+
+def iter_page_records(pages, document_title, splitting='naive'):
+    """
+    Turns a stream of page texts into a stream of paragraph records.
+    
+    Args:
+        pages (iterable): Page texts, in order.
+        document_title (str): Identifier for the document.
+        splitting (str): Method to split paragraphs ('naive', 'heuristic', or 'none').
+    
+    Yields:
+        dict: Record with Text, Document, Page, Paragraph and Type.
+    """
+    for page_num, text in enumerate(pages, start=1):
+        for para_num, paragraph in enumerate(split_page(text, splitting), start=1):
+            yield {
+                'Text': paragraph,
+                'Document': document_title,
+                'Page': page_num,
+                'Paragraph': para_num,
+                'Type': 'pdf'
+            }
 
 def pages_to_dataframe(pages, document_title, splitting='naive'):
     """
@@ -99,41 +267,33 @@ def pages_to_dataframe(pages, document_title, splitting='naive'):
     Returns:
         pd.DataFrame: DataFrame with structured text data.
     """
-    df = pd.DataFrame(columns=['Text', 'Document', 'Page', 'Paragraph', 'Type'])
-    for page_num, text in enumerate(pages, start=1):
-        if splitting == 'none':
-            paragraphs = [text]
-        else:
-            paragraphs = text.split('\n\n')
-            if splitting == 'heuristic':
-                paragraphs = split_paragraphs_heuristic(paragraphs)
-        
-        for para_num, paragraph in enumerate(paragraphs, start=1):
-            paragraph = paragraph.replace("\n", " ")
-            df = df.append({
-                'Text': paragraph,
-                'Document': document_title,
-                'Page': page_num,
-                'Paragraph': para_num
-            }, ignore_index=True)
-    return df
+    return pd.DataFrame(list(iter_page_records(pages, document_title, splitting)),
+                        columns=RECORD_COLUMNS)
 
-def process_pdf(client, urls, splitting_method='naive'):
+def process_pdf(client, urls, splitting_method='naive', max_inflight_pages=PDF_INFLIGHT_PAGES,
+                progress=NO_PROGRESS):
     """
     Downloads, parses, and uploads PDF data to Weaviate.
+    PDFs are downloaded concurrently while earlier ones are processed. Later
+    pages are parsed while paragraphs of earlier pages are uploaded, with at
+    most `max_inflight_pages` parsed pages waiting for upload. Re-processing a
+    PDF only uploads the paragraphs that changed and deletes the ones that
+    no longer exist.
     
     Args:
         client: Weaviate client instance.
         urls (list): List of PDF URLs.
         splitting_method (str): Method for splitting paragraphs.
+        max_inflight_pages (int): Parsed pages buffered ahead of the upload.
+        progress (Progress): Receives downloaded, pages parsed and objects
+            uploaded counts.
     
     Returns:
         None
     """
-    for url in urls:
-        downloaded_path = download_pdf(url, "tempDownload.pdf")
-        pages = convert_pdf_to_text(downloaded_path)
-        dataframe = pages_to_dataframe(pages, url, splitting_method)
-        import_data(client, dataframe)
-
-
+    for url, downloaded_path in get_download_manager().fetch_many(urls):
+        progress.advance(STAGE_DOWNLOADED)
+        pages = prefetch(progress.track(iter_pdf_pages(downloaded_path), STAGE_PAGES_PARSED),
+                         max_inflight_pages)
+        sync_records(client, iter_page_records(pages, url, splitting_method),
+                     on_batch=progress.upload_callback())
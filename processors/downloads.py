@@ -0,0 +1,332 @@
+"""
+Download manager for ingestion sources.
+Streams downloads concurrently over a bounded connection pool into unique
+temporary files, then promotes them into a content-addressed cache (files
+named by their SHA-256). Cached sources are re-validated with ETag /
+Last-Modified, so unchanged sources are not downloaded again, and the least
+recently used files are evicted once the cache exceeds its size limit.
+
+The index of cached URLs is a SQLite file shared by every process using the
+cache directory. Files handed out by `acquire` and `fetch_many` are pinned
+there until released, so no thread or process evicts a file that is still
+being parsed.
+"""
+import contextlib
+import hashlib
+import itertools
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+DOWNLOAD_CACHE_DIR = os.getenv('DOWNLOAD_CACHE_DIR', os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), 'download_cache'))
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv('DOWNLOAD_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+DOWNLOAD_CONNECTIONS = int(os.getenv('DOWNLOAD_CONNECTIONS', '4'))
+DOWNLOAD_TIMEOUT = float(os.getenv('DOWNLOAD_TIMEOUT', '60'))
+# Directories whose files may be ingested by local path, separated by os.pathsep
+DOWNLOAD_LOCAL_DIRS = [path for path in os.getenv('DOWNLOAD_LOCAL_DIRS', '').split(os.pathsep) if path]
+CHUNK_SIZE = 1 << 16
+
+ENTRY_COLUMNS = ('sha256', 'suffix', 'size', 'etag', 'last_modified', 'fetched_at')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class DownloadManager:
+    """
+    Fetches URLs into a content-addressed on-disk cache. Safe to share between
+    threads and processes; at most `connections` downloads of this manager run
+    at the same time.
+    """
+    def __init__(self, cache_dir=DOWNLOAD_CACHE_DIR, max_bytes=DOWNLOAD_CACHE_MAX_BYTES,
+                 connections=DOWNLOAD_CONNECTIONS, timeout=DOWNLOAD_TIMEOUT, local_dirs=DOWNLOAD_LOCAL_DIRS):
+        """
+        Args:
+            cache_dir (str): Directory holding the cached files and their index.
+            max_bytes (int): Total size of cached files above which old files are evicted.
+            connections (int): Maximum number of concurrent downloads.
+            timeout (float): Connect and read timeout in seconds.
+            local_dirs (list): Directories whose files are returned as is instead of downloaded.
+        """
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.tmp_dir = os.path.join(cache_dir, 'tmp')
+        self.index_path = os.path.join(cache_dir, 'index.sqlite3')
+        self.max_bytes = max_bytes
+        self.connections = connections
+        self.timeout = timeout
+        self.local_dirs = [os.path.realpath(path) for path in local_dirs]
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS entries (url TEXT PRIMARY KEY, sha256 TEXT, suffix TEXT, '
+                         'size INTEGER, etag TEXT, last_modified TEXT, fetched_at REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS pins '
+                         '(path TEXT, pid INTEGER, count INTEGER, PRIMARY KEY (path, pid))')
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=connections, pool_maxsize=connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._slots = threading.BoundedSemaphore(connections)
+
+    @contextlib.contextmanager
+    def _connect(self, immediate=False):
+        """
+        Yields a connection, committing on success, and always closes it.
+        With `immediate`, other writers wait until the transaction ends.
+        """
+        with contextlib.closing(sqlite3.connect(self.index_path, timeout=30)) as conn:
+            with conn:
+                if immediate:
+                    conn.execute('BEGIN IMMEDIATE')
+                yield conn
+
+    def _entry(self, conn, url):
+        row = conn.execute(f'SELECT {", ".join(ENTRY_COLUMNS)} FROM entries WHERE url = ?', (url,)).fetchone()
+        return dict(zip(ENTRY_COLUMNS, row)) if row else None
+
+    def _object_path(self, entry):
+        return os.path.join(self.objects_dir, entry['sha256'] + (entry.get('suffix') or ''))
+
+    def _pin(self, conn, path):
+        conn.execute('INSERT INTO pins VALUES (?, ?, 1) ON CONFLICT (path, pid) DO UPDATE SET count = count + 1',
+                     (path, os.getpid()))
+
+    def _unpin(self, conn, path):
+        conn.execute('UPDATE pins SET count = count - 1 WHERE path = ? AND pid = ?', (path, os.getpid()))
+        conn.execute('DELETE FROM pins WHERE count <= 0')
+
+    def local_source(self, url):
+        """
+        Returns the path of a local source, or None for an HTTP(S) URL.
+
+        Raises:
+            ValueError: If `url` is neither an HTTP(S) URL nor a file inside `local_dirs`.
+        """
+        if urlparse(url).scheme in ('http', 'https'):
+            return None
+        path = os.path.realpath(url)
+        for root in self.local_dirs:
+            if os.path.commonpath([root, path]) == root and os.path.isfile(path):
+                return path
+        raise ValueError(f'{url} is not an HTTP(S) URL or a file in DOWNLOAD_LOCAL_DIRS')
+
+    def cached_path(self, url):
+        """Returns the cached file for `url` without network access, or None."""
+        with self._connect() as conn:
+            entry = self._entry(conn, url)
+        if entry is None:
+            return None
+        path = self._object_path(entry)
+        return path if os.path.exists(path) else None
+
+    def acquire(self, url):
+        """
+        Returns a local path holding the content of `url`, downloading it only
+        if it is not cached or the server reports that it changed. The file is
+        pinned against eviction until `release(path)` is called. Local files
+        in `local_dirs` are returned as is.
+
+        Args:
+            url (str): HTTP(S) URL or local file path.
+
+        Returns:
+            str: Path of the cached file.
+        """
+        local = self.local_source(url)
+        if local is not None:
+            return local
+        headers = {}
+        cached = None
+        with self._connect(immediate=True) as conn:
+            entry = self._entry(conn, url)
+            if entry is not None and os.path.exists(self._object_path(entry)):
+                cached = self._object_path(entry)
+                self._pin(conn, cached)
+                if entry['etag']:
+                    headers['If-None-Match'] = entry['etag']
+                if entry['last_modified']:
+                    headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            with self._slots:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code == 304 and cached is not None:
+                        os.utime(cached)
+                        return cached
+                    response.raise_for_status()
+                    tmp_path, sha256, size = self._stream_to_tempfile(response)
+        except BaseException:
+            if cached is not None:
+                self.release(cached)
+            raise
+
+        suffix = os.path.splitext(urlparse(url).path)[1][:16]
+        entry = {'sha256': sha256, 'suffix': suffix, 'size': size,
+                 'etag': response.headers.get('ETag'),
+                 'last_modified': response.headers.get('Last-Modified'),
+                 'fetched_at': time.time()}
+        path = self._object_path(entry)
+        with self._connect(immediate=True) as conn:
+            if os.path.exists(path):
+                # Same content is already cached, e.g. under another URL.
+                os.remove(tmp_path)
+                os.utime(path)
+            else:
+                os.replace(tmp_path, path)
+            conn.execute(f'INSERT OR REPLACE INTO entries (url, {", ".join(ENTRY_COLUMNS)}) '
+                         f'VALUES (?, {", ".join("?" * len(ENTRY_COLUMNS))})',
+                         (url, *(entry[column] for column in ENTRY_COLUMNS)))
+            self._pin(conn, path)
+            if cached is not None:
+                self._unpin(conn, cached)
+        self.evict()
+        return path
+
+    def release(self, path):
+        """Unpins a path returned by `acquire`, so it can be evicted again."""
+        with self._connect() as conn:
+            self._unpin(conn, path)
+
+    @contextlib.contextmanager
+    def pinned(self, url):
+        """Context manager yielding the local path of `url`, pinned while the block runs."""
+        path = self.acquire(url)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def fetch(self, url):
+        """
+        Returns a local path holding the content of `url` (see `acquire`),
+        without pinning it. Use `pinned` to keep it while other fetches may
+        evict files.
+        """
+        path = self.acquire(url)
+        self.release(path)
+        return path
+
+    def _stream_to_tempfile(self, response):
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    tmp_file.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size
+
+    def fetch_many(self, urls, lookahead=None):
+        """
+        Fetches `urls` concurrently over the connection pool, at most
+        `lookahead` of them (default: the number of connections) ahead of the
+        consumer.
+
+        Yields:
+            tuple: (url, local path) in the order of `urls`. Each path stays
+                pinned until the consumer asks for the next one.
+        """
+        urls = list(urls)
+        if not urls:
+            return
+        lookahead = max(1, lookahead or self.connections)
+        remaining = iter(urls)
+        in_flight = deque()
+        executor = ThreadPoolExecutor(max_workers=min(self.connections, lookahead, len(urls)))
+        try:
+            for url in itertools.islice(remaining, lookahead):
+                in_flight.append(executor.submit(self.acquire, url))
+            for url in urls:
+                path = in_flight.popleft().result()
+                try:
+                    for next_url in itertools.islice(remaining, 1):
+                        in_flight.append(executor.submit(self.acquire, next_url))
+                    yield url, path
+                finally:
+                    self.release(path)
+        finally:
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=True)
+            for future in in_flight:
+                if not future.cancelled() and future.exception() is None:
+                    self.release(future.result())
+
+    def evict(self, keep=None):
+        """
+        Removes least recently used files until the cache fits in max_bytes.
+        Pinned files are never removed.
+
+        Args:
+            keep (str): Another path that must not be evicted.
+
+        Returns:
+            int: Number of files removed.
+        """
+        with self._connect(immediate=True) as conn:
+            pinned = set()
+            dead = set()
+            for path, pid in conn.execute('SELECT path, pid FROM pins').fetchall():
+                (pinned if _pid_alive(pid) else dead).add((path, pid))
+            conn.executemany('DELETE FROM pins WHERE path = ? AND pid = ?', dead)
+            pinned = {path for path, _ in pinned}
+            if keep is not None:
+                pinned.add(keep)
+
+            files = []
+            for name in os.listdir(self.objects_dir):
+                path = os.path.join(self.objects_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in files)
+            removed = []
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                if path in pinned:
+                    continue
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+                removed.append((os.path.basename(path),))
+                total -= size
+            conn.executemany("DELETE FROM entries WHERE sha256 || COALESCE(suffix, '') = ?", removed)
+        return len(removed)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_download_manager():
+    """Returns the process-wide DownloadManager, creating it on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = DownloadManager()
+        return _manager
@@ -0,0 +1,125 @@
+"""
+Frame source for video splitters.
+Asks ffmpeg for only the sampled frames (every N-th frame, optionally at a
+lower resolution), so skipped frames are never decoded into NumPy arrays.
+Keeps the most recent frames in a preallocated ring buffer and caches probe
+metadata per file.
+"""
+import functools
+import os
+
+import numpy as np
+import skvideo.io
+
+
+@functools.lru_cache(maxsize=64)
+def _probe(path, mtime, size):
+    video = skvideo.io.ffprobe(path)['video']
+    rate_num, _, rate_den = video.get('@avg_frame_rate', '0/1').partition('/')
+    duration = float(video['@duration'])
+    fps = float(rate_num) / float(rate_den or 1) if float(rate_num) else 0.0
+    frames = int(video['@nb_frames']) if video.get('@nb_frames') else int(round(duration * fps))
+    return {'duration': duration, 'frames': frames, 'fps': fps or frames / duration,
+            'width': int(video['@width']), 'height': int(video['@height'])}
+
+
+def probe_video(path):
+    """
+    Returns the duration, frame count, frame rate, width and height of a video.
+    Results are cached until the file changes.
+    """
+    stat = os.stat(path)
+    return dict(_probe(path, stat.st_mtime, stat.st_size))
+
+
+class FrameSource:
+    """
+    Iterator over the sampled frames of a video file. Frame `i` of the source
+    is frame `(i + 1) * frame_period - 1` of the video, the same frames the
+    previous read-and-skip loop returned.
+    """
+    def __init__(self, path, frame_period=1, target_fps=None, resolution=None, recent_frames=1):
+        """
+        Args:
+            path (str): Path of the video file.
+            frame_period (int): Keep one frame out of every `frame_period`.
+            target_fps (float): Sampling rate to approximate instead of `frame_period`.
+            resolution (tuple): Optional (width, height) frames are scaled to by the decoder.
+            recent_frames (int): Number of recent frames kept for lookback.
+        """
+        self.path = path
+        self.metadata = probe_video(path)
+        self.resolution = resolution
+        self.recent_frame_count = max(1, recent_frames)
+        self.frame_period = self._period(frame_period, target_fps)
+        self.seconds_per_frame = self.metadata['duration'] / self.metadata['frames'] * self.frame_period
+        self._ring = None
+        self.reset()
+
+    def _period(self, frame_period, target_fps):
+        if target_fps:
+            return max(1, int(round(self.metadata['fps'] / target_fps)))
+        return max(1, int(frame_period))
+
+    @property
+    def duration(self):
+        return self.metadata['duration']
+
+    @property
+    def sampled_frames(self):
+        """Number of frames the source yields for the whole video."""
+        return self.metadata['frames'] // self.frame_period
+
+    def reset(self, frame_period=None, target_fps=None):
+        """Restarts decoding from the beginning, optionally with a new sampling period."""
+        if frame_period or target_fps:
+            self.frame_period = self._period(frame_period, target_fps)
+            self.seconds_per_frame = self.metadata['duration'] / self.metadata['frames'] * self.frame_period
+        outputdict = {'-vframes': str(self.sampled_frames)}
+        if self.frame_period > 1:
+            # Select frames period-1, 2*period-1, ... inside ffmpeg, without duplicating them.
+            outputdict['-vf'] = "select='eq(mod(n+1\\,%d)\\,0)'" % self.frame_period
+            outputdict['-vsync'] = '0'
+        if self.resolution:
+            outputdict['-s'] = '%dx%d' % tuple(self.resolution)
+        self._reader = skvideo.io.vreader(self.path, outputdict=outputdict)
+        self.current_frame_index = -1
+        self._stored = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.current_frame_index + 1 >= self.sampled_frames:
+            raise StopIteration
+        # The reader stops at EOF on ffmpeg's pipe, e.g. when the decoder produced
+        # fewer frames than the metadata announced. Read errors propagate.
+        frame = next(self._reader)
+        self.current_frame_index += 1
+        if self._ring is None or self._ring.shape[1:] != frame.shape:
+            self._ring = np.empty((self.recent_frame_count,) + frame.shape, dtype=frame.dtype)
+            self._stored = 0
+        self._ring[self.current_frame_index % self.recent_frame_count] = frame
+        self._stored = min(self._stored + 1, self.recent_frame_count)
+        return frame
+
+    def next_frame(self):
+        """Returns the next frame, or None once the video has ended."""
+        return next(self, None)
+
+    def recent_frame(self, frames_back):
+        """
+        Returns the frame `frames_back` frames before the next one (1 is the
+        current frame), or None if it is no longer buffered.
+        """
+        if not 1 <= frames_back <= self._stored:
+            return None
+        return self._ring[(self.current_frame_index - frames_back + 1) % self.recent_frame_count]
+
+    def frame(self, frame_number):
+        """Returns sampled frame `frame_number` if it is still buffered, else None."""
+        return self.recent_frame(self.current_frame_index - frame_number + 1)
+
+    def current_time(self):
+        """Returns the timestamp of the current frame in seconds."""
+        return self.current_frame_index * self.seconds_per_frame
@@ -2,12 +2,14 @@ import os
 import numpy as np
 from skimage.transform import downscale_local_mean
 import time
-import skvideo.io
-from youtube_transcript_api import YouTubeTranscriptApi
-from urllib.parse import urlparse, parse_qs
 from pytube import YouTube
-import pandas as pd
-from weaviate.weaviate_calls import import_data
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from core.weaviate import sync_records
+from processors.downloads import get_download_manager
+from processors.frame_source import FrameSource
+from processors.pipeline import (NO_PROGRESS, STAGE_DOWNLOADED, STAGE_VIDEOS_SPLIT, PipelineCancelled,
+                                 worker_context)
+from processors.transcripts import TranscriptTimeline, fetch_transcript, video_id_from_url
 
 DOWNSCALE_FACTOR = 2
 NORMALIZATION_WINDOW = 300
@@ -17,83 +19,218 @@ IGNORE_INITIAL_SECONDS = 1
 IGNORE_CLOSE_SECONDS = 5
 FIXED_SECTION_LENGTH = 300
 SCENE_DETECTION_THRESHOLD = 5.0
+GRAYSCALE_DIFFS = False
+SCENE_HISTOGRAM_BINS = 16
+SCENE_DOWNSCALE_FACTOR = 4
+VIDEO_STORAGE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'videos/')
+VIDEO_WORKERS = int(os.getenv('VIDEO_WORKERS', str(min(4, os.cpu_count() or 1))))
+VIDEO_DOWNLOAD_WORKERS = int(os.getenv('VIDEO_DOWNLOAD_WORKERS', '4'))
+VIDEO_TARGET_FPS = float(os.getenv('VIDEO_TARGET_FPS', '1'))
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.webm', '.mov', '.avi')
+LUMINANCE_WEIGHTS = np.array([0.299, 0.587, 0.114])
 
 class VideoSlideSeparator:
-    def __init__(self, parser, method='slide'):
+    def __init__(self, parser, method='slide', extract_text=True):
         """
         Initializes the VideoSlideSeparator with a specific splitting method.
         
         Args:
             parser: Instance of VideoParser.
             method (str): Method to determine splits. Options are 'slide', 'even', 'scene', or 'none'.
+            extract_text (bool): Also look up the transcript text of each section.
         """
         self.differences = None
         if method == 'slide':
             self.splits = self.detect_slide_changes(parser)
+        elif method == 'scene':
+            self.splits = self.detect_scene_changes(parser)
         elif method == 'none':
             self.splits = [0]
         elif method == 'even':
-            self.splits = [i * FIXED_SECTION_LENGTH for i in range(parser.length // FIXED_SECTION_LENGTH)]
+            self.splits = [i * FIXED_SECTION_LENGTH
+                           for i in range(max(1, int(parser.duration) // FIXED_SECTION_LENGTH))]
         else:
             self.splits = [0]
             print('Invalid splitting method selected.')
-        self.sections = parser.extract_text_from_splits(self.splits)
+        self.sections = parser.extract_text_from_splits(self.splits) if extract_text else None
 
-    def detect_slide_changes(self, parser):
-        """Identifies frame timestamps where slide changes occur."""
-        start_time = time.time()
-        differences = []
-        used_diffs = []
-        frames = []
-        split_times = []
-        previous_frame = parser.get_next_frame()
-        current_frame = parser.get_next_frame()
+    def detect_slide_changes(self, parser, grayscale=GRAYSCALE_DIFFS):
+        """
+        Identifies frame timestamps where slide changes occur.
+        Each frame is downscaled once and compared with the previous one; the
+        differences are then standardized against a centered rolling window.
         
-        while current_frame is not None:
-            diff = downscale_local_mean(current_frame, 
-                                        (DOWNSCALE_FACTOR, DOWNSCALE_FACTOR, 1)).astype(int) - \
-                   downscale_local_mean(previous_frame, 
-                                        (DOWNSCALE_FACTOR, DOWNSCALE_FACTOR, 1)).astype(int)
-            differences.append(np.mean(np.power(diff, 2)))
-            previous_frame = current_frame
-            current_frame = parser.get_next_frame()
-
-        window_size = NORMALIZATION_WINDOW
-        window_frames = int(window_size // parser.seconds_per_frame)
-        standardized_diffs = []
-        active_diffs = differences[:min(len(differences), window_frames)]
+        Args:
+            parser: Instance of VideoParser, or anything with `frames()` and
+                `seconds_per_frame`.
+            grayscale (bool): Compare luminance instead of all color channels.
         
-        for i in range(len(differences)):
-            if window_frames // 2 <= i < len(differences) - window_frames // 2:
-                active_diffs.pop(0)
-                active_diffs.append(differences[i + window_frames // 2])
-            mean_diff = np.mean(active_diffs)
-            std_dev = max(np.sqrt(np.mean((np.array(active_diffs) - mean_diff) ** 2)), MIN_STD)
-            standardized_diffs.append((differences[i] - mean_diff) / std_dev)
-
-        potential_splits = []
-        split_frames_list = []
-        for i, std_diff in enumerate(standardized_diffs):
-            if std_diff > SPLIT_THRESHOLD:
-                potential_splits.append((i + 1) * parser.seconds_per_frame)
-                split_frames_list.append(i + 1)
-
-        # Remove splits that are too close to each other
-        index = len(potential_splits) - 1
-        while index > 0:
-            if potential_splits[index] - potential_splits[index - 1] < IGNORE_CLOSE_SECONDS:
-                potential_splits.pop(index)
-            index -= 1
-
-        # Exclude early splits
-        filtered_splits = [t for t in potential_splits if t > IGNORE_INITIAL_SECONDS]
-        filtered_splits.insert(0, 0.0)  # Add the start time
+        Returns:
+            list: Split times in seconds, starting with 0.0.
+        """
+        start_time = time.time()
+        differences = np.fromiter(frame_differences(parser.frames(), grayscale), dtype=np.float64)
+        window_frames = int(NORMALIZATION_WINDOW // parser.seconds_per_frame)
+        standardized_diffs = rolling_zscores(differences, window_frames)
+        filtered_splits = splits_from_scores(standardized_diffs, SPLIT_THRESHOLD, parser.seconds_per_frame)
         self.differences = standardized_diffs
+        print(f'Detected {len(filtered_splits)} sections from {len(differences) + 1} frames '
+              f'in {time.time() - start_time:.1f}s')
 
         return filtered_splits
 
+    def detect_scene_changes(self, parser, grayscale=False):
+        """
+        Identifies frame timestamps where the scene changes, by comparing compact
+        color (or luminance) histograms of subsampled frames instead of whole
+        frames. Much cheaper per frame than `detect_slide_changes`, and less
+        sensitive to small movements such as a pointer or a speaker.
+        
+        Args:
+            parser: Instance of VideoParser, or anything with `frames()` and
+                `seconds_per_frame`.
+            grayscale (bool): Use luminance histograms instead of per-channel ones.
+        
+        Returns:
+            list: Split times in seconds, starting with 0.0.
+        """
+        start_time = time.time()
+        distances = np.fromiter(histogram_distances(parser.frames(), grayscale), dtype=np.float64)
+        window_frames = int(NORMALIZATION_WINDOW // parser.seconds_per_frame)
+        scores = rolling_zscores(distances, window_frames)
+        filtered_splits = splits_from_scores(scores, SCENE_DETECTION_THRESHOLD, parser.seconds_per_frame)
+        self.differences = scores
+        print(f'Detected {len(filtered_splits)} scenes from {len(distances) + 1} frames '
+              f'in {time.time() - start_time:.1f}s')
+
+        return filtered_splits
+
+def splits_from_scores(scores, threshold, seconds_per_frame):
+    """
+    Turns standardized frame differences into split times: frames scoring
+    above `threshold`, without splits closer than IGNORE_CLOSE_SECONDS to the
+    preceding candidate or earlier than IGNORE_INITIAL_SECONDS.
+    """
+    split_frames = np.flatnonzero(scores > threshold) + 1
+    potential_splits = split_frames * seconds_per_frame
+
+    # Remove splits that are too close to the preceding candidate
+    keep = np.ones(len(potential_splits), dtype=bool)
+    keep[1:] = np.diff(potential_splits) >= IGNORE_CLOSE_SECONDS
+
+    # Exclude early splits
+    filtered_splits = [t for t in potential_splits[keep].tolist() if t > IGNORE_INITIAL_SECONDS]
+    filtered_splits.insert(0, 0.0)  # Add the start time
+    return filtered_splits
+
+def frame_histogram(frame, grayscale=False, bins=SCENE_HISTOGRAM_BINS):
+    """
+    Returns the normalized histogram of a frame subsampled by
+    SCENE_DOWNSCALE_FACTOR: `bins` luminance bins, or `bins` bins per color
+    channel concatenated. `bins` must be a power of two.
+    """
+    small = frame[::SCENE_DOWNSCALE_FACTOR, ::SCENE_DOWNSCALE_FACTOR]
+    shift = 8 - int(np.log2(bins))
+    if grayscale:
+        codes = (small @ LUMINANCE_WEIGHTS).astype(np.uint8) >> shift
+    else:
+        # Offset each channel's bin codes so one bincount covers all channels.
+        codes = (small >> shift).astype(np.intp) + np.arange(small.shape[-1]) * bins
+    histogram = np.bincount(codes.ravel(), minlength=bins if grayscale else bins * small.shape[-1])
+    return histogram / (small.shape[0] * small.shape[1])
+
+def histogram_distances(frames, grayscale=False):
+    """
+    Yields the total variation distance (0 to 1) between the histograms of
+    each frame and the previous one.
+    
+    Args:
+        frames: Iterable of uint8 frames (height x width x channels arrays).
+        grayscale (bool): Use luminance histograms instead of per-channel ones.
+    
+    Yields:
+        float: One distance per pair of consecutive frames.
+    """
+    previous = None
+    for frame in frames:
+        current = frame_histogram(frame, grayscale)
+        if previous is not None:
+            channels = 1 if grayscale else frame.shape[-1]
+            yield 0.5 * np.abs(current - previous).sum() / channels
+        previous = current
+
+def downscale_frame(frame, grayscale=False):
+    """
+    Downscales a frame by DOWNSCALE_FACTOR in both dimensions, optionally
+    reducing it to luminance, as an integer array.
+    """
+    small = downscale_local_mean(frame, (DOWNSCALE_FACTOR, DOWNSCALE_FACTOR, 1))
+    if grayscale:
+        small = small @ LUMINANCE_WEIGHTS
+    return small.astype(int)
+
+def frame_differences(frames, grayscale=False):
+    """
+    Yields the mean squared difference between each downscaled frame and the
+    previous one. Every frame is downscaled exactly once.
+    
+    Args:
+        frames: Iterable of frames (height x width x channels arrays).
+        grayscale (bool): Compare luminance instead of all color channels.
+    
+    Yields:
+        float: One difference per pair of consecutive frames.
+    """
+    previous = None
+    for frame in frames:
+        current = downscale_frame(frame, grayscale)
+        if previous is not None:
+            yield np.mean(np.square(current - previous))
+        previous = current
+
+def rolling_zscores(differences, window_frames):
+    """
+    Standardizes each difference against the mean and standard deviation of a
+    window of about `window_frames` differences centered on it (clamped at the
+    start and end of the video), in O(n) using prefix sums.
+    
+    The window reproduces the FIFO of the original detector exactly: it starts
+    as the first `window_frames` differences and, for each centered position,
+    drops its oldest entry and appends the difference `window_frames // 2`
+    ahead. For an odd window this appends difference `2 * (window_frames // 2)`
+    a second time, so the windows are slices of that FIFO sequence.
+    
+    Args:
+        differences (np.ndarray): Frame differences.
+        window_frames (int): Window length in frames.
+    
+    Returns:
+        np.ndarray: Standardized differences.
+    """
+    count = len(differences)
+    if count == 0:
+        return np.zeros(0)
+    half = max(window_frames, 1) // 2
+    length = min(count, max(window_frames, 1))
+    appended = max(0, count - 2 * half)
+    sequence = np.concatenate([np.arange(length), 2 * half + np.arange(appended)])
+    # Shifting by the median keeps the sums of squares well conditioned.
+    offset = np.median(differences)
+    values = differences[sequence] - offset
+    sums = np.concatenate([[0.0], np.cumsum(values)])
+    squares = np.concatenate([[0.0], np.cumsum(values * values)])
+
+    # Number of entries appended to the FIFO once position i has been processed
+    starts = np.clip(np.arange(count) - half + 1, 0, appended)
+    window_sum = sums[starts + length] - sums[starts]
+    window_squares = squares[starts + length] - squares[starts]
+    means = window_sum / length
+    std_devs = np.maximum(np.sqrt(np.maximum(window_squares / length - means ** 2, 0.0)), MIN_STD)
+    return (differences - offset - means) / std_devs
+
 class VideoParser:
-    def __init__(self, url, save_path, recent_frames=1, frame_period=1, force_download=False):
+    def __init__(self, url, save_path, recent_frames=1, frame_period=1, force_download=False,
+                 target_fps=None, resolution=None, video_path=None):
         """
         Initializes the VideoParser with video details.
         
@@ -103,27 +240,34 @@ class VideoParser:
             recent_frames (int): Number of recent frames to retain.
             frame_period (int): Number of frames to skip between samples.
             force_download (bool): Whether to force re-download the video.
+            target_fps (float): Sampling rate to use instead of `frame_period`.
+            resolution (tuple): Optional (width, height) to decode frames at.
+            video_path (str): Local video file to use instead of downloading `url`.
         """
-        if not os.path.isdir(save_path) or len(os.listdir(save_path)) != 1 or force_download:
-            self.retrieve_video(url, save_path)
-        self.video_path = os.path.join(save_path, os.listdir(save_path)[0])
+        if video_path is None:
+            video_path = retrieve_video(url, save_path, force_download)
+        self.video_path = video_path
         self.url = url
-        self.recent_frame_count = recent_frames
-        self.frame_skip_period = frame_period
-        self.reset_stream()
-        
-        metadata = skvideo.io.ffprobe(self.video_path)['video']
-        self.duration = float(metadata['@duration'])
+        self._timeline = None
+        self.source = FrameSource(self.video_path, frame_period=frame_period, target_fps=target_fps,
+                                  resolution=resolution, recent_frames=recent_frames)
+        self.duration = self.source.duration
+
+    @property
+    def seconds_per_frame(self):
+        return self.source.seconds_per_frame
+
+    @property
+    def current_frame_index(self):
+        return self.source.current_frame_index
+
+    def frames(self):
+        """Returns an iterator over the remaining sampled frames."""
+        return iter(self.source)
 
     def reset_stream(self, new_frame_period=None):
         """Resets the video reader to start from the beginning."""
-        self.buffer = []
-        self.reader = skvideo.io.vreader(self.video_path)
-        self.current_frame_index = -1
-        if new_frame_period:
-            self.frame_skip_period = new_frame_period
-        metadata = skvideo.io.ffprobe(self.video_path)['video']
-        self.seconds_per_frame = float(metadata['@duration']) / float(metadata['@nb_frames']) * self.frame_skip_period
+        self.source.reset(frame_period=new_frame_period)
 
     def get_specific_frame(self, frame_number):
         """
@@ -135,13 +279,13 @@ class VideoParser:
         Returns:
             The requested frame as a numpy array or None if unavailable.
         """
-        if self.current_frame_index - frame_number >= self.recent_frame_count:
-            print(f'Frame {frame_number} not available in buffer.')
-            return None
         if frame_number > self.current_frame_index:
             print(f'Frame {frame_number} has not been reached yet.')
             return None
-        return self.buffer[frame_number - self.current_frame_index]
+        frame = self.source.frame(frame_number)
+        if frame is None:
+            print(f'Frame {frame_number} not available in buffer.')
+        return frame
 
     def get_recent_frame(self, frames_back):
         """
@@ -153,10 +297,10 @@ class VideoParser:
         Returns:
             The requested frame as a numpy array or None if unavailable.
         """
-        if frames_back > len(self.buffer):
+        frame = self.source.recent_frame(frames_back)
+        if frame is None:
             print(f'Frame {self.current_frame_index - frames_back} not stored in buffer.')
-            return None
-        return self.buffer[-frames_back]
+        return frame
 
     def get_next_frame(self):
         """
@@ -165,20 +309,11 @@ class VideoParser:
         Returns:
             The next frame as a numpy array or None if the video has ended.
         """
-        self.current_frame_index += 1
-        try:
-            for _ in range(self.frame_skip_period):
-                next_frame = next(self.reader)
-            self.buffer.append(next_frame)
-            if len(self.buffer) > self.recent_frame_count:
-                self.buffer.pop(0)
-            return next_frame
-        except StopIteration:
-            return None
+        return self.source.next_frame()
 
     def current_time(self):
         """Returns the current timestamp based on the frame index."""
-        return self.current_frame_index * self.seconds_per_frame
+        return self.source.current_time()
 
     def retrieve_video(self, url, destination='./videos'):
         """
@@ -188,17 +323,20 @@ class VideoParser:
             url: YouTube video URL.
             destination (str): Directory path to save the video.
         """
-        yt = YouTube(url)
-        video_stream = yt.streams.first()
-        video_stream.download(destination)
+        return retrieve_video(url, destination, force_download=True)
 
     def fetch_transcript(self):
-        """Retrieves the transcript of the YouTube video."""
-        parsed_url = urlparse(self.url)
-        query_params = parse_qs(parsed_url.query)
-        video_id = query_params['v'][0]
-        transcript = YouTubeTranscriptApi.get_transcript(video_id)
-        return transcript
+        """
+        Retrieves the transcript of the YouTube video, from the transcript cache
+        if present, or the transcript fixture of a local video file.
+        """
+        return fetch_transcript(self.url)
+
+    def transcript_timeline(self):
+        """Returns the TranscriptTimeline of the video, loading it on first use."""
+        if self._timeline is None:
+            self._timeline = TranscriptTimeline(self.fetch_transcript())
+        return self._timeline
 
     def extract_text_from_splits(self, splits):
         """
@@ -210,41 +348,158 @@ class VideoParser:
         Returns:
             List of text segments corresponding to each split.
         """
-        transcript = self.fetch_transcript()
-        results = []
-        splits = splits[:]
-        splits.append(transcript[-1]['start'] + transcript[-1]['duration'] + 1)
-        index = 0
-        while index < len(splits) - 1:
-            text_segment = ''
-            if not transcript:
-                results.append('')
-            else:
-                while transcript and transcript[0]['start'] < splits[index + 1]:
-                    text_segment += ' ' + transcript.pop(0)['text']
-            results.append(text_segment)
-            index += 1
-        return results
-
-def process_video(client, video_links):
+        return self.transcript_timeline().segments(splits)
+
+def retrieve_video(url, destination=VIDEO_STORAGE_DIR, force_download=False):
+    """
+    Downloads a YouTube video into `destination` unless it already holds it.
+    
+    Args:
+        url: YouTube video URL.
+        destination (str): Directory holding only this video.
+        force_download (bool): Whether to download again.
+    
+    Returns:
+        str: Path of the video file.
+    """
+    if force_download or not os.path.isdir(destination) or len(os.listdir(destination)) != 1:
+        yt = YouTube(url)
+        video_stream = yt.streams.first()
+        video_stream.download(destination)
+    return os.path.join(destination, os.listdir(destination)[0])
+
+def is_video_link(link):
+    """True for YouTube URLs and local video files."""
+    return 'youtube.com' in link or 'youtu.be' in link or link.lower().endswith(VIDEO_EXTENSIONS)
+
+def fetch_video(link):
+    """
+    Returns the local file of a video link, downloading YouTube videos into
+    VIDEO_STORAGE_DIR/<video id>/ once. Local files are only accepted inside
+    DOWNLOAD_LOCAL_DIRS.
+    """
+    local = get_download_manager().local_source(link)
+    if local is not None:
+        return local
+    return retrieve_video(link, os.path.join(VIDEO_STORAGE_DIR, video_id_from_url(link)))
+
+def split_video(link, video_path, splitting_method='slide', target_fps=VIDEO_TARGET_FPS):
+    """
+    Computes the section start times of a video. Runs in a worker process.
+    
+    Returns:
+        tuple: (split times, video duration, seconds spent)
+    """
+    start_time = time.perf_counter()
+    parser = VideoParser(link, None, video_path=video_path, target_fps=target_fps)
+    splits = VideoSlideSeparator(parser, splitting_method, extract_text=False).splits
+    return splits, parser.duration, time.perf_counter() - start_time
+
+def iter_section_records(link, splits, duration, timeline):
+    """
+    Yields one record per non-empty section of a video, with the section's
+    transcript text and time range.
+    """
+    ends = list(splits[1:]) + [max(duration, timeline.end)]
+    for index, (text, start, end) in enumerate(zip(timeline.segments(splits), splits, ends)):
+        if text.strip():
+            yield {'Text': text.strip(), 'Document': link, 'Page': index, 'Paragraph': 0,
+                   'Type': 'video', 'StartTime': start, 'EndTime': end}
+
+def _fetch_video_inputs(link):
+    start_time = time.perf_counter()
+    video_path = fetch_video(link)
+    downloaded = time.perf_counter()
+    timeline = TranscriptTimeline(fetch_transcript(link))
+    return video_path, timeline, downloaded - start_time, time.perf_counter() - downloaded
+
+def process_video(client, video_links, splitting_method='slide', workers=VIDEO_WORKERS,
+                  progress=NO_PROGRESS):
     """
     Processes a list of video links and uploads their parsed data to Weaviate.
+    Videos and transcripts are fetched concurrently, frames are decoded and
+    split in a pool of `workers` processes, and each video's sections are
+    uploaded as soon as it is split, while later videos are still being split.
+    Every section becomes a Post with its startTime and endTime. A video that
+    cannot be fetched, split or uploaded (e.g. it has no transcript) is
+    reported with its error and skipped; the other videos are still processed.
     
     Args:
         client: Weaviate client instance for database operations.
-        video_links (list): List of YouTube video URLs.
+        video_links (list): YouTube video URLs or local video files inside
+            DOWNLOAD_LOCAL_DIRS; local files need a transcript fixture next to
+            them (`talk.mp4` -> `talk.json`).
+        splitting_method (str): 'slide', 'scene', 'even' or 'none'.
+        workers (int): Number of splitting processes; 1 splits in this process.
+        progress (Progress): Receives downloaded, videos split and objects uploaded counts.
     
     Returns:
-        None
-    """
-    dataframe = pd.DataFrame(columns=['Document', 'Page', 'Paragraph', 'Text'])
-    for link in video_links:
-        # Example data; replace with actual parsing logic
-        new_data = pd.DataFrame({
-            'Document': ['first_video_link'],
-            'Page': [4],
-            'Paragraph': [2],
-            'Text': ['hello this is the video text']
-        })
-        dataframe = dataframe.append(new_data, ignore_index=True)
-    import_data(client, dataframe)
\ No newline at end of file
+        dict: Per link, the number of sections and the seconds spent downloading,
+            loading the transcript, splitting and uploading, or the 'error'
+            that stopped the video.
+    """
+    video_links = list(dict.fromkeys(video_links))
+    report = {}
+    if not video_links:
+        return report
+    timelines = {}
+
+    def upload(link, split_result):
+        video_splits, duration, split_seconds = split_result
+        progress.advance(STAGE_VIDEOS_SPLIT)
+        upload_start = time.perf_counter()
+        stats = sync_records(client, iter_section_records(link, video_splits, duration, timelines.pop(link)),
+                             on_batch=progress.upload_callback())
+        report[link].update({'split': split_seconds, 'upload': time.perf_counter() - upload_start,
+                             'sections': stats.inserted + stats.updated + stats.unchanged})
+        print(f'Video {link}: ' + ', '.join(f'{stage} {report[link][stage]:.1f}s'
+                                            for stage in ('download', 'transcript', 'split', 'upload')))
+
+    def fail(link, err):
+        timelines.pop(link, None)
+        report.setdefault(link, {})['error'] = f'{type(err).__name__}: {err}'
+        print(f'Video {link} failed: {report[link]["error"]}')
+
+    pool = (ProcessPoolExecutor(max_workers=min(workers, len(video_links)), mp_context=worker_context())
+            if workers > 1 else None)
+    try:
+        with ThreadPoolExecutor(max_workers=min(VIDEO_DOWNLOAD_WORKERS, len(video_links))) as fetchers:
+            fetches = {fetchers.submit(_fetch_video_inputs, link): link for link in video_links}
+            splits = {}
+            pending = set(fetches)
+            # Uploads of split videos run while other videos are fetched and split.
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in splits:
+                        link = splits[future]
+                        try:
+                            upload(link, future.result())
+                        except PipelineCancelled:
+                            raise
+                        except Exception as err:
+                            fail(link, err)
+                        continue
+                    link = fetches[future]
+                    try:
+                        video_path, timelines[link], download_seconds, transcript_seconds = future.result()
+                    except Exception as err:
+                        fail(link, err)
+                        continue
+                    progress.advance(STAGE_DOWNLOADED)
+                    report[link] = {'download': download_seconds, 'transcript': transcript_seconds}
+                    if pool is None:
+                        try:
+                            upload(link, split_video(link, video_path, splitting_method))
+                        except PipelineCancelled:
+                            raise
+                        except Exception as err:
+                            fail(link, err)
+                    else:
+                        split = pool.submit(split_video, link, video_path, splitting_method)
+                        splits[split] = link
+                        pending.add(split)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return report
@@ -0,0 +1,109 @@
+"""
+Helpers for streaming ingestion pipelines.
+"""
+import multiprocessing
+import queue
+import threading
+
+_DONE = object()
+
+
+def worker_context():
+    """
+    Returns the multiprocessing context for worker process pools. Workers are
+    started by a fork server (or spawned where that is unavailable) rather than
+    forked from the app, whose job queue, fetcher and prefetch threads could
+    hold locks a forked child would inherit and deadlock on.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def prefetch(iterable, max_items):
+    """
+    Iterates `iterable` in a background thread so producing the next items
+    (parsing, reading) overlaps with consuming earlier ones (uploading).
+    At most `max_items` produced items wait to be consumed, which bounds memory.
+    Exceptions raised by the producer are re-raised in the consumer.
+
+    Args:
+        iterable: Source of items, typically a generator.
+        max_items (int): Maximum number of items buffered ahead of the consumer.
+
+    Yields:
+        The items of `iterable`, in order.
+    """
+    items = queue.Queue(maxsize=max(1, max_items))
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except BaseException as err:
+            put((_DONE, err))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, err = items.get()
+            if item is _DONE:
+                if err is not None:
+                    raise err
+                return
+            yield item
+    finally:
+        # Lets the producer exit if the consumer stops early.
+        stop.set()
+
+
+class PipelineCancelled(Exception):
+    """Raised by a Progress to stop the pipeline reporting to it."""
+
+
+STAGE_DOWNLOADED = 'downloaded'
+STAGE_PAGES_PARSED = 'pages_parsed'
+STAGE_VIDEOS_SPLIT = 'videos_split'
+STAGE_OBJECTS_UPLOADED = 'objects_uploaded'
+
+
+class Progress:
+    """
+    Receives per-stage progress counts from ingestion pipelines. This base
+    class ignores them; background jobs pass a subclass that records them and
+    may raise PipelineCancelled from `advance` to cancel the pipeline.
+    """
+    def advance(self, stage, count=1):
+        """Adds `count` to the counter of `stage`."""
+
+    def track(self, iterable, stage):
+        """Yields the items of `iterable`, advancing `stage` by one for each."""
+        for item in iterable:
+            yield item
+            self.advance(stage)
+
+    def upload_callback(self):
+        """Returns an importer `on_batch` callback that advances the uploaded objects."""
+        uploaded = 0
+
+        def on_batch(stats):
+            nonlocal uploaded
+            self.advance(STAGE_OBJECTS_UPLOADED, stats.objects - uploaded)
+            uploaded = stats.objects
+        return on_batch
+
+
+NO_PROGRESS = Progress()
@@ -1,21 +1,212 @@
 """
 Parses csv data in order to put into weaviate
+CSV files are read in chunks of CSV_CHUNK_ROWS rows with explicit dtypes and
+each chunk is uploaded while the next one is read, so memory stays flat
+regardless of the file size.
+Parquet and Arrow IPC (.arrow/.feather) files are memory-mapped and read in
+record batches of only the needed columns, which go to the importer as column
+lists without a pandas DataFrame in between. They need the optional pyarrow
+package.
 """
+import contextlib
+import os
+
 import pandas as pd
 from core.weaviate import import_data
+from processors.downloads import get_download_manager
+from processors.pipeline import NO_PROGRESS, STAGE_DOWNLOADED, prefetch
+
+CSV_CHUNK_ROWS = int(os.getenv('CSV_CHUNK_ROWS', '20000'))
+CSV_ENGINE = os.getenv('CSV_ENGINE', 'c')
+CSV_PREFETCH_CHUNKS = int(os.getenv('CSV_PREFETCH_CHUNKS', '2'))
+TABLE_BATCH_ROWS = int(os.getenv('TABLE_BATCH_ROWS', '20000'))
+CSV_ENGINES = ('c', 'python', 'pyarrow')
+REQUIRED_COLUMNS = ['Text', 'Document', 'Page', 'Paragraph', 'Type', 'Title', 'Person', 'Role', 'Folder']
+OPTIONAL_COLUMNS = ['Titles']
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+TABLE_EXTENSIONS = PARQUET_EXTENSIONS + ARROW_EXTENSIONS
+# Every column is read as text; the importer stores all of them as text properties.
+CSV_DTYPES = {column: str for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+
+
+def validate_columns(columns, csv):
+    """Raises ValueError if any column `import_data` expects is missing."""
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f'{csv} is missing required columns: {", ".join(missing)}')
+
+
+@contextlib.contextmanager
+def _local_path(csv):
+    """
+    Yields a local file for `csv`. URLs are downloaded through the download
+    cache and pinned there until the block ends.
+    """
+    if csv.startswith(('http://', 'https://')):
+        with get_download_manager().pinned(csv) as path:
+            yield path
+    else:
+        yield csv
+
+
+def _iter_pandas_chunks(path, csv, chunk_rows, engine):
+    header = pd.read_csv(path, nrows=0, engine=engine).columns
+    validate_columns(header, csv)
+    usecols = [column for column in header if column in CSV_DTYPES]
+    with pd.read_csv(path, usecols=usecols, dtype=CSV_DTYPES, chunksize=chunk_rows,
+                     engine=engine) as reader:
+        yield from reader
+
+
+def _iter_arrow_chunks(path, csv, chunk_rows):
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+    except ImportError as err:
+        raise ImportError("CSV engine 'pyarrow' requires the pyarrow package (pip install pyarrow)") from err
+    # pyarrow batches by bytes, not rows; aim for roughly `chunk_rows` rows of ~500 bytes.
+    read_options = pa_csv.ReadOptions(block_size=max(1 << 20, chunk_rows * 512))
+    with pa_csv.open_csv(path, read_options=read_options) as probe:
+        header = probe.schema.names
+    validate_columns(header, csv)
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=[column for column in header if column in CSV_DTYPES],
+        column_types={column: pa.string() for column in header if column in CSV_DTYPES},
+        strings_can_be_null=True)
+    with pa_csv.open_csv(path, read_options=read_options, convert_options=convert_options) as reader:
+        for batch in reader:
+            yield batch.to_pandas()
+
+
+def iter_paragraphs(csv, chunk_rows=CSV_CHUNK_ROWS, engine=CSV_ENGINE):
+    """
+    Yields the paragraphs of a csv data file as DataFrames of at most
+    `chunk_rows` rows, without rows that have missing values.
+
+    Args:
+        csv (str): Path or URL of the csv file.
+        chunk_rows (int): Rows per chunk.
+        engine (str): 'c', 'python' or 'pyarrow' (needs the pyarrow package).
+
+    Yields:
+        pd.DataFrame: The next chunk of paragraphs.
+
+    Raises:
+        ValueError: If a required column is missing; raised before any row is read.
+    """
+    if engine not in CSV_ENGINES:
+        raise ValueError(f'Unknown CSV engine {engine!r}, expected one of {CSV_ENGINES}')
+    with _local_path(csv) as path:
+        if engine == 'pyarrow':
+            chunks = _iter_arrow_chunks(path, csv, chunk_rows)
+        else:
+            chunks = _iter_pandas_chunks(path, csv, chunk_rows, engine)
+        for chunk in chunks:
+            chunk = chunk.dropna()
+            if len(chunk):
+                yield chunk
+
 
 def get_paragraphs(csv):
     """
     Gets the paragraphs from the csv data file
     """
-    d_f = pd.read_csv(csv)
-    d_f = d_f.dropna()
-    return d_f
+    chunks = list(iter_paragraphs(csv))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=REQUIRED_COLUMNS)
+
+
+def is_table_file(link):
+    """True if `link` is a Parquet or Arrow IPC file."""
+    return link.lower().endswith(TABLE_EXTENSIONS)
+
+
+@contextlib.contextmanager
+def _open_record_batches(path, source, columns, batch_rows):
+    """
+    Yields the projected column names and an iterator over record batches of
+    `path`, and closes the file when the block ends.
+    """
+    import pyarrow as pa
+    if source.lower().endswith(PARQUET_EXTENSIONS):
+        from pyarrow import parquet as pq
+        with contextlib.closing(pq.ParquetFile(path, memory_map=True)) as parquet_file:
+            names = parquet_file.schema_arrow.names
+            validate_columns(names, source)
+            projected = [column for column in names if column in columns]
+            yield projected, parquet_file.iter_batches(batch_size=batch_rows, columns=projected)
+        return
+
+    with pa.memory_map(path) as mapped:
+        try:
+            reader = pa.ipc.open_file(mapped)
+            batches = (reader.get_batch(index) for index in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            # Arrow IPC stream format rather than file format
+            mapped.seek(0)
+            reader = pa.ipc.open_stream(mapped)
+            batches = iter(reader)
+        names = reader.schema.names
+        validate_columns(names, source)
+        projected = [column for column in names if column in columns]
+        yield projected, (batch.select(projected) for batch in batches)
+
+
+def iter_table_batches(table, batch_rows=TABLE_BATCH_ROWS):
+    """
+    Yields the paragraphs of a Parquet or Arrow IPC file as column chunks
+    ({column: list of values}) of at most `batch_rows` rows, without rows that
+    have missing values. The file is memory-mapped and only the columns the
+    importer uses are read.
+
+    Args:
+        table (str): Path or URL of a .parquet, .arrow or .feather file.
+        batch_rows (int): Rows per batch.
+
+    Yields:
+        dict: Column name to list of values.
+
+    Raises:
+        ValueError: If a required column is missing; raised before any row is read.
+    """
+    try:
+        import pyarrow.compute as pc
+    except ImportError as err:
+        raise ImportError(f'Reading {table} requires the pyarrow package (pip install pyarrow)') from err
+    with _local_path(table) as path, \
+            _open_record_batches(path, table, CSV_DTYPES, batch_rows) as (columns, batches):
+        for batch in batches:
+            # Slicing is zero-copy; it bounds the Python objects built per batch.
+            for start in range(0, batch.num_rows, batch_rows):
+                part = batch.slice(start, batch_rows)
+                if any(part.column(column).null_count for column in columns):
+                    valid = pc.is_valid(part.column(columns[0]))
+                    for column in columns[1:]:
+                        valid = pc.and_(valid, pc.is_valid(part.column(column)))
+                    part = part.filter(valid)
+                if part.num_rows:
+                    yield part.to_pydict()
+
+
+def parse_table(client, tables, progress=NO_PROGRESS, batch_rows=TABLE_BATCH_ROWS):
+    """
+    Uploads the rows of Parquet or Arrow IPC files batch by batch, reading the
+    next batch while the previous one is uploaded, and reports read files and
+    uploaded objects to `progress`
+    """
+    for table in tables:
+        batches = prefetch(iter_table_batches(table, batch_rows), CSV_PREFETCH_CHUNKS)
+        import_data(client, batches, incremental=True, on_batch=progress.upload_callback())
+        progress.advance(STAGE_DOWNLOADED)
+
 
-def parse_csv(client, csvs):
+def parse_csv(client, csvs, progress=NO_PROGRESS, chunk_rows=CSV_CHUNK_ROWS, engine=CSV_ENGINE):
     """
-    Parses the csv
+    Parses the csv in chunks and uploads its rows, reading the next chunk
+    while the previous one is uploaded, and reports read files and uploaded
+    objects to `progress`
     """
     for csv in csvs:
-        d_f = get_paragraphs(csv)
-        import_data(client, d_f)
+        chunks = prefetch(iter_paragraphs(csv, chunk_rows, engine), CSV_PREFETCH_CHUNKS)
+        import_data(client, chunks, incremental=True, on_batch=progress.upload_callback())
+        progress.advance(STAGE_DOWNLOADED)
@@ -0,0 +1,139 @@
+"""
+Video transcripts: fetching with an on-disk cache, and a timeline that
+answers "text between t0 and t1" with binary search.
+Transcripts are cached as JSON files keyed by video id, so re-splitting or
+re-ingesting a video needs no network access. Local video files use a
+transcript fixture next to them (`lecture.mp4` -> `lecture.json`) in the same
+format.
+"""
+import json
+import os
+import re
+import tempfile
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from youtube_transcript_api import YouTubeTranscriptApi
+
+from processors.downloads import get_download_manager
+
+TRANSCRIPT_CACHE_DIR = os.getenv('TRANSCRIPT_CACHE_DIR', os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), 'transcript_cache'))
+VIDEO_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{6,64}$')
+
+
+def video_id_from_url(url):
+    """Returns the YouTube video id of a youtube.com or youtu.be URL."""
+    parsed_url = urlparse(url)
+    if parsed_url.netloc.endswith('youtu.be'):
+        video_id = parsed_url.path.lstrip('/').split('/')[0]
+    else:
+        video_id = parse_qs(parsed_url.query).get('v', [''])[0]
+    if not VIDEO_ID_PATTERN.match(video_id):
+        raise ValueError(f'No video id found in {url}')
+    return video_id
+
+
+def load_transcript(video_id, cache_dir=TRANSCRIPT_CACHE_DIR, refresh=False):
+    """
+    Returns the transcript of a video as a list of {'text', 'start', 'duration'}
+    entries, from the cache if present.
+
+    Args:
+        video_id (str): YouTube video id.
+        cache_dir (str): Directory of cached transcripts.
+        refresh (bool): Fetch again even if the transcript is cached.
+
+    Returns:
+        list: Transcript entries.
+    """
+    if not VIDEO_ID_PATTERN.match(video_id):
+        raise ValueError(f'Invalid video id {video_id!r}')
+    cache_path = os.path.join(cache_dir, video_id + '.json')
+    if not refresh and os.path.exists(cache_path):
+        with open(cache_path) as cache_file:
+            return json.load(cache_file)
+
+    transcript = YouTubeTranscriptApi.get_transcript(video_id)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write then rename, so concurrent readers never see a partial file.
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.json')
+    with os.fdopen(fd, 'w') as cache_file:
+        json.dump(transcript, cache_file)
+    os.replace(tmp_path, cache_path)
+    return transcript
+
+
+def transcript_fixture_path(video_path):
+    """Returns the path of the transcript fixture of a local video file."""
+    return os.path.splitext(video_path)[0] + '.json'
+
+
+def fetch_transcript(link):
+    """
+    Returns the transcript of a YouTube URL (cached) or of a local video file
+    inside DOWNLOAD_LOCAL_DIRS (from its transcript fixture).
+    """
+    local = get_download_manager().local_source(link)
+    if local is not None:
+        fixture_path = transcript_fixture_path(local)
+        if not os.path.exists(fixture_path):
+            raise FileNotFoundError(f'No transcript fixture {fixture_path} for {link}')
+        with open(fixture_path) as fixture:
+            return json.load(fixture)
+    return load_transcript(video_id_from_url(link))
+
+
+class TranscriptTimeline:
+    """
+    Transcript entries sorted by start time, with their start and end times in
+    NumPy arrays for O(log n) range lookups.
+    """
+    def __init__(self, entries):
+        """
+        Args:
+            entries (list): Transcript entries with 'text', 'start' and 'duration'.
+        """
+        starts = np.array([float(entry['start']) for entry in entries])
+        order = np.argsort(starts, kind='stable')
+        self.starts = starts[order]
+        self.ends = self.starts + np.array([float(entries[i]['duration']) for i in order])
+        self.texts = [entries[i]['text'] for i in order]
+        # The end of the last entry of the transcript as provided
+        self.end = float(entries[-1]['start']) + float(entries[-1]['duration']) if entries else 0.0
+
+    @classmethod
+    def from_video_id(cls, video_id, cache_dir=TRANSCRIPT_CACHE_DIR):
+        return cls(load_transcript(video_id, cache_dir))
+
+    def __len__(self):
+        return len(self.texts)
+
+    def index_range(self, t0, t1):
+        """Returns the slice of entries that start in [t0, t1)."""
+        first, last = np.searchsorted(self.starts, [t0, t1], side='left')
+        return slice(int(first), int(max(first, last)))
+
+    def text_between(self, t0, t1):
+        """Returns the text of the entries that start in [t0, t1), joined by spaces."""
+        return ' '.join(self.texts[self.index_range(t0, t1)])
+
+    def segments(self, splits):
+        """
+        Splits the transcript at the given times.
+
+        Args:
+            splits (list): Ascending section start times; the first section
+                also takes every entry before `splits[1]`.
+
+        Returns:
+            list: One text per split, each entry prefixed with a space.
+        """
+        if not splits:
+            return []
+        bounds = np.append(np.asarray(splits[1:], dtype=float), self.end + 1)
+        # Entries are consumed in order, so a section never reaches back before the previous one.
+        stops = np.maximum.accumulate(np.searchsorted(self.starts, bounds, side='left'))
+        starts = np.concatenate([[0], stops[:-1]])
+        return [''.join(' ' + text for text in self.texts[start:stop])
+                for start, stop in zip(starts.tolist(), stops.tolist())]
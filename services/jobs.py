@@ -0,0 +1,286 @@
+"""
+Background ingestion jobs.
+Ingestion requests are stored as job records in SQLite and executed by a
+bounded pool of worker threads in priority order, so the HTTP request returns
+a job id immediately and bulk loads cannot take over the server. Jobs report
+per-stage progress (downloaded, pages parsed, objects uploaded), can be
+cancelled, and survive a restart: queued jobs, and running jobs whose process
+died, are picked up again when the queue starts. Re-running an interrupted job
+is cheap because ingestion only uploads changed paragraphs.
+"""
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+from processors.doc_parser import process_pdf
+from processors.pipeline import PipelineCancelled, Progress
+from processors.table_parser import parse_csv
+from services.resource_manager import add_resources_to_weaviate
+
+JOBS_DB_PATH = os.getenv('JOBS_DB_PATH', os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), 'jobs.sqlite3'))
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '2'))
+# Progress is written to the job record at most this often.
+PROGRESS_INTERVAL = float(os.getenv('JOB_PROGRESS_INTERVAL', '1.0'))
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+FINISHED = (STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED)
+
+COLUMNS = ('id', 'kind', 'params', 'priority', 'status', 'progress', 'result', 'error',
+           'cancel_requested', 'worker_pid', 'created_at', 'started_at', 'finished_at')
+
+# Job kind -> callable(client, progress, **params)
+JOB_HANDLERS = {
+    'add_resources': lambda client, progress, links, refresh=False:
+        add_resources_to_weaviate(client, links, refresh=refresh, progress=progress),
+    'parse_pdf': lambda client, progress, pdfs, splitting='naive':
+        process_pdf(client, pdfs, splitting, progress=progress),
+    'parse_csv': lambda client, progress, csv:
+        parse_csv(client, csv, progress=progress),
+}
+
+
+class JobCancelled(PipelineCancelled):
+    """Raised inside a running job once its cancellation was requested."""
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, TypeError):
+        return pid is not None
+    return True
+
+
+class JobStore:
+    """
+    SQLite-backed job records. A connection is opened per operation so the
+    store is safe to use across threads and worker processes.
+    """
+    def __init__(self, path=JOBS_DB_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS jobs ('
+                         'id TEXT PRIMARY KEY, kind TEXT, params TEXT, priority INTEGER, status TEXT, '
+                         'progress TEXT, result TEXT, error TEXT, cancel_requested INTEGER DEFAULT 0, '
+                         'worker_pid INTEGER, created_at REAL, started_at REAL, finished_at REAL)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def create(self, kind, params, priority):
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute('INSERT INTO jobs (id, kind, params, priority, status, progress, created_at) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (job_id, kind, json.dumps(params), priority, STATUS_QUEUED, '{}', time.time()))
+        return job_id
+
+    def get(self, job_id):
+        """Returns the job record as a dictionary, or None."""
+        with self._connect() as conn:
+            row = conn.execute(f'SELECT {", ".join(COLUMNS)} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(COLUMNS, row))
+        for field in ('params', 'progress', 'result'):
+            job[field] = json.loads(job[field]) if job[field] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def claim(self, job_id):
+        """Marks a queued job as running in this process. Returns False if it is not queued."""
+        with self._connect() as conn:
+            cursor = conn.execute('UPDATE jobs SET status = ?, worker_pid = ?, started_at = ? '
+                                  'WHERE id = ? AND status = ? AND cancel_requested = 0',
+                                  (STATUS_RUNNING, os.getpid(), time.time(), job_id, STATUS_QUEUED))
+            return cursor.rowcount == 1
+
+    def update_progress(self, job_id, progress):
+        with self._connect() as conn:
+            conn.execute('UPDATE jobs SET progress = ? WHERE id = ?', (json.dumps(progress), job_id))
+
+    def finish(self, job_id, status, progress, result=None, error=None):
+        with self._connect() as conn:
+            conn.execute('UPDATE jobs SET status = ?, progress = ?, result = ?, error = ?, finished_at = ? '
+                         'WHERE id = ?', (status, json.dumps(progress), json.dumps(result), error,
+                                          time.time(), job_id))
+
+    def request_cancel(self, job_id):
+        """
+        Flags a job for cancellation. Queued jobs are cancelled immediately.
+
+        Returns:
+            str: The job status after the request, or None if there is no such job.
+        """
+        with self._connect() as conn:
+            conn.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status IN (?, ?)',
+                         (job_id, STATUS_QUEUED, STATUS_RUNNING))
+            conn.execute('UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?',
+                         (STATUS_CANCELLED, time.time(), job_id, STATUS_QUEUED))
+            row = conn.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def cancel_requested(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def recover(self):
+        """
+        Re-queues running jobs whose worker process is gone, and returns
+        (priority, created_at, id) of every queued job.
+        """
+        with self._connect() as conn:
+            running = conn.execute('SELECT id, worker_pid FROM jobs WHERE status = ?',
+                                   (STATUS_RUNNING,)).fetchall()
+            orphaned = [(job_id,) for job_id, pid in running if pid == os.getpid() or not _pid_alive(pid)]
+            conn.executemany(f"UPDATE jobs SET status = '{STATUS_QUEUED}', worker_pid = NULL WHERE id = ?",
+                             orphaned)
+            return conn.execute('SELECT priority, created_at, id FROM jobs WHERE status = ?',
+                                (STATUS_QUEUED,)).fetchall()
+
+
+class JobProgress(Progress):
+    """Per-stage counters of one running job, persisted periodically."""
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+
+    def advance(self, stage, count=1):
+        with self._lock:
+            self.counts[stage] = self.counts.get(stage, 0) + count
+            if time.monotonic() - self._saved_at < PROGRESS_INTERVAL:
+                return
+            self._saved_at = time.monotonic()
+            counts = dict(self.counts)
+        self.store.update_progress(self.job_id, counts)
+        # Cancellation is checked at the same cadence as progress is saved.
+        if self.store.cancel_requested(self.job_id):
+            raise JobCancelled(self.job_id)
+
+
+class JobQueue:
+    """
+    Runs jobs from a JobStore on at most `workers` threads, highest priority
+    first and in submission order within a priority. The worker threads are
+    started per process, on `start()` or the first `submit()`, so a queue
+    created before a pre-forking server forks runs its jobs in the workers.
+    """
+    def __init__(self, client, store=None, workers=INGEST_WORKERS, handlers=None):
+        """
+        Args:
+            client: Weaviate client instance used by the jobs.
+            store (JobStore): Job records; defaults to JOBS_DB_PATH.
+            workers (int): Maximum number of jobs running at the same time.
+            handlers (dict): Job kind to handler; defaults to JOB_HANDLERS.
+        """
+        self.client = client
+        self.store = store or JobStore()
+        self.workers = max(1, workers)
+        self.handlers = handlers or JOB_HANDLERS
+        self._heap = []
+        self._ready = threading.Condition()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Loads queued jobs from the store and starts the worker threads of this
+        process, unless they are already running. Threads do not survive a
+        fork, so a forked process starts its own.
+        """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()
+                    self._pid = os.getpid()
+        return self
+
+    def _start(self):
+        # Anything inherited from the parent process belongs to its threads.
+        self._heap = []
+        self._ready = threading.Condition()
+        self._threads = []
+        with self._ready:
+            for priority, created_at, job_id in self.store.recover():
+                heapq.heappush(self._heap, (-priority, created_at, job_id))
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'ingest-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, kind, params, priority=0):
+        """
+        Stores a job and queues it.
+
+        Args:
+            kind (str): One of the handler kinds, e.g. 'add_resources'.
+            params (dict): Keyword arguments of the handler; must be JSON serializable.
+            priority (int): Jobs with a higher priority run first.
+
+        Returns:
+            str: The job id.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f'Unknown job kind {kind!r}, expected one of {sorted(self.handlers)}')
+        self.start()
+        job_id = self.store.create(kind, params, priority)
+        with self._ready:
+            heapq.heappush(self._heap, (-priority, time.time(), job_id))
+            self._ready.notify()
+        return job_id
+
+    def status(self, job_id):
+        return self.store.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancels a queued job, or asks a running one to stop. Returns the job status."""
+        return self.store.request_cancel(job_id)
+
+    def _work(self):
+        while True:
+            with self._ready:
+                while not self._heap:
+                    self._ready.wait()
+                _, _, job_id = heapq.heappop(self._heap)
+            if self.store.claim(job_id):
+                self._run(job_id)
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        progress = JobProgress(self.store, job_id)
+        try:
+            result = self.handlers[job['kind']](self.client, progress, **job['params'])
+            status, error = STATUS_SUCCEEDED, None
+        except JobCancelled:
+            result, status, error = None, STATUS_CANCELLED, None
+        except Exception as err:
+            traceback.print_exc()
+            result, status, error = None, STATUS_FAILED, f'{type(err).__name__}: {err}'
+        self.store.finish(job_id, status, progress.counts, result=_jsonable(result), error=error)
+        print(f'Job {job_id} ({job["kind"]}) {status}')
+
+
+def _jsonable(result):
+    try:
+        json.dumps(result)
+        return result
+    except TypeError:
+        return repr(result)
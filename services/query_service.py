@@ -1,8 +1,90 @@
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from core.weaviate import search_qa
+from core.weaviate.cache import retrieval_cache
+from core.weaviate.graphql import SEARCH_MODES, build_get, build_post_search, parse_posts
+from core.search.basic_search import search_basic, search_keyword
+
+BATCH_QUERY_CHUNK = int(os.getenv('BATCH_QUERY_CHUNK', '16'))
+BATCH_QUERY_WORKERS = int(os.getenv('BATCH_QUERY_WORKERS', '8'))
+
+SEARCH_FUNCTIONS = {'basic': search_basic, 'qa': search_qa, 'keyword': search_keyword}
 
 def make_query(client, query):
     """
     Searches weaviate given a query
     """
     return search_qa(client, query)
+
+def make_batch_query(client, queries):
+    """
+    Runs many searches with as few Weaviate round trips as possible.
+    Cached results are served directly; the remaining queries are sent as
+    aliased sub-queries, BATCH_QUERY_CHUNK per GraphQL request. If a combined
+    request fails, its queries are fanned out concurrently instead.
+
+    Args:
+        client: Weaviate client instance
+        queries (list): Dictionaries with 'query', and optionally 'limit'
+            (default 10) and 'mode' ('basic', 'qa' or 'keyword', default 'basic')
+
+    Returns:
+        list: One result list per query, in request order
+
+    Raises:
+        ValueError: If `queries` is not a list of dictionaries with a string
+            'query', an integer 'limit' and a known 'mode'.
+    """
+    if not isinstance(queries, list):
+        raise ValueError(f'Queries must be a list, got {type(queries).__name__}')
+    lookups = []
+    for item in queries:
+        if not isinstance(item, dict) or not isinstance(item.get('query'), str):
+            raise ValueError(f'Each query must be an object with a string "query", got {item!r}')
+        mode = item.get('mode', 'basic')
+        if mode not in SEARCH_MODES:
+            raise ValueError(f'Unknown search mode {mode!r}, expected one of {SEARCH_MODES}')
+        try:
+            limit = int(item.get('limit') or 10)
+        except (TypeError, ValueError):
+            raise ValueError(f'Query limit must be an integer, got {item.get("limit")!r}')
+        lookups.append((item['query'], limit, mode))
+
+    current = retrieval_cache.generation()
+    results = [retrieval_cache.get(*lookup, current) for lookup in lookups]
+    pending = [i for i, result in enumerate(results) if result is None]
+
+    failed = []
+    for chunk_start in range(0, len(pending), BATCH_QUERY_CHUNK):
+        chunk = pending[chunk_start:chunk_start + BATCH_QUERY_CHUNK]
+        generation = retrieval_cache.generation()
+        try:
+            res = client.query.raw(build_get(build_post_search(lookups[i][2], lookups[i][0],
+                                                               lookups[i][1], alias=f'q{i}')
+                                             for i in chunk))
+        except Exception as err:
+            print(f'Batched query failed, fanning out instead: {err}')
+            failed.extend(chunk)
+            continue
+        if res.get('errors') or not (res.get('data') or {}).get('Get'):
+            print(f'Batched query returned errors, fanning out instead: {res.get("errors")}')
+            failed.extend(chunk)
+            continue
+        # Do not cache results that raced with a write to Weaviate.
+        cacheable = retrieval_cache.generation() == generation
+        for i in chunk:
+            results[i] = parse_posts(res['data']['Get'].get(f'q{i}'))
+            if cacheable:
+                retrieval_cache.put(*lookups[i], results[i], generation)
+
+    if failed:
+        with ThreadPoolExecutor(max_workers=min(BATCH_QUERY_WORKERS, len(failed))) as executor:
+            futures = {i: executor.submit(SEARCH_FUNCTIONS[lookups[i][2]], client,
+                                          lookups[i][0], lookups[i][1])
+                       for i in failed}
+        for i, future in futures.items():
+            results[i] = future.result()
+
+    return results
@@ -3,17 +3,21 @@ Module to handle addition of various resource types to Weaviate.
 Determines resource types, parses content, and uploads to the database.
 """
 from processors.doc_parser import process_pdf
-from processors.media_parser import process_video
-from processors.table_parser import parse_csv
-from core.weaviate import remove_resource_data
+from processors.media_parser import is_video_link, process_video
+from processors.table_parser import is_table_file, parse_csv, parse_table
+from processors.pipeline import NO_PROGRESS
+from core.weaviate import delete_documents, links_in_weaviate
 
-def add_resources_to_weaviate(client, links):
+def add_resources_to_weaviate(client, links, refresh=False, progress=NO_PROGRESS):
     """
     Identifies resource types from links and processes them accordingly.
     
     Args:
         client: Weaviate client instance.
         links (list): List of resource URLs or file paths.
+        refresh (bool): Also re-process links that are already in Weaviate.
+            Only their changed paragraphs are re-uploaded.
+        progress (Progress): Receives per-stage progress counts.
     
     Returns:
         None
@@ -21,34 +25,30 @@ def add_resources_to_weaviate(client, links):
     pdf_links = []
     video_links = []
     csv_files = []
-    
-    for link in links:
-        # Define filter to check existing entries
-        filter_query = {
-            "path": ["document"],
-            "operator": "Equal",
-            "valueText": link
-        }
+    table_files = []
 
-        # Query Weaviate for existing resource
-        data = client.query.get("Post", ["document", "_additional {id}"]) \
-            .with_where(filter_query).do()
+    # One local catalog lookup for all links
+    existing = set() if refresh else links_in_weaviate(client, links)
 
+    for link in dict.fromkeys(links):
         # Categorize resource if not present
-        if not data["data"]["Get"]["Post"]:
+        if link not in existing:
             if link.endswith('.pdf'):
                 pdf_links.append(link)
-            elif 'youtube.com' in link or 'youtu.be' in link:
+            elif is_video_link(link):
                 video_links.append(link)
             elif link.endswith('.csv'):
                 csv_files.append(link)
+            elif is_table_file(link):
+                table_files.append(link)
             else:
                 print(f'Unrecognized resource type: {link}')
 
     # Process and upload resources
-    process_pdf(client, pdf_links)
-    process_video(client, video_links)
-    parse_csv(client, csv_files)
+    process_pdf(client, pdf_links, progress=progress)
+    process_video(client, video_links, progress=progress)
+    parse_csv(client, csv_files, progress=progress)
+    parse_table(client, table_files, progress=progress)
 
 
 
@@ -61,7 +61,7 @@ def delete_resources_from_weaviate(client, links):
         links (list): List of resource URLs to delete.
     
     Returns:
-        None
+        dict: Per link, the number of objects deleted and failed, the elapsed
+            seconds and the delete method used.
     """
-    for link in links:
-        remove_resource_data(client, link)
\ No newline at end of file
+    return delete_documents(client, links)
\ No newline at end of file
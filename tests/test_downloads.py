@@ -0,0 +1,105 @@
+"""
+DownloadManager against a local HTTP server: ETag revalidation, content
+addressed de-duplication, eviction of unpinned files and local path checks.
+"""
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from processors.downloads import DownloadManager
+
+
+class SourceServer:
+    """Serves `files` ({path: bytes}) with ETags and records every request."""
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = server.files.get(self.path)
+                etag = f'"{hash(body)}"'
+                server.requests.append((self.path, self.headers.get('If-None-Match')))
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.httpd.server_port}{path}'
+
+
+@pytest.fixture
+def server():
+    source = SourceServer({f'/doc{i}.pdf': bytes([i]) * 1000 for i in range(6)})
+    source.files['/copy.pdf'] = source.files['/doc0.pdf']
+    yield source
+    source.httpd.shutdown()
+    source.httpd.server_close()
+
+
+def test_unchanged_source_is_revalidated_not_downloaded(server, tmp_path):
+    manager = DownloadManager(str(tmp_path))
+    first = manager.fetch(server.url('/doc1.pdf'))
+    second = manager.fetch(server.url('/doc1.pdf'))
+
+    assert first == second
+    assert open(second, 'rb').read() == bytes([1]) * 1000
+    assert server.requests[0] == ('/doc1.pdf', None)
+    assert server.requests[1][1] is not None
+
+    server.files['/doc1.pdf'] = b'changed'
+    assert open(manager.fetch(server.url('/doc1.pdf')), 'rb').read() == b'changed'
+
+
+def test_same_content_is_stored_once(server, tmp_path):
+    manager = DownloadManager(str(tmp_path))
+    assert manager.fetch(server.url('/doc0.pdf')) == manager.fetch(server.url('/copy.pdf'))
+    assert len(os.listdir(manager.objects_dir)) == 1
+
+
+def test_files_being_parsed_are_not_evicted(server, tmp_path):
+    # Room for two files while fetching four files ahead of the consumer
+    manager = DownloadManager(str(tmp_path), max_bytes=2000, connections=4)
+    urls = [server.url(f'/doc{i}.pdf') for i in range(6)]
+
+    for i, (url, path) in enumerate(manager.fetch_many(urls)):
+        assert url == urls[i]
+        assert open(path, 'rb').read() == bytes([i]) * 1000
+
+    manager.evict()
+    assert sum(os.path.getsize(os.path.join(manager.objects_dir, name))
+               for name in os.listdir(manager.objects_dir)) <= 2000
+    assert manager.cached_path(urls[0]) is None
+    assert manager.cached_path(urls[5]) is not None
+
+
+def test_local_paths_need_an_allowed_directory(tmp_path):
+    allowed = tmp_path / 'allowed'
+    allowed.mkdir()
+    (allowed / 'a.pdf').write_bytes(b'pdf')
+    (tmp_path / 'secret.txt').write_bytes(b'secret')
+    manager = DownloadManager(str(tmp_path / 'cache'), local_dirs=[str(allowed)])
+
+    assert manager.fetch(str(allowed / 'a.pdf')) == str(allowed / 'a.pdf')
+    for path in (tmp_path / 'secret.txt', allowed / '..' / 'secret.txt', '/etc/passwd'):
+        with pytest.raises(ValueError):
+            manager.fetch(str(path))
@@ -0,0 +1,53 @@
+"""
+FrameSource against a stubbed probe and decoder: it stops after the announced
+frames or at the end of the decoder's output, and decoder errors propagate.
+"""
+import numpy as np
+import pytest
+
+skvideo_io = pytest.importorskip('skvideo.io')
+
+from processors import frame_source
+from processors.frame_source import FrameSource
+
+FRAMES = 6
+
+
+def decoder(frames, error=None):
+    def vreader(path, outputdict=None):
+        for index in range(frames):
+            yield np.full((4, 4, 3), index, dtype=np.uint8)
+        if error is not None:
+            raise error
+    return vreader
+
+
+@pytest.fixture
+def stub_video(monkeypatch):
+    monkeypatch.setattr(frame_source, 'probe_video', lambda path: {
+        'duration': float(FRAMES), 'frames': FRAMES, 'fps': 1.0, 'width': 4, 'height': 4})
+
+    def use_decoder(frames, error=None):
+        monkeypatch.setattr(skvideo_io, 'vreader', decoder(frames, error))
+        return FrameSource('video.mp4')
+    return use_decoder
+
+
+def test_stops_after_the_announced_frames(stub_video):
+    source = stub_video(FRAMES + 3)
+    assert [int(frame[0, 0, 0]) for frame in source] == list(range(FRAMES))
+    assert source.next_frame() is None
+
+
+def test_stops_when_the_decoder_output_ends_early(stub_video):
+    source = stub_video(FRAMES - 2)
+    assert len(list(source)) == FRAMES - 2
+    assert source.current_frame_index == FRAMES - 3
+
+
+def test_decoder_errors_propagate(stub_video):
+    source = stub_video(2, RuntimeError('broken pipe'))
+    assert source.next_frame() is not None
+    assert source.next_frame() is not None
+    with pytest.raises(RuntimeError, match='broken pipe'):
+        source.next_frame()
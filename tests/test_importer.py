@@ -0,0 +1,81 @@
+"""
+BatchImporter against a stub Weaviate client whose batch endpoint rejects
+objects: rejected updates of stored objects are retried as replacements, and
+an object only counts as imported once Weaviate holds its properties.
+"""
+from unittest import mock
+
+import pytest
+import weaviate
+
+from core.weaviate import importer
+from core.weaviate.importer import BatchImporter, record_to_object
+
+
+class StubWeaviate:
+    """Holds `stored` ({id: properties}); batches reject every object and single writes fail `failures` times."""
+    def __init__(self, stored, failures=0):
+        self.stored = stored
+        self.failures = failures
+        self.batch = self
+        self.data_object = self
+        self.calls = []
+
+    def create(self, batch_or_properties, class_name=None, uuid=None):
+        if class_name is None:
+            objects = batch_or_properties.get_request_body()['objects']
+            return [{'result': {'errors': {'error': [{'message': 'rejected'}]}}}] * len(objects)
+        self.calls.append(('create', uuid))
+        if uuid in self.stored:
+            raise weaviate.ObjectAlreadyExistsException(uuid)
+        self._fail()
+        self.stored[uuid] = batch_or_properties
+
+    def replace(self, properties, class_name, uuid):
+        self.calls.append(('replace', uuid))
+        self._fail()
+        self.stored[uuid] = properties
+
+    def _fail(self):
+        if self.failures:
+            self.failures -= 1
+            raise weaviate.UnexpectedStatusCodeException('Write', mock.Mock(status_code=503, json=dict))
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(importer.time, 'sleep', lambda seconds: None)
+
+
+def changed_object():
+    record = {'Text': 'new text', 'Document': 'doc.pdf', 'Page': 1, 'Paragraph': 0}
+    return record_to_object(record)
+
+
+def test_rejected_update_replaces_the_stored_object():
+    props, object_id = changed_object()
+    client = StubWeaviate({object_id: dict(props, content='old text')})
+    with BatchImporter(client) as batch:
+        batch.add(props, object_id)
+    assert client.stored[object_id] == props
+    assert client.calls == [('create', object_id), ('replace', object_id)]
+    assert (batch.stats.objects, batch.stats.failed) == (1, 0)
+
+
+def test_update_that_cannot_be_replaced_is_failed():
+    props, object_id = changed_object()
+    client = StubWeaviate({object_id: dict(props, content='old text')}, failures=importer.MAX_OBJECT_RETRIES)
+    with BatchImporter(client) as batch:
+        batch.add(props, object_id)
+    assert client.stored[object_id]['content'] == 'old text'
+    assert (batch.stats.objects, batch.stats.failed) == (0, 1)
+    assert batch.stats.failed_documents == {'doc.pdf': 1}
+
+
+def test_new_object_is_created_after_transient_errors():
+    props, object_id = changed_object()
+    client = StubWeaviate({}, failures=2)
+    with BatchImporter(client) as batch:
+        batch.add(props, object_id)
+    assert client.stored[object_id] == props
+    assert (batch.stats.objects, batch.stats.failed) == (1, 0)
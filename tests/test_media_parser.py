@@ -0,0 +1,135 @@
+"""
+process_video on a generated three-slide video with a transcript fixture,
+against a stub Weaviate client: one section per slide with its time range and
+text, in this process and in a worker pool, and a video that cannot be
+fetched or uploaded is reported without stopping the others.
+"""
+import json
+import os
+import subprocess
+
+import pytest
+
+from core.weaviate import sync
+from core.weaviate.catalog import DocumentCatalog
+from processors import downloads
+from processors.downloads import DownloadManager
+
+skvideo = pytest.importorskip('skvideo')
+pytest.importorskip('skvideo.io')
+pytest.importorskip('pytube')
+pytest.importorskip('youtube_transcript_api')
+
+from processors.media_parser import process_video
+
+FFMPEG_DIR = skvideo.getFFmpegPath()
+pytestmark = pytest.mark.skipif(
+    not FFMPEG_DIR or not os.path.exists(os.path.join(FFMPEG_DIR, 'ffprobe')),
+    reason='needs ffmpeg and ffprobe')
+
+SLIDES = ('red', 'blue', 'green')
+SLIDE_SECONDS = 8
+TRANSCRIPT = [
+    {'text': 'welcome', 'start': 1.0, 'duration': 2.0},
+    {'text': 'to the talk', 'start': 3.0, 'duration': 2.0},
+    {'text': 'the blue slide', 'start': 9.0, 'duration': 3.0},
+    {'text': 'the green slide', 'start': 17.0, 'duration': 3.0},
+    {'text': 'thanks', 'start': 20.0, 'duration': 2.0},
+]
+SECTION_TEXTS = ['welcome to the talk', 'the blue slide', 'the green slide thanks']
+
+
+class StubClient:
+    """
+    Stands in for a Weaviate client holding no Post objects and records every
+    imported object. Listing the objects of a document in `failing` fails.
+    """
+    def __init__(self, failing=()):
+        self.batch = self
+        self.query = self
+        self.objects = []
+        self.failing = failing
+
+    def raw(self, query):
+        if any(json.dumps(document) in query for document in self.failing):
+            return {'errors': [{'message': 'listing failed'}]}
+        return {'data': {'Get': {'Post': []}}}
+
+    def create(self, batch):
+        objects = batch.get_request_body()['objects']
+        self.objects.extend(objects)
+        return [{'result': {}}] * len(objects)
+
+
+def write_slides(path):
+    """Writes a 64x48 video at 4 fps showing each color of SLIDES for SLIDE_SECONDS."""
+    command = [os.path.join(FFMPEG_DIR, 'ffmpeg'), '-y', '-loglevel', 'error']
+    for color in SLIDES:
+        command += ['-f', 'lavfi', '-i', f'color=c={color}:s=64x48:r=4:d={SLIDE_SECONDS}']
+    command += ['-filter_complex', ''.join(f'[{i}]' for i in range(len(SLIDES))) + f'concat=n={len(SLIDES)}',
+                '-pix_fmt', 'yuv420p', path]
+    subprocess.run(command, check=True)
+
+
+def write_talk(directory, name='talk'):
+    """Writes a slides video and its transcript fixture into `directory`, returning the video's path."""
+    directory.mkdir(exist_ok=True)
+    path = str(directory / f'{name}.mp4')
+    write_slides(path)
+    with open(str(directory / f'{name}.json'), 'w') as fixture:
+        json.dump(TRANSCRIPT, fixture)
+    return path
+
+
+@pytest.fixture
+def talk(tmp_path, monkeypatch):
+    monkeypatch.setattr(sync, 'document_catalog', DocumentCatalog(str(tmp_path / 'catalog.sqlite3')))
+    monkeypatch.setattr(downloads, '_manager', DownloadManager(
+        str(tmp_path / 'download_cache'), local_dirs=[str(tmp_path / 'videos')]))
+    return write_talk(tmp_path / 'videos')
+
+
+def sections(client, link):
+    posts = [obj['properties'] for obj in client.objects if obj['properties']['document'] == link]
+    return sorted(posts, key=lambda post: int(post['page']))
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_one_section_per_slide(talk, workers):
+    client = StubClient()
+    report = process_video(client, [talk], workers=workers)
+    assert report[talk]['sections'] == len(SLIDES)
+    posts = sections(client, talk)
+    assert [post['content'] for post in posts] == SECTION_TEXTS
+    assert posts[0]['startTime'] == 0
+    for post, following in zip(posts, posts[1:]):
+        assert post['endTime'] == following['startTime']
+    assert [post['startTime'] for post in posts[1:]] == pytest.approx([8, 16], abs=1)
+    assert posts[-1]['endTime'] == pytest.approx(len(SLIDES) * SLIDE_SECONDS)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_failed_video_does_not_stop_the_others(talk, tmp_path, workers):
+    untranscribed = str(tmp_path / 'videos' / 'untranscribed.mp4')
+    write_slides(untranscribed)
+    client = StubClient()
+    report = process_video(client, [untranscribed, talk], workers=workers)
+    assert 'FileNotFoundError' in report[untranscribed]['error']
+    assert report[talk]['sections'] == len(SLIDES)
+    assert not sections(client, untranscribed)
+
+
+def test_failed_upload_does_not_stop_the_others(talk, tmp_path):
+    other = write_talk(tmp_path / 'videos', 'other')
+    client = StubClient(failing=[other])
+    report = process_video(client, [other, talk], workers=1)
+    assert 'listing failed' in report[other]['error']
+    assert report[talk]['sections'] == len(SLIDES)
+
+
+def test_videos_outside_the_local_dirs_are_rejected(talk, tmp_path):
+    outside = write_talk(tmp_path / 'elsewhere')
+    client = StubClient()
+    report = process_video(client, [outside], workers=1)
+    assert 'DOWNLOAD_LOCAL_DIRS' in report[outside]['error']
+    assert not client.objects
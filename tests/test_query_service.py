@@ -0,0 +1,26 @@
+"""
+make_batch_query input validation: malformed batches are rejected with
+ValueError before any search is sent.
+"""
+from unittest import mock
+
+import pytest
+
+from services.query_service import make_batch_query
+
+
+@pytest.mark.parametrize('queries', [
+    'a',
+    {'query': 'a'},
+    ['a'],
+    [{'limit': 3}],
+    [{'query': 1}],
+    [{'query': 'a', 'limit': 'ten'}],
+    [{'query': 'a', 'limit': [1]}],
+    [{'query': 'a', 'mode': 'fuzzy'}],
+])
+def test_malformed_batches_are_rejected(queries):
+    client = mock.Mock()
+    with pytest.raises(ValueError):
+        make_batch_query(client, queries)
+    client.query.raw.assert_not_called()
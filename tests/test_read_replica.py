@@ -0,0 +1,160 @@
+"""
+ReadReplica against a stubbed Weaviate export and vectorizer: top-k matches an
+exact cosine ranking, and incremental refreshes apply updates and the
+deletions logged in the catalog without listing every object.
+"""
+import os
+import re
+
+import numpy as np
+import pytest
+
+from core.search import read_replica
+from core.search.read_replica import ReadReplica, process_replica_dir
+from core.weaviate.catalog import DocumentCatalog
+
+DIM = 16
+
+
+class StubWeaviate:
+    """Answers the replica's export queries from `objects` ({id: object}), recording each query."""
+    def __init__(self, objects):
+        self.objects = objects
+        self.queries = []
+        self.query = self
+
+    def raw(self, query):
+        self.queries.append(query)
+        limit = int(re.search(r'limit: (\d+)', query).group(1))
+        posts = sorted(self.objects.values(), key=lambda obj: obj['id'])
+        since = re.search(r'valueText: "(\d+)"', query)
+        if since:
+            offset = int(re.search(r'offset: (\d+)', query).group(1))
+            posts = [obj for obj in posts if obj['updated'] >= int(since.group(1))][offset:offset + limit]
+        else:
+            after = re.search(r'after: "([^"]+)"', query)
+            posts = [obj for obj in posts if not after or obj['id'] > after.group(1)][:limit]
+        return {'data': {'Get': {'Post': [
+            {'document': obj['document'], 'page': obj['page'], 'paragraph': obj['paragraph'],
+             'content': obj['content'],
+             '_additional': {'id': obj['id'], 'vector': list(obj['vector']),
+                             'lastUpdateTimeUnix': str(obj['updated'])}} for obj in posts]}}}
+
+
+def make_object(index, vector, updated=1000):
+    return {'id': f'{index:08d}-0000-0000-0000-000000000000', 'document': f'doc{index % 5}',
+            'page': str(index // 5), 'paragraph': str(index), 'content': f'text {index}',
+            'vector': vector, 'updated': updated}
+
+
+def exact_top_ids(objects, query, limit):
+    ids = sorted(objects)
+    matrix = np.asarray([objects[object_id]['vector'] for object_id in ids], dtype=np.float64)
+    scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+    return [ids[i] for i in np.argsort(-scores, kind='stable')[:limit]]
+
+
+@pytest.fixture
+def corpus():
+    rng = np.random.default_rng(7)
+    return {obj['id']: obj for obj in (make_object(i, rng.normal(size=DIM)) for i in range(200))}
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch, corpus):
+    queries = {f'q{i}': np.random.default_rng(100 + i).normal(size=DIM).astype(np.float32) for i in range(5)}
+    monkeypatch.setattr(read_replica, 'vectorize_query', lambda text: queries[text])
+    monkeypatch.setattr(read_replica, 'REPLICA_PAGE_SIZE', 64)
+    catalog = DocumentCatalog(str(tmp_path / 'catalog.sqlite3'))
+    replica = ReadReplica(str(tmp_path / 'replica'), catalog=catalog)
+    replica.queries = queries
+    return replica
+
+
+def result_ids(replica, vector, limit):
+    return [obj['id'] for obj in replica.objects(replica.nearest_rows(vector, limit))]
+
+
+def test_top_k_matches_exact_cosine_ranking(replica, corpus):
+    client = StubWeaviate(corpus)
+    replica.refresh(client)
+    assert len(replica) == len(corpus)
+    for text, vector in replica.queries.items():
+        expected = exact_top_ids(corpus, vector, 10)
+        assert result_ids(replica, vector, 10) == expected
+        results = replica.search(client, text, limit=10)
+        assert [result['paragraph'] for result in results] == [corpus[i]['paragraph'] for i in expected]
+
+
+def test_incremental_refresh_replays_logged_deletions(replica, corpus):
+    client = StubWeaviate(corpus)
+    replica.refresh(client)
+    ids = sorted(corpus)
+    query = replica.queries['q0']
+    best = exact_top_ids(corpus, query, 3)
+
+    # One object deleted by id, one document deleted, one object moved next to the query.
+    del corpus[best[0]]
+    replica.catalog.log_deletions(object_ids=[best[0]])
+    for object_id in [i for i in ids if corpus.get(i, {}).get('document') == 'doc3']:
+        del corpus[object_id]
+    replica.catalog.log_deletions(documents=['doc3'])
+    moved = next(i for i in ids if i in corpus and i not in best)
+    corpus[moved] = dict(corpus[moved], vector=query * 2, updated=5000)
+
+    client.queries.clear()
+    stats = replica.refresh(client)
+    assert not stats['full']
+    assert all('_lastUpdateTimeUnix' in query for query in client.queries)
+    assert len(replica) == len(corpus)
+    assert result_ids(replica, query, 10) == exact_top_ids(corpus, query, 10)
+    assert result_ids(replica, query, 1) == [moved]
+
+
+def test_reimported_object_survives_its_earlier_deletion(replica, corpus):
+    client = StubWeaviate(corpus)
+    replica.refresh(client)
+    object_id = sorted(corpus)[0]
+    replica.catalog.log_deletions(object_ids=[object_id])
+    # Imported again after the deletion was logged, e.g. by a sync of a split document.
+    corpus[object_id] = dict(corpus[object_id], updated=int(1e13))
+    replica.refresh(client)
+    assert len(replica) == len(corpus)
+
+
+def test_reset_and_pruned_log_trigger_full_refresh(replica, corpus, monkeypatch):
+    client = StubWeaviate(corpus)
+    replica.refresh(client)
+    corpus.clear()
+    replica.catalog.log_deletions(reset=True)
+    assert replica.refresh(client)['full']
+    assert len(replica) == 0
+
+    corpus.update({obj['id']: obj for obj in (make_object(i, np.ones(DIM)) for i in range(3))})
+    replica.refresh(client)
+    monkeypatch.setattr(replica.catalog, 'deletions_since', lambda seq: (None, seq + 10))
+    del corpus[sorted(corpus)[0]]
+    assert replica.refresh(client)['full']
+    assert len(replica) == 2
+
+
+def test_searches_use_current_data_while_refreshing_in_background(replica, corpus, monkeypatch):
+    client = StubWeaviate(corpus)
+    replica.refresh(client)
+    monkeypatch.setattr(replica, 'is_stale', lambda: True)
+    started = []
+    monkeypatch.setattr(replica, 'refresh_in_background', started.append)
+    vector = replica.queries['q1']
+    results = replica.search(client, 'q1', limit=5)
+    assert started == [client]
+    assert [result['paragraph'] for result in results] == \
+        [corpus[i]['paragraph'] for i in exact_top_ids(corpus, vector, 5)]
+
+
+def test_each_process_gets_its_own_directory(tmp_path):
+    dead = tmp_path / '999999999'
+    dead.mkdir()
+    (dead / 'vectors.f32').write_bytes(b'')
+    path = process_replica_dir(str(tmp_path))
+    assert path == os.path.join(str(tmp_path), str(os.getpid()))
+    assert not dead.exists()
@@ -0,0 +1,76 @@
+"""
+sync_records against a stub Weaviate client: stale objects of a document are
+deleted only after its new and changed objects were imported, and kept when
+they failed to import.
+"""
+from unittest import mock
+
+import pytest
+import weaviate
+
+from core.weaviate import deletion, importer, sync
+from core.weaviate.catalog import DocumentCatalog
+from core.weaviate.importer import record_to_object
+from core.weaviate.sync import sync_records
+
+
+class StubWeaviate:
+    """Holds `stored` ({id: properties}) and records writes and deletions in `calls`."""
+    def __init__(self, stored, reject=False):
+        self.stored = stored
+        self.reject = reject
+        self.calls = []
+        self.batch = self.query = self.data_object = self
+
+    def raw(self, query):
+        return {'data': {'Get': {'Post': [
+            {'contentHash': props['contentHash'], '_additional': {'id': object_id}}
+            for object_id, props in self.stored.items()]}}}
+
+    def create(self, batch_or_properties, class_name=None, uuid=None):
+        if class_name is not None:
+            raise weaviate.UnexpectedStatusCodeException('Write', mock.Mock(status_code=503, json=dict))
+        objects = batch_or_properties.get_request_body()['objects']
+        self.calls.append(('batch', len(objects)))
+        if self.reject:
+            return [{'result': {'errors': {'error': [{'message': 'rejected'}]}}}] * len(objects)
+        self.stored.update((obj['id'], obj['properties']) for obj in objects)
+        return [{'result': {}}] * len(objects)
+
+    def replace(self, properties, class_name, uuid):
+        self.create(properties, class_name, uuid)
+
+    def delete(self, object_id):
+        self.calls.append(('delete', object_id))
+        del self.stored[object_id]
+
+
+def paragraph(index, text):
+    return {'Text': text, 'Document': 'doc.pdf', 'Page': 0, 'Paragraph': index}
+
+
+@pytest.fixture
+def stored(tmp_path, monkeypatch):
+    catalog = DocumentCatalog(str(tmp_path / 'catalog.sqlite3'))
+    monkeypatch.setattr(sync, 'document_catalog', catalog)
+    monkeypatch.setattr(deletion, 'document_catalog', catalog)
+    monkeypatch.setattr(importer.time, 'sleep', lambda seconds: None)
+    objects = [record_to_object(paragraph(index, 'old text')) for index in range(2)]
+    return {object_id: props for props, object_id in objects}
+
+
+def test_stale_objects_are_deleted_after_the_import(stored):
+    client = StubWeaviate(stored)
+    stats = sync_records(client, [paragraph(0, 'new text')])
+    assert [props['content'] for props in client.stored.values()] == ['new text']
+    assert client.calls[0] == ('batch', 1)
+    assert [call[0] for call in client.calls[1:]] == ['delete']
+    assert (stats.updated, stats.deleted) == (1, 1)
+
+
+def test_stale_objects_are_kept_when_the_import_fails(stored):
+    client = StubWeaviate(dict(stored), reject=True)
+    stats = sync_records(client, [paragraph(0, 'new text')])
+    assert client.stored == stored
+    assert stats.deleted == 0
+    assert stats.imported.failed_documents == {'doc.pdf': 1}